@@ -7,16 +7,16 @@ import argparse
 import logging
 from typing import Dict, List
 import os
+import sys
+
+# Helpers shared with the origin and controller live in the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.logging_setup import set_sampling, setup_logging
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('client.log'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging('client.log')
+# Logged for every downloaded chunk, so it is sampled (--progress-log-every)
+progress_log = logging.getLogger('client.progress')
 
 class VideoStreamingClient:
     def __init__(self, server_url: str):
@@ -30,7 +30,7 @@ class VideoStreamingClient:
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
-            logging.error(f"Error getting video list: {str(e)}")
+            logging.error("Error getting video list: %s", e)
             return []
 
     def download_video(self, video_url: str, output_dir: str = '.') -> bool:
@@ -55,25 +55,28 @@ class VideoStreamingClient:
                         downloaded += len(chunk)
                         # Calculate progress
                         progress = (downloaded / total_size) * 100
-                        logging.info(f"Download progress: {progress:.1f}%")
+                        progress_log.info("Download progress: %.1f%%", progress)
 
             end_time = time.time()
             duration = end_time - start_time
             speed = total_size / (1024 * 1024 * duration)  # MB/s
             
-            logging.info(f"Download completed: {filename}")
-            logging.info(f"Download speed: {speed:.2f} MB/s")
+            logging.info("Download completed: %s", filename)
+            logging.info("Download speed: %.2f MB/s", speed)
             return True
 
         except requests.exceptions.RequestException as e:
-            logging.error(f"Error downloading video: {str(e)}")
+            logging.error("Error downloading video: %s", e)
             return False
 
 def main():
     parser = argparse.ArgumentParser(description='Video Streaming Client')
     parser.add_argument('--server', required=True, help='Server URL (e.g., http://localhost:8000)')
     parser.add_argument('--output', default='.', help='Output directory for downloaded videos')
+    parser.add_argument('--progress-log-every', type=int, default=128,
+                        help='Log download progress for one in every N chunks')
     args = parser.parse_args()
+    set_sampling('client.progress', args.progress_log_every)
 
     client = VideoStreamingClient(args.server)
     
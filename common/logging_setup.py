@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+from typing import Dict, List, Optional
+
+DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Records buffered between callers and the writer thread before new ones are dropped
+QUEUE_SIZE = 10000
+# Records written to the log file per write() call at most
+BATCH_SIZE = 256
+# Longest a buffered record waits before it reaches the file
+FLUSH_INTERVAL = 1.0
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hand records to the writer thread without ever blocking the caller.
+
+    Unlike the stock QueueHandler the message is not formatted here: the
+    record keeps its %-style msg and args and is formatted by the writer
+    thread, so a record that is sampled out or dropped costs no formatting.
+    When the queue is full the record is dropped and counted.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class BatchingFileHandler(logging.FileHandler):
+    """FileHandler that writes buffered records in batches.
+
+    Records are written once BATCH_SIZE have accumulated, when the writer
+    thread has been idle for FLUSH_INTERVAL, or immediately for errors.
+    """
+    def __init__(self, filename: str, batch_size: int = BATCH_SIZE):
+        super().__init__(filename)
+        self.batch_size = batch_size
+        self._batch: List[str] = []
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self._batch.append(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._batch) >= self.batch_size or record.levelno >= logging.ERROR:
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self._batch and self.stream is not None:
+                self.stream.write(''.join(self._batch))
+                self._batch.clear()
+            super().flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """QueueListener that flushes its handlers whenever the queue goes idle."""
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler,
+                 flush_interval: float = FLUSH_INTERVAL):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        while True:
+            try:
+                return self.queue.get(block, self.flush_interval)
+            except queue.Empty:
+                if not block:
+                    raise
+                for handler in self.handlers:
+                    handler.flush()
+
+class SampleFilter(logging.Filter):
+    """Pass one in every `every` records of a logger; warnings and errors always pass."""
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._seen = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        # Unsynchronized on purpose: a lost increment only shifts which record is kept
+        self._seen += 1
+        return self._seen % self.every == 0
+
+_listener: Optional[BatchingQueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+def _restart_in_child():
+    # The writer thread does not survive fork, so forked workers get their own
+    global _listener
+    if _listener is None:
+        return
+    log_queue: queue.Queue = queue.Queue(QUEUE_SIZE)
+    for handler in _listener.handlers:
+        if isinstance(handler, BatchingFileHandler):
+            # The parent writes the records it had buffered itself
+            handler._batch.clear()
+    _listener = BatchingQueueListener(log_queue, *_listener.handlers)
+    _listener.start()
+    _queue_handler.queue = log_queue
+
+def _stop_listener():
+    # Drains what is queued; logging.shutdown then flushes the last batch
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_in_child)
+atexit.register(_stop_listener)
+
+def setup_logging(filename: str, level: int = logging.INFO, fmt: str = DEFAULT_FORMAT,
+                  sample: Optional[Dict[str, int]] = None) -> NonBlockingQueueHandler:
+    """Route every logger through a queue to a batching file writer and stderr.
+
+    Callers only pay for an enqueue; formatting and file I/O happen on one
+    background thread, so a slow disk never stalls a stream or a packet-in.
+    sample maps logger names to N, keeping one in every N of their
+    records below WARNING.
+    """
+    global _listener, _queue_handler
+    _stop_listener()
+
+    formatter = logging.Formatter(fmt)
+    file_handler = BatchingFileHandler(filename)
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+    log_queue: queue.Queue = queue.Queue(QUEUE_SIZE)
+    _listener = BatchingQueueListener(log_queue, file_handler, stream_handler)
+    _listener.start()
+
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    for name, every in (sample or {}).items():
+        set_sampling(name, every)
+    return _queue_handler
+
+def set_sampling(name: str, every: int):
+    """Keep one in every `every` records of logger name below WARNING; 1 keeps all."""
+    logger = logging.getLogger(name)
+    logger.filters = [f for f in logger.filters if not isinstance(f, SampleFilter)]
+    if every > 1:
+        logger.addFilter(SampleFilter(every))
@@ -1,18 +1,120 @@
 #!/usr/bin/env python3
 
+import bisect
+import hashlib
+import math
 import random
-from typing import List, Dict
-from dataclasses import dataclass
+from typing import Callable, List, Dict, Hashable, Iterator, Optional, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
 import logging
 import time
 
+# Written on every stats update, so the controller samples it
+stats_log = logging.getLogger('load_balancer.stats')
+
 class LoadBalancingAlgorithm(Enum):
     RANDOM = "random"
     ROUND_ROBIN = "round_robin"
     WEIGHTED_ROUND_ROBIN = "weighted_round_robin"
     BANDWIDTH_AWARE = "bandwidth_aware"
     REQUEST_DEMAND = "request_demand"
+    SMOOTH_WEIGHTED_ROUND_ROBIN = "smooth_weighted_round_robin"
+    P2C_LEAST_LOADED = "p2c_least_loaded"
+    PEAK_EWMA = "peak_ewma"
+    CONSISTENT_HASH = "consistent_hash"
+
+# Seconds for a latency estimate to decay to 1/e of its weight
+LATENCY_DECAY = 10.0
+# Latency (ms) assumed for a server that has not reported one yet
+DEFAULT_LATENCY = 30.0
+# Random draws tried before falling back to a scan when sampled servers are draining or weighted out
+SAMPLE_ATTEMPTS = 8
+
+# Ring points per unit of server weight
+VIRTUAL_NODES = 100
+# No server takes more than (1 + LOAD_EPSILON) times its weighted share of the load
+LOAD_EPSILON = 0.25
+
+# Server fields the selection heaps are ordered by
+LOAD_FIELDS = frozenset({'weight', 'current_connections', 'bandwidth_usage', 'response_time', 'draining'})
+
+class IndexedHeap:
+    """Binary min-heap of keys with a position index.
+
+    Besides push/pop it can change or remove any key's priority in
+    O(log n), and peek() at the minimum is O(1).
+    """
+    def __init__(self):
+        self._heap: List[Tuple[Tuple, Hashable]] = []
+        self._pos: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._pos
+
+    def peek(self) -> Hashable:
+        return self._heap[0][1]
+
+    def set(self, key: Hashable, priority: Tuple):
+        """Insert key, or move it to its new priority."""
+        i = self._pos.get(key)
+        if i is None:
+            self._heap.append((priority, key))
+            self._pos[key] = len(self._heap) - 1
+            self._sift_up(len(self._heap) - 1)
+            return
+        old = self._heap[i][0]
+        self._heap[i] = (priority, key)
+        if priority < old:
+            self._sift_up(i)
+        elif old < priority:
+            self._sift_down(i)
+
+    def remove(self, key: Hashable):
+        i = self._pos.pop(key, None)
+        if i is None:
+            return
+        last = self._heap.pop()
+        if i == len(self._heap):
+            return
+        self._heap[i] = last
+        self._pos[last[1]] = i
+        self._sift_up(i)
+        self._sift_down(self._pos[last[1]])
+
+    def _sift_up(self, i: int):
+        heap, pos = self._heap, self._pos
+        item = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if not item[0] < heap[parent][0]:
+                break
+            heap[i] = heap[parent]
+            pos[heap[i][1]] = i
+            i = parent
+        heap[i] = item
+        pos[item[1]] = i
+
+    def _sift_down(self, i: int):
+        heap, pos = self._heap, self._pos
+        n = len(heap)
+        item = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and heap[child + 1][0] < heap[child][0]:
+                child += 1
+            if not heap[child][0] < item[0]:
+                break
+            heap[i] = heap[child]
+            pos[heap[i][1]] = i
+            i = child
+        heap[i] = item
+        pos[item[1]] = i
 
 @dataclass
 class Server:
@@ -24,56 +126,378 @@ class Server:
     last_request_time: float = 0.0
     video_quality: str = "auto"
     response_time: float = 0.0
+    cache_hit_rate: float = 0.0
+    # When the server last pushed a measured load report
+    last_report_time: float = 0.0
+    # Draining servers keep their existing flows but get no new ones
+    draining: bool = False
+    # Called with the server and the field name whenever one of LOAD_FIELDS changes
+    on_load_change: Optional[Callable[['Server', str], None]] = field(default=None, init=False, repr=False,
+                                                                     compare=False)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in LOAD_FIELDS and self.on_load_change is not None:
+            self.on_load_change(self, name)
+
+class PeakEWMA:
+    """Decaying latency estimate that jumps to any sample above it.
+
+    Samples below the estimate are blended in with a weight that grows
+    with the time since the last one, and reading the estimate decays it
+    toward zero, so a server that was slow once is tried again after a
+    while instead of being avoided forever. Until the first sample the
+    estimate is a fixed default rather than zero, as in Finagle's and
+    linkerd's Peak EWMA, so a new or restarted server is not taken for
+    the fastest one and flooded.
+    """
+    __slots__ = ('value', 'stamp', 'decay', 'sampled')
+
+    def __init__(self, decay: float = LATENCY_DECAY, default: float = DEFAULT_LATENCY):
+        self.value = default
+        self.stamp = time.monotonic()
+        self.decay = decay
+        self.sampled = False
+
+    def observe(self, sample: float, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        if sample > self.value or not self.sampled:
+            self.value = sample
+        else:
+            weight = math.exp(-max(now - self.stamp, 0.0) / self.decay)
+            self.value = self.value * weight + sample * (1.0 - weight)
+        self.stamp = now
+        self.sampled = True
+
+    def get(self, now: Optional[float] = None) -> float:
+        if self.sampled:
+            now = time.monotonic() if now is None else now
+            self.value *= math.exp(-max(now - self.stamp, 0.0) / self.decay)
+            self.stamp = now
+        return self.value
+
+QUALITIES = ("320p", "480p", "720p")
+QUALITY_INDEX = {quality: i for i, quality in enumerate(QUALITIES)}
+
+class ServerStats:
+    """Request counters of one server, slotted to stay small in large pools."""
+    __slots__ = ('requests_handled', 'total_bandwidth', 'average_response_time', 'quality_counts')
+
+    def __init__(self):
+        self.requests_handled = 0
+        self.total_bandwidth = 0.0
+        self.average_response_time = 0.0
+        # Requests per quality, in QUALITIES order
+        self.quality_counts = [0] * len(QUALITIES)
+
+    def record(self, bandwidth: float, response_time: float, video_quality: str):
+        self.requests_handled += 1
+        self.total_bandwidth += bandwidth
+        self.average_response_time += (response_time - self.average_response_time) / self.requests_handled
+        if video_quality != "auto":
+            self.quality_counts[QUALITY_INDEX[video_quality]] += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            'requests_handled': self.requests_handled,
+            'total_bandwidth': self.total_bandwidth,
+            'average_response_time': self.average_response_time,
+            'video_qualities': dict(zip(QUALITIES, self.quality_counts)),
+        }
+
+class ServerRegistry:
+    """The server pool, indexed by position, id and IP.
+
+    Positions are stable (servers are only ever added), so they double as
+    compact keys for the selection structures, and every lookup by id or
+    IP is a dict hit rather than a scan of the pool.
+    """
+    def __init__(self):
+        self.servers: List[Server] = []
+        self.stats: List[ServerStats] = []
+        self._by_id: Dict[str, int] = {}
+        self._by_ip: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.servers)
+
+    def add(self, server: Server) -> int:
+        if server.id in self._by_id:
+            raise ValueError(f"Duplicate server id: {server.id}")
+        index = len(self.servers)
+        self.servers.append(server)
+        self.stats.append(ServerStats())
+        self._by_id[server.id] = index
+        self._by_ip.setdefault(server.ip, index)
+        return index
+
+    def index(self, server_id: str) -> Optional[int]:
+        return self._by_id.get(server_id)
+
+    def by_id(self, server_id: str) -> Optional[Server]:
+        index = self._by_id.get(server_id)
+        return self.servers[index] if index is not None else None
+
+    def by_ip(self, ip: str) -> Optional[Server]:
+        index = self._by_ip.get(ip)
+        return self.servers[index] if index is not None else None
+
+def ring_hash(value: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+def content_key(path: str) -> str:
+    """Affinity key of a request path: its representation for DASH segments.
+
+    All segments of one representation then hash to the same origin, so
+    its cache holds that representation once instead of every origin
+    holding every segment.
+    """
+    parts = path.split('?', 1)[0].strip('/').split('/')
+    if len(parts) >= 3 and parts[0] in ('dash', 'live'):
+        return '/'.join(parts[:2])
+    return '/'.join(parts)
+
+class HashRing:
+    """Consistent-hash ring of registry positions with virtual nodes.
+
+    Each server owns weight * virtual_nodes points, so adding or removing
+    one moves only about 1/n of the keys, and those come evenly from
+    every other server.
+    """
+    def __init__(self, servers: List[Server], virtual_nodes: int = VIRTUAL_NODES):
+        points = []
+        for index, server in enumerate(servers):
+            for replica in range(max(server.weight, 0) * virtual_nodes):
+                points.append((ring_hash(f'{server.id}#{replica}'), index))
+        points.sort()
+        self._hashes = [h for h, _ in points]
+        self._owners = [index for _, index in points]
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def walk(self, key: str) -> Iterator[int]:
+        """Distinct servers in ring order, starting at the one that owns key."""
+        n = len(self._hashes)
+        start = bisect.bisect_right(self._hashes, ring_hash(key))
+        seen = set()
+        for i in range(start, start + n):
+            index = self._owners[i % n]
+            if index not in seen:
+                seen.add(index)
+                yield index
+
+# Scores compared between two sampled servers, lower wins
+TWO_CHOICE_SCORES: Dict[LoadBalancingAlgorithm, Callable[[Server, PeakEWMA], Tuple]] = {
+    LoadBalancingAlgorithm.P2C_LEAST_LOADED: lambda s, latency: ((s.current_connections + 1) / s.weight,
+                                                                latency.get()),
+    LoadBalancingAlgorithm.PEAK_EWMA: lambda s, latency: (latency.get() * (s.current_connections + 1),
+                                                         s.current_connections),
+}
+
+# Heap priority of a server for each least-loaded algorithm; the add order breaks ties
+PRIORITIES: Dict[LoadBalancingAlgorithm, Callable[[Server], Tuple]] = {
+    LoadBalancingAlgorithm.WEIGHTED_ROUND_ROBIN: lambda s: (s.current_connections / s.weight,),
+    LoadBalancingAlgorithm.BANDWIDTH_AWARE: lambda s: (s.bandwidth_usage,),
+    LoadBalancingAlgorithm.REQUEST_DEMAND: lambda s: (s.current_connections, s.response_time),
+}
 
 class LoadBalancer:
-    def __init__(self, algorithm: LoadBalancingAlgorithm = LoadBalancingAlgorithm.ROUND_ROBIN):
+    def __init__(self, algorithm: LoadBalancingAlgorithm = LoadBalancingAlgorithm.ROUND_ROBIN,
+                 virtual_nodes: int = VIRTUAL_NODES, load_epsilon: float = LOAD_EPSILON):
         self.algorithm = algorithm
-        self.servers: List[Server] = []
+        self.virtual_nodes = virtual_nodes
+        self.load_epsilon = load_epsilon
+        self.registry = ServerRegistry()
+        # The registry's list, in the order servers were added
+        self.servers: List[Server] = self.registry.servers
         self.current_index = 0
-        self.server_stats: Dict[str, Dict] = {}
+        # Smooth weighted round robin state, by registry position
+        self._swrr_current: List[int] = []
+        # Response time estimates of the two-choice algorithms, by registry position
+        self._latency: List[PeakEWMA] = []
         self.quality_weights = {"320p": 1, "480p": 2, "720p": 3}
+        # Positions of the servers that are not draining and have a positive weight, ordered for
+        # self._heap_algorithm; None while the algorithm is not a least-loaded one
+        self._heap: Optional[IndexedHeap] = None
+        self._heap_algorithm: Optional[LoadBalancingAlgorithm] = None
+        # Built on first use and again after servers or weights change
+        self._ring: Optional[HashRing] = None
+        # (connections, weight) of the servers that are not draining and have a positive weight,
+        # None for the others, for the bounded-load cap
+        self._counted: List[Optional[Tuple[int, int]]] = []
+        self._active_load = 0
+        self._active_weight = 0
 
     def add_server(self, server: Server):
-        self.servers.append(server)
-        self.server_stats[server.id] = {
-            'requests_handled': 0,
-            'total_bandwidth': 0,
-            'average_response_time': 0,
-            'video_qualities': {"320p": 0, "480p": 0, "720p": 0}
-        }
+        self.registry.add(server)
+        self._swrr_current.append(0)
+        self._latency.append(PeakEWMA())
+        self._counted.append(None)
+        self._ring = None
+        server.on_load_change = self._load_changed
+        self._load_changed(server)
+
+    def get_next_server(self, key: Optional[str] = None) -> Server:
+        """Choose the server for a new flow.
 
-    def get_next_server(self) -> Server:
+        key is the affinity key CONSISTENT_HASH maps to a server, such as
+        the client IP or content_key(path); the other algorithms ignore it.
+        """
         if not self.servers:
             raise ValueError("No servers available")
+        if self.algorithm == LoadBalancingAlgorithm.CONSISTENT_HASH:
+            return self._consistent_hash(key)
+        if self.algorithm in PRIORITIES:
+            return self._least_loaded()
+        if self.algorithm in TWO_CHOICE_SCORES:
+            return self._two_choices()
+        # If every server is draining, keep serving rather than refuse the request
+        servers = [s for s in self.servers if not s.draining] or self.servers
 
         if self.algorithm == LoadBalancingAlgorithm.RANDOM:
-            return random.choice(self.servers)
+            return random.choice(servers)
         elif self.algorithm == LoadBalancingAlgorithm.ROUND_ROBIN:
-            server = self.servers[self.current_index]
-            self.current_index = (self.current_index + 1) % len(self.servers)
+            server = servers[self.current_index % len(servers)]
+            self.current_index = (self.current_index + 1) % len(servers)
             return server
-        elif self.algorithm == LoadBalancingAlgorithm.WEIGHTED_ROUND_ROBIN:
-            return sorted(self.servers, key=lambda x: (x.current_connections / x.weight))[0]
-        elif self.algorithm == LoadBalancingAlgorithm.BANDWIDTH_AWARE:
-            return min(self.servers, key=lambda x: x.bandwidth_usage)
-        elif self.algorithm == LoadBalancingAlgorithm.REQUEST_DEMAND:
-            return min(self.servers, key=lambda x: (x.current_connections, x.response_time))
+        elif self.algorithm == LoadBalancingAlgorithm.SMOOTH_WEIGHTED_ROUND_ROBIN:
+            return self._smooth_weighted(servers)
         else:
             raise ValueError(f"Unknown algorithm: {self.algorithm}")
 
+    def _smooth_weighted(self, servers: List[Server]) -> Server:
+        """nginx's smooth weighted round robin.
+
+        Every pick adds each server's weight to its current weight, takes
+        the server with the highest current weight and subtracts the total
+        weight from it. Over any run of sum(weights) picks each server is
+        chosen weight times, spread out rather than in bursts (weights
+        5, 1, 1 give a a b a c a a). Weights are read on every pick, so a
+        changed weight takes effect at once without restarting the cycle.
+        """
+        current = self._swrr_current
+        total = 0
+        best = -1
+        for server in servers:
+            if server.weight <= 0:
+                continue
+            index = self.registry.index(server.id)
+            current[index] += server.weight
+            total += server.weight
+            if best < 0 or current[index] > current[best]:
+                best = index
+        if best < 0:
+            raise ValueError("No server has a positive weight")
+        current[best] -= total
+        return self.servers[best]
+
+    def _consistent_hash(self, key: Optional[str]) -> Server:
+        """Consistent hashing with bounded loads.
+
+        key goes to the first server clockwise from its hash whose load is
+        below ceil((1 + load_epsilon) * (total + 1) * weight / total_weight),
+        so a key keeps its server (and that server's cache) unless the
+        server is draining or already carries more than its weighted share.
+        Totals count only the servers that can be chosen.
+        """
+        if self._ring is None:
+            self._ring = HashRing(self.servers, self.virtual_nodes)
+        if key is None:
+            key = str(random.getrandbits(64))
+        share = (1 + self.load_epsilon) * (self._active_load + 1) / max(self._active_weight, 1)
+        first = None
+        for index in self._ring.walk(key):
+            server = self.servers[index]
+            if server.draining:
+                continue
+            if server.current_connections < math.ceil(share * server.weight):
+                return server
+            if first is None:
+                first = server
+        # Every server is full or draining (or has weight 0)
+        return first or self._ring_fallback()
+
+    def _ring_fallback(self) -> Server:
+        return next((s for s in self.servers if not s.draining), self.servers[0])
+
+    def _two_choices(self) -> Server:
+        """Power of two choices: the better of two random servers, in O(1).
+
+        Comparing just two random servers keeps the maximum load within
+        a small factor of the optimum, without looking at the whole pool.
+        """
+        score = TWO_CHOICE_SCORES[self.algorithm]
+        candidates = self._sample_two()
+        return self.servers[min(candidates, key=lambda i: score(self.servers[i], self._latency[i]))]
+
+    def _sample_two(self) -> Tuple[int, ...]:
+        """Two random positions of servers that are not draining and have a positive weight."""
+        servers = self.servers
+        n = len(servers)
+        if n > 1:
+            for _ in range(SAMPLE_ATTEMPTS):
+                a, b = random.sample(range(n), 2)
+                if (not servers[a].draining and servers[a].weight > 0
+                        and not servers[b].draining and servers[b].weight > 0):
+                    return a, b
+        # Small pools, or most servers draining or at weight 0, which is never chosen
+        weighted = [i for i, s in enumerate(servers) if s.weight > 0]
+        if not weighted:
+            raise ValueError("No server has a positive weight")
+        indexes = [i for i in weighted if not servers[i].draining] or weighted
+        return tuple(random.sample(indexes, min(2, len(indexes))))
+
+    def _least_loaded(self) -> Server:
+        """The minimum of the current algorithm's heap, rebuilt only when the algorithm changes."""
+        if self._heap_algorithm != self.algorithm:
+            self._heap_algorithm = self.algorithm
+            self._heap = IndexedHeap()
+            for server in self.servers:
+                self._load_changed(server)
+        if not self._heap:
+            # Every server is draining or has weight 0, which is never chosen
+            weighted = [s for s in self.servers if s.weight > 0]
+            if not weighted:
+                raise ValueError("No server has a positive weight")
+            return min(weighted, key=PRIORITIES[self.algorithm])
+        return self.servers[self._heap.peek()]
+
+    def _load_changed(self, server: Server, name: str = ''):
+        # Heap keys are registry positions, which also break ties
+        index = self.registry.index(server.id)
+        if index is None:
+            return
+        if name == 'response_time' and server.response_time > 0:
+            # Idle origins report 0, which is no sample; the estimate decays by itself
+            self._latency[index].observe(server.response_time)
+        elif name == 'weight':
+            self._ring = None
+        old = self._counted[index]
+        new = None if server.draining or server.weight <= 0 else (server.current_connections, server.weight)
+        if old is not None:
+            self._active_load -= old[0]
+            self._active_weight -= old[1]
+        if new is not None:
+            self._active_load += new[0]
+            self._active_weight += new[1]
+        self._counted[index] = new
+        if self._heap is None:
+            return
+        if self._heap_algorithm != self.algorithm:
+            # Switched away from the heap's algorithm; rebuilt if it is chosen again
+            self._heap = self._heap_algorithm = None
+        elif server.draining or server.weight <= 0:
+            self._heap.remove(index)
+        else:
+            self._heap.set(index, PRIORITIES[self._heap_algorithm](server) + (index,))
+
     def update_server_stats(self, server_id: str, bandwidth: float, response_time: float, video_quality: str = "auto"):
-        if server_id in self.server_stats:
-            stats = self.server_stats[server_id]
-            server = next(s for s in self.servers if s.id == server_id)
-
-            stats['requests_handled'] += 1
-            stats['total_bandwidth'] += bandwidth
-            stats['average_response_time'] = (
-                (stats['average_response_time'] * (stats['requests_handled'] - 1) + response_time)
-                / stats['requests_handled']
-            )
-            if video_quality != "auto":
-                stats['video_qualities'][video_quality] += 1
+        index = self.registry.index(server_id)
+        if index is not None:
+            server = self.servers[index]
+            self.registry.stats[index].record(bandwidth, response_time, video_quality)
 
             server.current_connections += 1
             server.bandwidth_usage += bandwidth
@@ -81,15 +505,46 @@ class LoadBalancer:
             server.last_request_time = time.time()
             server.video_quality = video_quality
 
-            logging.info(f"Updated stats for {server_id}: connections={server.current_connections}, bandwidth={server.bandwidth_usage:.2f}MB/s, response_time={server.response_time:.2f}ms")
+            stats_log.info("Updated stats for %s: connections=%d, bandwidth=%.2fMB/s, response_time=%.2fms",
+                           server_id, server.current_connections, server.bandwidth_usage, server.response_time)
+
+    def find_server(self, server_id: str = None, ip: str = None) -> Optional[Server]:
+        server = self.registry.by_id(server_id) if server_id is not None else None
+        if server is None and ip is not None:
+            server = self.registry.by_ip(ip)
+        return server
+
+    def set_draining(self, server_id: str, draining: bool = True):
+        """Stop (or resume) choosing a server for new flows; installed flows are left alone."""
+        server = self.find_server(server_id)
+        if server is not None and server.draining != draining:
+            server.draining = draining
+            logging.info("%s is %s", server_id, 'draining' if draining else 'back in rotation')
+
+    def apply_load_report(self, server_id: str, active_connections: int, bandwidth: float,
+                          response_time: float, cache_hit_rate: float = 0.0, draining: bool = False):
+        """Replace a server's estimated load with what it measured itself.
+
+        bandwidth is in MB/s and response_time (time to first byte) in ms,
+        the same units update_server_stats uses.
+        """
+        server = self.find_server(server_id)
+        if server is None:
+            return
+        server.current_connections = active_connections
+        server.bandwidth_usage = bandwidth
+        server.response_time = response_time
+        server.cache_hit_rate = cache_hit_rate
+        server.last_report_time = time.time()
+        self.set_draining(server_id, draining)
 
     def get_server_stats(self) -> Dict:
-        return self.server_stats
+        return {server.id: stats.to_dict() for server, stats in zip(self.servers, self.registry.stats)}
 
     def get_optimal_quality(self, server_id: str) -> str:
-        if server_id not in self.server_stats:
+        server = self.registry.by_id(server_id)
+        if server is None:
             return "auto"
-        server = next(s for s in self.servers if s.id == server_id)
         if server.current_connections > 5 or server.bandwidth_usage > 10:
             return "320p"
         if server.response_time < 100 and server.current_connections < 3:
@@ -99,6 +554,9 @@ class LoadBalancer:
     def cleanup_old_connections(self, timeout: int = 300):
         current_time = time.time()
         for server in self.servers:
+            # Reported connection counts are measured, not estimated
+            if (current_time - server.last_report_time) <= timeout:
+                continue
             if (current_time - server.last_request_time) > timeout:
                 server.current_connections = max(0, server.current_connections - 1)
                 logging.info(f"Cleaned up old connection for {server.id}")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import socket
+import time
+from typing import Dict, Optional, Tuple
+
+# Must match servers/load.py
+HEARTBEAT_PORT = 9999
+# A process that has not reported for this many seconds is left out of the sums
+STALE_AFTER = 5.0
+
+class LoadReportReceiver:
+    """Feed the origins' UDP load reports into a LoadBalancer.
+
+    Every serving process reports separately, tagged with its server id
+    and pid, so the reports of a server are summed across its processes
+    before they replace the balancer's estimates. Servers are matched by
+    id, falling back to the report's source IP.
+    """
+    def __init__(self, lb, host: str = '0.0.0.0', port: int = HEARTBEAT_PORT,
+                 stale_after: float = STALE_AFTER):
+        self.lb = lb
+        self.address = (host, port)
+        self.stale_after = stale_after
+        self.reports: Dict[str, Dict[int, Tuple[float, Dict]]] = {}
+        self.received = 0
+        self.rejected = 0
+
+    def serve_forever(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind(self.address)
+            logging.info(f"Listening for load reports on {self.address[0]}:{self.address[1]}")
+            while True:
+                data, (ip, _) = sock.recvfrom(65535)
+                self.handle(data, ip)
+
+    def handle(self, data: bytes, ip: str):
+        report = self._decode(data)
+        server = None
+        if report is not None:
+            server = self.lb.find_server(report.get('id'), ip)
+        if server is None:
+            self.rejected += 1
+            return
+        self.received += 1
+
+        now = time.time()
+        processes = self.reports.setdefault(server.id, {})
+        processes[report.get('pid', 0)] = (now, report)
+        for pid in [p for p, (t, _) in processes.items() if now - t > self.stale_after]:
+            del processes[pid]
+        live = [r for _, r in processes.values()]
+
+        self.lb.apply_load_report(
+            server.id,
+            active_connections=sum(r.get('active_connections', 0) for r in live),
+            bandwidth=sum(r.get('bytes_per_sec', {}).get('10s', 0) for r in live) / (1024 * 1024),
+            response_time=max(r.get('ttfb_ms', {}).get('p90', 0.0) for r in live),
+            cache_hit_rate=sum(r.get('cache_hit_rate', 0.0) for r in live) / len(live),
+            draining=any(r.get('state') == 'draining' for r in live),
+        )
+
+    def _decode(self, data: bytes) -> Optional[Dict]:
+        try:
+            report = json.loads(data)
+        except ValueError:
+            return None
+        return report if isinstance(report, dict) else None
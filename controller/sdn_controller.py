@@ -7,13 +7,18 @@ from ryu.ofproto import ofproto_v1_3
 from ryu.lib.packet import packet, ethernet, ipv4, tcp, arp
 from ryu.lib import hub
 import logging
+import os
+import sys
 from load_balancer import LoadBalancer, Server, LoadBalancingAlgorithm
+from load_reports import LoadReportReceiver
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(message)s',
-    handlers=[logging.FileHandler('controller.log'), logging.StreamHandler()]
-)
+# Helpers shared with the origin and client live in the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.logging_setup import setup_logging
+
+# Per-request stats are kept at one in ten so logging stays off the packet-in path
+setup_logging('controller.log', fmt='%(asctime)s %(levelname)s %(message)s',
+              sample={'load_balancer.stats': 10})
 
 class VideoStreamingController(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
@@ -30,6 +35,9 @@ class VideoStreamingController(app_manager.RyuApp):
         self.ip_to_mac = {}
         # Stats thread
         hub.spawn(self._monitor)
+        # Measured load pushed by the origins (servers/server.py --heartbeat)
+        self.load_reports = LoadReportReceiver(self.lb)
+        hub.spawn(self.load_reports.serve_forever)
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
@@ -170,7 +178,8 @@ class VideoStreamingController(app_manager.RyuApp):
 
     def _handle_video_request(self, dp, port, ip_hdr, tcp_hdr, msg):
         ofp, parser, dpid = dp.ofproto, dp.ofproto_parser, dp.id
-        srv = self.lb.get_next_server()
+        # The client IP is the affinity key when the consistent-hash algorithm is selected
+        srv = self.lb.get_next_server(ip_hdr.src)
         srv_mac = self.ip_to_mac[dpid].get(srv.ip)
         srv_port = self.mac_to_port[dpid].get(srv_mac)
         if not srv_mac or not srv_port:
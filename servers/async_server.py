@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+
+import asyncio
+import http.client
+import io
+import json
+import logging
+import os
+import time
+from email.utils import formatdate
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+
+from byteranges import ByteRangeResponse
+from catalog import CatalogEntry
+from drain import DRAIN_POLL_INTERVAL, DRAIN_SIGNAL, parse_drain_timeout
+from live import LiveUnavailable
+from origin import Origin
+from pacing import Pacer
+from singleflight import Flight
+from slow_clients import GUARD_CHUNK, SlowClientError, ThroughputGuard
+
+access_log = logging.getLogger('server.access')
+
+# Largest request head (request line + headers) we accept
+MAX_HEADER_BYTES = 64 * 1024
+# sendfile is issued in slices so a stalled client trips the write timeout
+SENDFILE_CHUNK = 1024 * 1024
+
+class _Connection:
+    """Per-connection state carried through the request loop."""
+    __slots__ = ('writer', 'requests', 'keep_alive', 'pacer', 'guard', 'opened', 'request_started', 'version')
+
+    def __init__(self, writer: asyncio.StreamWriter, pacer: Optional[Pacer] = None,
+                 guard: Optional[ThroughputGuard] = None):
+        self.writer = writer
+        self.requests = 0
+        self.keep_alive = False
+        self.pacer = pacer
+        self.guard = guard
+        self.opened = time.monotonic()
+        self.request_started = 0.0
+        self.version = 'HTTP/1.1'
+
+class AsyncVideoServer:
+    """asyncio origin with the same routes as VideoStreamingHandler.
+
+    Every connection is a coroutine instead of a thread, so thousands of
+    slow DASH clients can stay open on one event loop. Each transport has a
+    bounded write buffer and every write waits for drain(), so a slow reader
+    holds at most write_buffer_limit bytes of memory. A connection that sends
+    no request for idle_timeout seconds is closed; one that accepts no data
+    for the write timeout, or too little under the minimum client rate, is
+    evicted (see SlowClientPolicy).
+
+    Connections are persistent HTTP/1.1: after a response the next request
+    is read from the same connection, for up to keepalive_timeout seconds
+    and max_keepalive_requests requests.
+    """
+    def __init__(self, config, origin: Origin):
+        self.config = config
+        self.origin = origin
+        self.connections = 0
+        self.accepted = 0
+        self.idle_timeouts = 0
+        self.read_timeouts = 0
+        self.write_timeouts = 0
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(
+            self._handle_connection, port=self.config.port, limit=MAX_HEADER_BYTES,
+            backlog=self.config.queue_depth, reuse_address=True
+        )
+        logging.info(f"Serving at port {self.config.port} with the asyncio engine")
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(DRAIN_SIGNAL, self.origin.drain.start, self.config.drain_timeout)
+        try:
+            # Connections are served by start_server's own tasks until a drain finishes
+            while not self.origin.drain.finished(self.origin.connections.active):
+                await asyncio.sleep(DRAIN_POLL_INTERVAL)
+        finally:
+            # Not waiting for wait_closed(): at the deadline open connections are dropped
+            server.close()
+        logging.info("Drained, stopping server")
+
+    def stats(self) -> Dict:
+        """Engine counters for this process."""
+        return {
+            'engine': 'asyncio',
+            'pid': os.getpid(),
+            'connections': self.connections,
+            'accepted': self.accepted,
+            'idle_timeouts': self.idle_timeouts,
+            'read_timeouts': self.read_timeouts,
+            'write_timeouts': self.write_timeouts,
+            'write_buffer_limit': self.config.write_buffer_limit,
+        }
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.accepted += 1
+        self.connections += 1
+        self.origin.connections.opened()
+        writer.transport.set_write_buffer_limits(high=self.config.write_buffer_limit)
+        conn = _Connection(writer, self.origin.new_pacer(), self.origin.new_guard())
+        try:
+            # Pipelined requests are already buffered in reader and are answered in order
+            while True:
+                timeout = self.config.keepalive_timeout if conn.requests else self.config.idle_timeout
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+                except asyncio.TimeoutError:
+                    if not conn.requests:
+                        self.idle_timeouts += 1
+                    return
+                except asyncio.LimitOverrunError:
+                    conn.keep_alive = False
+                    await self._send_error(conn, 431, "Request header fields too large")
+                    return
+                except asyncio.IncompleteReadError:
+                    return
+
+                request = self._parse_request(head)
+                if request is None:
+                    conn.keep_alive = False
+                    await self._send_error(conn, 400, "Bad request")
+                    return
+                method, path, version, headers = request
+                # Request bodies are not used, but must be consumed to keep framing intact
+                length = headers.get('Content-Length')
+                if length and length.isdigit() and int(length) > 0:
+                    try:
+                        await asyncio.wait_for(reader.readexactly(int(length)), self.config.idle_timeout)
+                    except asyncio.TimeoutError:
+                        # A stalled upload, not a client that stopped reading
+                        self.read_timeouts += 1
+                        return
+
+                conn.request_started = time.monotonic()
+                conn.version = version
+                self.origin.connections.request(reused=conn.requests > 0)
+                conn.requests += 1
+                conn.keep_alive = self._wants_keep_alive(version, headers) \
+                    and conn.requests < self.config.max_keepalive_requests \
+                    and not self.origin.drain.draining
+                await self._dispatch(conn, method, path, headers)
+                if not conn.keep_alive:
+                    return
+        except SlowClientError as e:
+            if e.reason == 'write_timeout':
+                self.write_timeouts += 1
+            held = time.monotonic() - conn.opened
+            self.origin.slow_clients.evicted(e.reason, held)
+            logging.warning("Evicting slow client %s after %.1fs: %s",
+                            writer.get_extra_info('peername'), held, e)
+        except ConnectionError:
+            pass
+        except Exception as e:
+            logging.error("Error handling connection: %s", e)
+        finally:
+            self.connections -= 1
+            self.origin.connections.closed()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    def _wants_keep_alive(self, version: str, headers: http.client.HTTPMessage) -> bool:
+        connection = headers.get('Connection', '').lower()
+        if version >= 'HTTP/1.1':
+            return connection != 'close'
+        return connection == 'keep-alive'
+
+    def _parse_request(self, head: bytes) -> Optional[Tuple[str, str, str, http.client.HTTPMessage]]:
+        request_line, _, rest = head.partition(b'\r\n')
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+            return None
+        try:
+            headers = http.client.parse_headers(io.BytesIO(rest))
+        except http.client.HTTPException:
+            return None
+        return parts[0], parts[1], parts[2], headers
+
+    async def _dispatch(self, conn: _Connection, method: str, path: str,
+                        headers: http.client.HTTPMessage):
+        if method == 'POST' and path.split('?', 1)[0] == '/_drain':
+            await self._start_drain(conn, path)
+        elif method != 'GET':
+            await self._send_error(conn, 501, "Unsupported method")
+        elif path == '/':
+            await self._send_video_list(conn, headers)
+        elif path.startswith('/video/'):
+            await self._stream_video(conn, path[7:], headers)
+        elif path.startswith('/dash/'):
+            await self._send_dash(conn, path[6:].split('?', 1)[0], headers)
+        elif path.startswith('/live/'):
+            await self._send_live(conn, path[6:].split('?', 1)[0])
+        elif path == '/_stats':
+            await self._send_json(conn, {**self.stats(), **self.origin.stats()})
+        elif path == '/_load':
+            await self._send_json(conn, self.origin.load_report())
+        else:
+            await self._send_static(conn, path, headers)
+
+    async def _start_drain(self, conn: _Connection, path: str):
+        try:
+            timeout = parse_drain_timeout(path, self.config.drain_timeout)
+        except ValueError:
+            await self._send_error(conn, 400, "Bad drain timeout")
+            return
+        self.origin.drain.request(timeout)
+        conn.keep_alive = False
+        await self._send_json(conn, self.origin.drain.stats(), status=202)
+
+    async def _send_video_list(self, conn: _Connection, headers: http.client.HTTPMessage):
+        encoding, body = self.origin.video_list(headers.get('Accept-Encoding'))
+        response_headers = [('Content-type', 'application/json'),
+                            ('Content-Length', str(len(body)))]
+        if encoding != 'identity':
+            response_headers.append(('Content-Encoding', encoding))
+        response_headers.append(('Vary', 'Accept-Encoding'))
+        await self._write(conn, self._response_head(conn, 200, response_headers) + body)
+
+    async def _stream_video(self, conn: _Connection, filename: str,
+                            headers: http.client.HTTPMessage):
+        entry = self.origin.video(filename)
+        if entry is None:
+            await self._send_error(conn, 404, "Video not found")
+            return
+        await self._send_entry(conn, entry, headers)
+
+    async def _send_dash(self, conn: _Connection, name: str,
+                         headers: http.client.HTTPMessage):
+        entry = self.origin.dash_request(name)
+        if entry is None:
+            await self._send_error(conn, 404, "Segment not found")
+            return
+        await self._send_entry(conn, entry, headers)
+
+    async def _send_static(self, conn: _Connection, path: str,
+                           headers: http.client.HTTPMessage):
+        entry = self.origin.static_entry(path)
+        if entry is None:
+            await self._send_error(conn, 404, "File not found")
+            return
+        await self._send_entry(conn, entry, headers)
+
+    async def _send_live(self, conn: _Connection, name: str):
+        if name.endswith('.mpd'):
+            manifest = self.origin.live_manifest(name)
+            if manifest is None:
+                await self._send_error(conn, 404, "Manifest not found")
+                return
+            head = self._response_head(conn, 200, [('Content-type', 'application/dash+xml'),
+                                                   ('Content-Length', str(len(manifest))),
+                                                   ('Cache-Control', 'no-cache')])
+            await self._write(conn, head + manifest)
+            return
+        try:
+            segment = self.origin.live_segment(name)
+        except LiveUnavailable as e:
+            await self._send_error(conn, 404, str(e))
+            return
+
+        entry = segment.entry
+        cached = self.origin.cached_hit(entry)
+        if cached is not None:
+            body = self.origin.live.media(segment, cached)
+        else:
+            body = await asyncio.get_running_loop().run_in_executor(None, self.origin.live_body, segment)
+        chunks = self.origin.live.chunks(segment, body)
+        chunked = conn.version >= 'HTTP/1.1'
+        headers = [('Content-type', entry.mime_type)]
+        if chunked:
+            headers.append(('Transfer-Encoding', 'chunked'))
+        else:
+            headers.append(('Content-Length', str(len(body))))
+            await self._wait_until(chunks[-1][0])
+        cache_control = self.origin.cache_policy.header(entry.content_class)
+        if cache_control:
+            headers.append(('Cache-Control', cache_control))
+        await self._write(conn, self._response_head(conn, 200, headers))
+        self.origin.load.first_byte(time.monotonic() - conn.request_started)
+
+        for release, offset, length in chunks:
+            if chunked:
+                await self._wait_until(release)
+                await self._write(conn, b'%x\r\n' % length)
+            await self._send_part(conn, body, offset, length)
+            if chunked:
+                await self._write(conn, b'\r\n')
+        if chunked:
+            await self._write(conn, b'0\r\n\r\n')
+        access_log.info("Successfully streamed live %s", name)
+
+    async def _wait_until(self, release: float):
+        delay = release - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _send_entry(self, conn: _Connection, entry: CatalogEntry,
+                          headers: http.client.HTTPMessage):
+        encoded = self.origin.encoded_response(entry, headers)
+        if encoded is not None:
+            response, body = encoded
+        else:
+            response = self.origin.plan_response(entry, headers)
+            body = None
+        if conn.pacer is not None:
+            conn.pacer.set_rate(self.origin.pace_rate(entry))
+        if body is None and response.parts:
+            # Misses are read by loader threads; the response streams from the Flight
+            body = self.origin.body(entry)
+        if body is not None or not response.parts:
+            await self._send_response(conn, response, body)
+        else:
+            with self.origin.open_file(entry) as f:
+                await self._send_response(conn, response, f)
+
+        access_log.info("Successfully streamed %s", entry.name)
+
+    async def _send_response(self, conn: _Connection, response: ByteRangeResponse, body):
+        await self._write(conn, self._response_head(conn, response.status, response.headers))
+        self.origin.load.first_byte(time.monotonic() - conn.request_started)
+        for prefix, offset, length in response.parts:
+            if prefix:
+                await self._write(conn, prefix)
+            if conn.pacer is None:
+                await self._send_part(conn, body, offset, length)
+                continue
+            for chunk_offset, chunk_length, delay in conn.pacer.chunks(offset, length):
+                if delay:
+                    await asyncio.sleep(delay)
+                await self._send_part(conn, body, chunk_offset, chunk_length)
+        if response.trailer:
+            await self._write(conn, response.trailer)
+
+    async def _send_part(self, conn: _Connection, body, offset: int, length: int):
+        if isinstance(body, memoryview):
+            await self._write(conn, body[offset:offset + length])
+        elif isinstance(body, Flight):
+            async for chunk in body.chunks_async(offset, length):
+                await self._write(conn, chunk)
+        else:
+            await self._sendfile(conn, body, offset, length)
+        self.origin.load.sent(length)
+
+    async def _send_json(self, conn: _Connection, payload, status: int = 200):
+        body = json.dumps(payload).encode()
+        head = self._response_head(conn, status, [('Content-type', 'application/json'),
+                                               ('Content-Length', str(len(body)))])
+        await self._write(conn, head + body)
+
+    async def _send_error(self, conn: _Connection, status: int, message: str):
+        body = message.encode()
+        head = self._response_head(conn, status, [('Content-type', 'text/plain'),
+                                                  ('Content-Length', str(len(body)))])
+        await self._write(conn, head + body)
+
+    def _response_head(self, conn: _Connection, status: int, headers: List[Tuple[str, str]]) -> bytes:
+        lines = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}',
+                 f'Date: {formatdate(usegmt=True)}',
+                 'Connection: keep-alive' if conn.keep_alive else 'Connection: close']
+        lines.extend(f'{name}: {value}' for name, value in headers)
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def _write(self, conn: _Connection, data: bytes):
+        """Write data and wait until the transport buffer is below its limit."""
+        started = time.monotonic()
+        conn.writer.write(data)
+        await self._timed(conn, conn.writer.drain())
+        if conn.guard is not None:
+            conn.guard.sent(len(data), time.monotonic() - started)
+
+    async def _timed(self, conn: _Connection, write):
+        """Await a write, evicting the client if it makes no progress for write_timeout."""
+        timeout = self.origin.slow_clients.write_timeout or None
+        try:
+            await asyncio.wait_for(write, timeout)
+        except asyncio.TimeoutError:
+            raise SlowClientError('write_timeout', f"no progress for {timeout:g}s")
+
+    async def _sendfile(self, conn: _Connection, f, offset: int, count: int):
+        """Send part of f with loop.sendfile, one timed slice at a time."""
+        loop = asyncio.get_running_loop()
+        while count > 0:
+            # Smaller slices under a throughput guard, so it is checked as often as in the threaded engine
+            chunk = min(count, GUARD_CHUNK if conn.guard is not None else SENDFILE_CHUNK)
+            started = time.monotonic()
+            await self._timed(conn, loop.sendfile(conn.writer.transport, f, offset, chunk))
+            if conn.guard is not None:
+                conn.guard.sent(chunk, time.monotonic() - started)
+            offset += chunk
+            count -= chunk
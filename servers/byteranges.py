@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+import uuid
+from typing import List, Optional, Tuple
+
+# Requests asking for more ranges than this get the whole file instead
+MAX_RANGES = 16
+
+class RangeNotSatisfiable(Exception):
+    """None of the requested byte ranges overlap the representation."""
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a Range header into a list of inclusive (start, end) byte ranges.
+
+    Returns None when the header should be ignored (absent, malformed, a unit
+    other than bytes, or too many ranges) so the caller sends a plain 200.
+    Overlapping and adjacent ranges are coalesced. Raises RangeNotSatisfiable
+    when the header is valid but no range overlaps the file.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec:
+        return None
+
+    specs = [s.strip() for s in spec.split(',') if s.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for s in specs:
+        first, dash, last = s.partition('-')
+        if not dash:
+            return None
+        try:
+            if not first:
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length <= 0 or size == 0:
+                    continue
+                ranges.append((max(0, size - length), size - 1))
+                continue
+            start = int(first)
+            end = int(last) if last else None
+        except ValueError:
+            return None
+        if start < 0 or (end is not None and end < start):
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, size - 1 if end is None else min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+    return coalesce(ranges)
+
+def coalesce(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Merge overlapping or adjacent ranges, keeping ascending order."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def if_range_matches(if_range: Optional[str], last_modified: str, etag: Optional[str] = None) -> bool:
+    """Check an If-Range validator; a mismatch means the whole file is sent."""
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('W/'):
+        # Weak validators never match for If-Range
+        return False
+    if if_range.startswith('"'):
+        return etag is not None and if_range == etag
+    return if_range == last_modified
+
+def content_range(start: int, end: int, size: int) -> str:
+    return f'bytes {start}-{end}/{size}'
+
+class MultipartByteranges:
+    """Framing for a multipart/byteranges body.
+
+    The part headers are built up front so the exact Content-Length is known
+    before any payload is sent, and the payload of each part can go through
+    the same zero-copy path as a single range.
+    """
+    def __init__(self, ranges: List[Tuple[int, int]], size: int, content_type: str):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/byteranges; boundary={self.boundary}'
+        self.parts = [
+            (
+                (f'\r\n--{self.boundary}\r\n'
+                 f'Content-Type: {content_type}\r\n'
+                 f'Content-Range: {content_range(start, end, size)}\r\n\r\n').encode('latin-1'),
+                start,
+                end - start + 1
+            )
+            for start, end in ranges
+        ]
+        self.trailer = f'\r\n--{self.boundary}--\r\n'.encode('latin-1')
+
+    @property
+    def content_length(self) -> int:
+        return sum(len(header) + length for header, _, length in self.parts) + len(self.trailer)
+
+class ByteRangeResponse:
+    """Status, headers and body layout for a GET on a file of known size.
+
+    Both serving engines build one of these and then write the headers and
+    send each (prefix, offset, length) part with their own zero-copy path,
+    so Range semantics live in one place.
+    """
+    def __init__(self, size: int, content_type: str, last_modified: str,
+                 range_header: Optional[str] = None, if_range: Optional[str] = None,
+                 etag: Optional[str] = None):
+        self.headers: List[Tuple[str, str]] = []
+        self.parts: List[Tuple[bytes, int, int]] = []
+        self.trailer = b''
+
+        ranges = None
+        if if_range_matches(if_range, last_modified, etag):
+            try:
+                ranges = parse_range_header(range_header, size)
+            except RangeNotSatisfiable:
+                self.status = 416
+                self.headers = [('Content-Range', f'bytes */{size}'), ('Content-Length', '0')]
+                return
+
+        if ranges is None:
+            self.status = 200
+            self.headers.append(('Content-type', content_type))
+            self.headers.append(('Content-Length', str(size)))
+            self.parts.append((b'', 0, size))
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.status = 206
+            self.headers.append(('Content-type', content_type))
+            self.headers.append(('Content-Length', str(end - start + 1)))
+            self.headers.append(('Content-Range', content_range(start, end, size)))
+            self.parts.append((b'', start, end - start + 1))
+        else:
+            body = MultipartByteranges(ranges, size, content_type)
+            self.status = 206
+            self.headers.append(('Content-type', body.content_type))
+            self.headers.append(('Content-Length', str(body.content_length)))
+            self.parts = body.parts
+            self.trailer = body.trailer
+        self.headers.append(('Accept-Ranges', 'bytes'))
+        self.headers.append(('Last-Modified', last_modified))
+        if etag:
+            self.headers.append(('ETag', etag))
+
+    @classmethod
+    def not_modified(cls, last_modified: str, etag: Optional[str]) -> 'ByteRangeResponse':
+        """A 304 carrying only the validators; it has no body."""
+        response = cls.__new__(cls)
+        response.status = 304
+        response.headers = [('Last-Modified', last_modified)]
+        if etag:
+            response.headers.append(('ETag', etag))
+        response.parts = []
+        response.trailer = b''
+        return response
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+import logging
+import mimetypes
+import os
+import threading
+from email.utils import formatdate
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv')
+
+MIME_TYPES = {
+    '.mp4': 'video/mp4',
+    '.avi': 'video/x-msvideo',
+    '.mkv': 'video/x-matroska',
+    '.m4v': 'video/mp4',
+    '.m4s': 'video/mp4',
+    '.mpd': 'application/dash+xml',
+}
+
+class CatalogEntry:
+    """Everything a response needs to know about one file, computed once."""
+    __slots__ = ('name', 'path', 'size', 'mtime_ns', 'mime_type', 'etag', 'last_modified', 'content_class')
+
+    def __init__(self, name: str, path: str, st: os.stat_result, content_class: str = 'video'):
+        self.name = name
+        self.path = path
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.mime_type = MIME_TYPES.get(os.path.splitext(name)[1].lower()) \
+            or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        # Strong validator: changes whenever the file is rewritten or resized
+        self.etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        self.content_class = content_class
+
+    def matches(self, st: os.stat_result) -> bool:
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+class VideoCatalog:
+    """Process-wide index of the video files under root.
+
+    The directory is scanned once at startup; after that a background thread
+    polls for changes and swaps in a new entry table, bumping version. Request
+    handlers only read self.entries, which is replaced wholesale and never
+    mutated, so lookups need no lock and never touch the filesystem.
+    """
+    def __init__(self, root: str = '.', extensions: Tuple[str, ...] = VIDEO_EXTENSIONS):
+        self.root = root
+        self.extensions = extensions
+        self.entries: Dict[str, CatalogEntry] = {}
+        self.version = 0
+        self._dir_mtime_ns = None
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # Called with the catalog after every refresh that changed it
+        self.listeners: List[Callable[['VideoCatalog'], None]] = []
+        self.refresh(rescan=True)
+
+    def get(self, name: str) -> Optional[CatalogEntry]:
+        return self.entries.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def __iter__(self) -> Iterator[CatalogEntry]:
+        return iter(self.entries.values())
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def refresh(self, rescan: bool = False) -> bool:
+        """Bring the index up to date and return True if anything changed.
+
+        The directory is only listed again when its mtime moved (a file was
+        added, removed or renamed) or rescan is set; otherwise the known
+        files are re-stat'ed to pick up in-place rewrites.
+        """
+        with self._lock:
+            changed = self._refresh(rescan)
+        if changed:
+            for listener in self.listeners:
+                listener(self)
+        return changed
+
+    def _refresh(self, rescan: bool) -> bool:
+        names = self._list_names(rescan)
+        entries = {}
+        changed = False
+        for name in names:
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entry = self.entries.get(name)
+            if entry is None or not entry.matches(st):
+                entry = CatalogEntry(name, path, st, self._content_class(name))
+                changed = True
+            entries[name] = entry
+
+        # Unchanged entries are reused, so equal sizes mean nothing was removed
+        if changed or len(entries) != len(self.entries):
+            self.entries = entries
+            self.version += 1
+            logging.info(f"{type(self).__name__} version {self.version}: {len(entries)} files")
+            return True
+        return False
+
+    def _list_names(self, rescan: bool) -> List[str]:
+        """Names (relative to root) that should be in the index."""
+        dir_mtime_ns = os.stat(self.root).st_mtime_ns
+        if rescan or dir_mtime_ns != self._dir_mtime_ns:
+            names = [n for n in os.listdir(self.root) if n.endswith(self.extensions)]
+        else:
+            names = list(self.entries)
+        self._dir_mtime_ns = dir_mtime_ns
+        return names
+
+    def _content_class(self, name: str) -> str:
+        """Which Cache-Control policy applies to name."""
+        return 'video'
+
+    def start_watching(self, interval: float = 2.0):
+        """Poll for changes every interval seconds in a daemon thread."""
+        if interval <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,),
+                                         name='catalog-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except OSError as e:
+                logging.error(f"Catalog refresh failed: {str(e)}")
+
+class StaticTree(VideoCatalog):
+    """Index of every file under root, such as a DASH player page and its assets.
+
+    Names are '/'-separated paths relative to root. The tree is walked
+    again only when one of its directories changed, and requests are
+    answered from the index, so a URL can never reach outside root.
+    """
+    def __init__(self, root: str):
+        self._dir_mtimes: Dict[str, Optional[int]] = {}
+        super().__init__(root, ())
+
+    def _content_class(self, name: str) -> str:
+        return 'mpd' if name.endswith('.mpd') else 'video'
+
+    def _list_names(self, rescan: bool) -> List[str]:
+        if not rescan and self._dir_mtimes and all(
+                _mtime_ns(d) == mtime_ns for d, mtime_ns in self._dir_mtimes.items()):
+            return list(self.entries)
+        names = []
+        dir_mtimes = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            dir_mtimes[dirpath] = _mtime_ns(dirpath)
+            prefix = os.path.relpath(dirpath, self.root).replace(os.sep, '/')
+            names.extend(f if prefix == '.' else f'{prefix}/{f}' for f in filenames)
+        self._dir_mtimes = dir_mtimes
+        return names
+
+def _mtime_ns(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
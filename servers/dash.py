@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+import logging
+import math
+import os
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from catalog import VideoCatalog
+
+# The DASH ladder shipped with the repo
+DEFAULT_DASH_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 '..', 'se3506', 'static', 'bbb_30fps')
+
+MPD_NS = '{urn:mpeg:dash:schema:mpd:2011}'
+
+_TEMPLATE_VAR = re.compile(r'\$(RepresentationID|Number|Bandwidth|Time|)(%0(\d+)d)?\$')
+_DURATION = re.compile(
+    r'^P(?:(?P<days>\d+(?:\.\d+)?)D)?'
+    r'(?:T(?:(?P<hours>\d+(?:\.\d+)?)H)?(?:(?P<minutes>\d+(?:\.\d+)?)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$'
+)
+
+def parse_duration(value: str) -> float:
+    """Parse an xs:duration such as PT634.566S into seconds."""
+    match = _DURATION.match(value.strip()) if value else None
+    if not match:
+        raise ValueError(f"Unsupported duration: {value}")
+    parts = {k: float(v) for k, v in match.groupdict().items() if v}
+    return (parts.get('days', 0) * 86400 + parts.get('hours', 0) * 3600
+            + parts.get('minutes', 0) * 60 + parts.get('seconds', 0))
+
+def expand_template(template: str, representation_id: str, bandwidth: int = 0,
+                    number: Optional[int] = None, time: Optional[int] = None) -> str:
+    """Substitute SegmentTemplate identifiers ($RepresentationID$, $Number%05d$, ...)."""
+    def substitute(match):
+        name, width = match.group(1), match.group(3)
+        if name == '':
+            return '$'
+        value = {'RepresentationID': representation_id, 'Bandwidth': bandwidth,
+                 'Number': number, 'Time': time}[name]
+        if value is None:
+            raise ValueError(f"${name}$ has no value in {template}")
+        if width and name != 'RepresentationID':
+            return f'{int(value):0{int(width)}d}'
+        return str(value)
+    return _TEMPLATE_VAR.sub(substitute, template)
+
+def template_pattern(template: str, representation_id: str, bandwidth: int = 0) -> re.Pattern:
+    """A regex matching the names template expands to, capturing $Number$ as 'number'."""
+    parts = []
+    pos = 0
+    for match in _TEMPLATE_VAR.finditer(template):
+        parts.append(re.escape(template[pos:match.start()]))
+        name = match.group(1)
+        if name == 'Number':
+            parts.append(r'(?P<number>\d+)')
+        elif name == 'Time':
+            parts.append(r'\d+')
+        else:
+            parts.append(re.escape({'RepresentationID': representation_id,
+                                    'Bandwidth': str(bandwidth), '': '$'}[name]))
+        pos = match.end()
+    parts.append(re.escape(template[pos:]))
+    return re.compile(''.join(parts) + '$')
+
+@dataclass
+class Representation:
+    id: str
+    bandwidth: int
+    mime_type: str
+    initialization: str
+    media: str
+    start_number: int
+    segment_count: int
+    timescale: int
+    duration: int
+
+    @property
+    def segment_seconds(self) -> float:
+        return self.duration / self.timescale
+
+    def segment_name(self, number: int) -> str:
+        return expand_template(self.media, self.id, self.bandwidth, number=number)
+
+    def segment_names(self) -> List[Tuple[int, str]]:
+        return [(n, self.segment_name(n))
+                for n in range(self.start_number, self.start_number + self.segment_count)]
+
+@dataclass
+class DashSegment:
+    name: str
+    representation: Representation
+    # None for the initialization segment
+    number: Optional[int]
+
+def parse_mpd(path: str) -> List[Representation]:
+    """Read the SegmentTemplate-addressed representations of a static MPD."""
+    root = ET.parse(path).getroot()
+    total = parse_duration(root.get('mediaPresentationDuration', 'PT0S'))
+    representations = []
+    for period in root.iter(f'{MPD_NS}Period'):
+        for adaptation in period.iter(f'{MPD_NS}AdaptationSet'):
+            set_template = adaptation.find(f'{MPD_NS}SegmentTemplate')
+            for rep in adaptation.iter(f'{MPD_NS}Representation'):
+                template = rep.find(f'{MPD_NS}SegmentTemplate')
+                if template is None:
+                    template = set_template
+                if template is None or template.get('media') is None:
+                    continue
+                timescale = int(template.get('timescale', '1'))
+                duration = int(template.get('duration', '0'))
+                if not duration:
+                    # SegmentTimeline addressing is not used by our content
+                    continue
+                rep_id = rep.get('id')
+                bandwidth = int(rep.get('bandwidth', '0'))
+                representations.append(Representation(
+                    id=rep_id,
+                    bandwidth=bandwidth,
+                    mime_type=rep.get('mimeType') or adaptation.get('mimeType', 'video/mp4'),
+                    initialization=expand_template(template.get('initialization', ''), rep_id, bandwidth)
+                    if template.get('initialization') else '',
+                    media=template.get('media'),
+                    start_number=int(template.get('startNumber', '1')),
+                    segment_count=math.ceil(total * timescale / duration),
+                    timescale=timescale,
+                    duration=duration,
+                ))
+    return representations
+
+class DashIndex(VideoCatalog):
+    """Index of the MPDs under root and every segment their templates name.
+
+    Requests are resolved by looking the URL path up in this table, never
+    by joining it onto a filesystem path, so only files an MPD actually
+    references can be served.
+    """
+    def __init__(self, root: str = DEFAULT_DASH_ROOT):
+        self.representations: Dict[str, Representation] = {}
+        self.segments: Dict[str, DashSegment] = {}
+        self._mpds: Dict[str, Tuple[int, List[Representation]]] = {}
+        super().__init__(root, ('.mpd',))
+
+    def segment(self, name: str) -> Optional[DashSegment]:
+        return self.segments.get(name)
+
+    def _content_class(self, name: str) -> str:
+        if name.endswith('.mpd'):
+            return 'mpd'
+        segment = self.segments.get(name)
+        return 'init' if segment is not None and segment.number is None else 'media'
+
+    def _list_names(self, rescan: bool) -> List[str]:
+        mpds = {}
+        for name in os.listdir(self.root):
+            if not name.endswith('.mpd'):
+                continue
+            mtime_ns = os.stat(os.path.join(self.root, name)).st_mtime_ns
+            cached = self._mpds.get(name)
+            if cached and cached[0] == mtime_ns and not rescan:
+                mpds[name] = cached
+                continue
+            try:
+                mpds[name] = (mtime_ns, parse_mpd(os.path.join(self.root, name)))
+            except (ET.ParseError, ValueError) as e:
+                logging.error(f"Skipping {name}: {str(e)}")
+        self._mpds = mpds
+
+        names = list(mpds)
+        representations = {}
+        segments = {}
+        for _, reps in mpds.values():
+            for rep in reps:
+                representations[rep.id] = rep
+                if rep.initialization:
+                    segments[rep.initialization] = DashSegment(rep.initialization, rep, None)
+                for number, name in rep.segment_names():
+                    segments[name] = DashSegment(name, rep, number)
+        names.extend(segments)
+        self.representations = representations
+        self.segments = segments
+        return names
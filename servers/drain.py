@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+# Sent by an operator (or forwarded by the prefork parent) to start draining
+DRAIN_SIGNAL = signal.SIGUSR1
+# How often the engines check whether a drain has finished
+DRAIN_POLL_INTERVAL = 0.2
+
+def parse_drain_timeout(path: str, default: float) -> float:
+    """The ?timeout= seconds of a /_drain request, or default."""
+    values = parse_qs(urlsplit(path).query).get('timeout')
+    return float(values[0]) if values else default
+
+class DrainState:
+    """Taking an origin out of rotation without cutting off its sessions.
+
+    While draining, in-flight responses complete but every response closes
+    its connection, the load report says "draining" so the controller
+    stops sending new flows here, and the engine exits once no connection
+    is left or the deadline passes.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.draining = False
+        self.deadline: Optional[float] = None
+        # Set by share(): the process that fans drains out, and the deadline all of its children use
+        self._parent: Optional[int] = None
+        self._group_deadline = None
+
+    def share(self):
+        """Drain processes forked after this call together.
+
+        A drain requested in one of them is forwarded to this (the prefork
+        parent) process, which signals every child, and all of them use
+        the deadline of the first one to start.
+        """
+        self._parent = os.getpid()
+        # CLOCK_MONOTONIC is system-wide, so the deadline means the same in every child
+        self._group_deadline = multiprocessing.RawValue('d', 0.0)
+
+    def start(self, timeout: float) -> bool:
+        """Begin draining; returns False if a drain was already under way."""
+        with self._lock:
+            if self.draining:
+                return False
+            self.draining = True
+            self.deadline = time.monotonic() + timeout
+            if self._group_deadline is not None:
+                if self._group_deadline.value:
+                    self.deadline = self._group_deadline.value
+                else:
+                    self._group_deadline.value = self.deadline
+        logging.info("Draining: closing connections as they finish, exiting within %.0fs",
+                     max(0.0, self.deadline - time.monotonic()))
+        return True
+
+    def request(self, timeout: float) -> bool:
+        """Begin draining on an admin request, in every process of a shared group."""
+        started = self.start(timeout)
+        if started and self._parent is not None and self._parent != os.getpid():
+            os.kill(self._parent, DRAIN_SIGNAL)
+        return started
+
+    def finished(self, active_connections: int) -> bool:
+        if not self.draining:
+            return False
+        return active_connections <= 0 or time.monotonic() >= self.deadline
+
+    def wait(self, active_connections: Callable[[], int]):
+        """Block until a drain has started and finished."""
+        while not self.finished(active_connections()):
+            time.sleep(DRAIN_POLL_INTERVAL)
+
+    @property
+    def state(self) -> str:
+        return 'draining' if self.draining else 'serving'
+
+    def stats(self) -> Dict:
+        stats = {'state': self.state}
+        if self.draining:
+            stats['drain_remaining'] = round(max(0.0, self.deadline - time.monotonic()), 1)
+        return stats
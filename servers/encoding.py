@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import gzip
+import threading
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred first when the client weighs several encodings equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 256
+
+def compress_variants(data: bytes) -> Dict[str, bytes]:
+    """data plus each compressed encoding that actually makes it smaller."""
+    variants = {'identity': data}
+    if len(data) < MIN_COMPRESS_SIZE:
+        return variants
+    for encoding in ENCODINGS:
+        if encoding == 'br':
+            encoded = brotli.compress(data)
+        else:
+            # mtime=0 keeps the bytes, and so any ETag derived from them, stable
+            encoded = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(encoded) < len(data):
+            variants[encoding] = encoded
+    return variants
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    weights = {}
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights
+
+def negotiate(accept_encoding: Optional[str], available) -> str:
+    """Pick the best of the available encodings, falling back to identity."""
+    weights = parse_accept_encoding(accept_encoding)
+    best, best_q = 'identity', 0.0
+    for encoding in ENCODINGS:
+        if encoding not in available:
+            continue
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+class EncodedCache:
+    """Encoded variants of generated or small bodies, one version per key.
+
+    A key's variants are rebuilt only when the caller's version for it
+    (a catalog version, a file ETag) changes.
+    """
+    def __init__(self):
+        self._variants: Dict[Hashable, Tuple[Hashable, Dict[str, bytes]]] = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.hits = 0
+
+    def get(self, key: Hashable, version: Hashable, build: Callable[[], bytes]) -> Dict[str, bytes]:
+        with self._lock:
+            cached = self._variants.get(key)
+            if cached is not None and cached[0] == version:
+                self.hits += 1
+                return cached[1]
+        # Two requests racing on a new version both build it; the bodies are identical
+        variants = compress_variants(build())
+        with self._lock:
+            self._variants[key] = (version, variants)
+            self.builds += 1
+        return variants
+
+    def stats(self) -> Dict:
+        return {
+            'encodings': list(ENCODINGS),
+            'keys': len(self._variants),
+            'builds': self.builds,
+            'hits': self.hits,
+        }
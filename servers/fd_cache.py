@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import BinaryIO, Collection, Dict, Hashable, Iterator
+
+from catalog import CatalogEntry
+
+class _Handle:
+    """An open file and the number of requests currently sending from it."""
+    __slots__ = ('file', 'refs', 'retired')
+
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.refs = 0
+        self.retired = False
+
+class FileHandleCache:
+    """Open file objects kept between requests, bounded by count.
+
+    Requests borrow a handle with open(entry) and send from it with
+    sendfile, which reads at an explicit offset, so one file object can
+    serve many concurrent requests. Handles are reference counted: one
+    that is evicted or invalidated is only closed once the last request
+    using it has finished.
+    """
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self._handles: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @contextmanager
+    def open(self, entry: CatalogEntry) -> Iterator[BinaryIO]:
+        handle = self._acquire(entry)
+        try:
+            yield handle.file
+        finally:
+            self._release(handle)
+
+    def _acquire(self, entry: CatalogEntry) -> _Handle:
+        # The ETag changes with the file, so a rewritten file gets a new handle
+        key = (entry.path, entry.etag)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None:
+                self.hits += 1
+                self._handles.move_to_end(key)
+                handle.refs += 1
+                return handle
+            self.misses += 1
+
+        f = open(entry.path, 'rb', buffering=0)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                handle = self._handles[key] = _Handle(f)
+                f = None
+                while len(self._handles) > self.capacity:
+                    _, victim = self._handles.popitem(last=False)
+                    self._retire(victim)
+                    self.evictions += 1
+            handle.refs += 1
+        if f is not None:
+            # Another request opened the same file first
+            f.close()
+        return handle
+
+    def _release(self, handle: _Handle):
+        with self._lock:
+            handle.refs -= 1
+            if handle.retired and handle.refs == 0:
+                handle.file.close()
+
+    def _retire(self, handle: _Handle):
+        handle.retired = True
+        if handle.refs == 0:
+            handle.file.close()
+
+    def retain(self, live: Collection[Hashable]):
+        """Drop handles whose (path, etag) is no longer in live."""
+        with self._lock:
+            for key in [k for k in self._handles if k not in live]:
+                self._retire(self._handles.pop(key))
+                self.invalidations += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'capacity': self.capacity,
+            'open': len(self._handles),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+
+import re
+import struct
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from catalog import CatalogEntry
+from dash import MPD_NS, DashIndex, Representation, template_pattern
+
+ET.register_namespace('', MPD_NS[1:-1])
+ET.register_namespace('xsi', 'http://www.w3.org/2001/XMLSchema-instance')
+
+class LiveUnavailable(Exception):
+    """The requested live segment is not (or no longer) available."""
+
+class LiveSegment:
+    """A live segment number mapped onto a file of the static ladder."""
+    __slots__ = ('entry', 'representation', 'number', 'start', 'duration')
+
+    def __init__(self, entry: CatalogEntry, representation: Representation, number: Optional[int],
+                 start: float, duration: float):
+        self.entry = entry
+        self.representation = representation
+        # None for initialization segments, which are always available
+        self.number = number
+        # Wall-clock time the segment's media starts and how long it lasts
+        self.start = start
+        self.duration = duration
+
+def utc_day_start(now: Optional[float] = None) -> float:
+    """Midnight UTC of the current day, the default availabilityStartTime.
+
+    Origins started on the same day share it, so a client moved between
+    servers by the controller sees the same live timeline.
+    """
+    now = time.time() if now is None else now
+    return now - now % 86400
+
+def iso_time(t: float) -> str:
+    return datetime.fromtimestamp(t, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+# tfhd flags
+BASE_DATA_OFFSET_PRESENT = 0x000001
+DEFAULT_BASE_IS_MOOF = 0x020000
+# trun flags
+DATA_OFFSET_PRESENT = 0x000001
+
+def boxes(data, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int, int, bytes]]:
+    """(offset, header length, size, type) of each ISO BMFF box in data[start:end]."""
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, box = struct.unpack_from('>I4s', data, pos)
+        header = 8
+        if size == 1 and pos + 16 <= end:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            break
+        yield pos, header, size, box
+        pos += size
+
+def fragment_offsets(data) -> List[int]:
+    """Offsets of the moof boxes that start each CMAF fragment of a segment."""
+    return [pos for pos, _, _, box in boxes(data) if box == b'moof']
+
+def track_timescales(init) -> Dict[int, int]:
+    """track_ID -> media timescale of each track in an initialization segment."""
+    scales = {}
+    for pos, header, size, box in boxes(init):
+        if box != b'moov':
+            continue
+        for trak, trak_header, trak_size, child in boxes(init, pos + header, pos + size):
+            if child != b'trak':
+                continue
+            track_id = timescale = None
+            for cpos, cheader, csize, cbox in boxes(init, trak + trak_header, trak + trak_size):
+                if cbox == b'tkhd':
+                    track_id = _after_times(init, cpos + cheader)
+                elif cbox == b'mdia':
+                    for mpos, mheader, _, mbox in boxes(init, cpos + cheader, cpos + csize):
+                        if mbox == b'mdhd':
+                            timescale = _after_times(init, mpos + mheader)
+            if track_id is not None and timescale:
+                scales[track_id] = timescale
+    return scales
+
+def _after_times(data, body: int) -> int:
+    # The 32-bit field after a full box's creation and modification times:
+    # tkhd's track_ID, mdhd's timescale
+    return struct.unpack_from('>I', data, body + 4 + (16 if data[body] == 1 else 8))[0]
+
+def retime_segment(data, shift: int, timescale: int, track_scales: Dict[int, int]) -> bytearray:
+    """A copy of a media segment with its decode times moved shift / timescale seconds later.
+
+    Every traf's baseMediaDecodeTime (and the sidx earliest presentation
+    time) is rewritten in place. A 32-bit tfdt whose new value does not fit
+    is widened to 64 bits, and the sizes and data offsets that move with it
+    are fixed up; the sidx is then turned into a free box, as its
+    subsegment sizes no longer hold (players addressing segments through a
+    SegmentTemplate never read it).
+    """
+    out = bytearray()
+    sidx = None
+    grown = 0
+    end = 0
+    for pos, header, size, box in boxes(data):
+        chunk = bytearray(data[pos:pos + size])
+        if box == b'sidx':
+            if _retime_sidx(chunk, header, shift, timescale):
+                sidx = len(out)
+            else:
+                chunk[4:8] = b'free'
+        elif box == b'moof':
+            chunk = _retime_moof(chunk, header, shift, timescale, track_scales, grown)
+            grown += len(chunk) - size
+        out += chunk
+        end = pos + size
+    out += data[end:]
+    if grown and sidx is not None:
+        out[sidx + 4:sidx + 8] = b'free'
+    return out
+
+def _retime_sidx(sidx: bytearray, header: int, shift: int, timescale: int) -> bool:
+    version = sidx[header]
+    sidx_timescale = struct.unpack_from('>I', sidx, header + 8)[0]
+    fmt = '>Q' if version else '>I'
+    value = struct.unpack_from(fmt, sidx, header + 12)[0] + shift * sidx_timescale // timescale
+    if value >= 1 << (64 if version else 32):
+        return False
+    struct.pack_into(fmt, sidx, header + 12, value)
+    return True
+
+def _retime_moof(moof: bytearray, header: int, shift: int, timescale: int,
+                 track_scales: Dict[int, int], grown_before: int) -> bytearray:
+    out = bytearray(moof[:header])
+    for pos, child_header, size, box in boxes(moof, header):
+        child = bytearray(moof[pos:pos + size])
+        if box == b'traf':
+            child = _retime_traf(child, child_header, shift, timescale, track_scales)
+        out += child
+    grown = len(out) - len(moof)
+    if grown:
+        _set_size(out, header)
+    if grown or grown_before:
+        _move_data_offsets(out, header, grown, grown_before + grown)
+    return out
+
+def _retime_traf(traf: bytearray, header: int, shift: int, timescale: int,
+                 track_scales: Dict[int, int]) -> bytearray:
+    track_scale = timescale
+    for pos, child_header, _, box in boxes(traf, header):
+        if box == b'tfhd':
+            track_scale = track_scales.get(struct.unpack_from('>I', traf, pos + child_header + 4)[0], timescale)
+    delta = shift * track_scale // timescale
+
+    out = bytearray(traf[:header])
+    for pos, child_header, size, box in boxes(traf, header):
+        child = bytearray(traf[pos:pos + size])
+        if box == b'tfdt':
+            body = child_header
+            version = child[body]
+            value = struct.unpack_from('>Q' if version else '>I', child, body + 4)[0] + delta
+            if version or value < 1 << 32:
+                struct.pack_into('>Q' if version else '>I', child, body + 4, value)
+            else:
+                child = bytearray(struct.pack('>I4sB3sQ', 20, b'tfdt', 1, bytes(child[body + 1:body + 4]), value))
+        out += child
+    if len(out) != len(traf):
+        _set_size(out, header)
+    return out
+
+def _move_data_offsets(moof: bytearray, header: int, relative: int, absolute: int):
+    """Point the trafs of a moof that grew at where their samples moved to.
+
+    Offsets relative to the moof move by its own growth; absolute base
+    data offsets by everything inserted before the mdat.
+    """
+    first = True
+    for pos, traf_header, size, box in boxes(moof, header):
+        if box != b'traf':
+            continue
+        flags = 0
+        for cpos, cheader, _, cbox in boxes(moof, pos + traf_header, pos + size):
+            body = cpos + cheader
+            if cbox == b'tfhd':
+                flags = int.from_bytes(moof[body + 1:body + 4], 'big')
+                if flags & BASE_DATA_OFFSET_PRESENT and absolute:
+                    base = struct.unpack_from('>Q', moof, body + 8)[0]
+                    struct.pack_into('>Q', moof, body + 8, base + absolute)
+            elif cbox == b'trun' and relative and not flags & BASE_DATA_OFFSET_PRESENT \
+                    and (first or flags & DEFAULT_BASE_IS_MOOF):
+                if int.from_bytes(moof[body + 1:body + 4], 'big') & DATA_OFFSET_PRESENT:
+                    offset = struct.unpack_from('>i', moof, body + 8)[0]
+                    struct.pack_into('>i', moof, body + 8, offset + relative)
+        first = False
+
+def _set_size(box: bytearray, header: int):
+    if header == 16:
+        struct.pack_into('>Q', box, 8, len(box))
+    else:
+        struct.pack_into('>I', box, 0, len(box))
+
+class LiveChannel:
+    """Loop the static DASH ladder as a simulated live stream.
+
+    Live segment N of a representation is its static segment
+    ((N - startNumber) mod segment_count) + startNumber, and its media
+    starts at availabilityStartTime + (N - startNumber) * duration. A
+    segment becomes requestable once its first chunk_duration of media
+    exists, and is then delivered in partial chunks, each released at the
+    wall-clock time its media would have been produced, like a low-latency
+    CMAF encoder. Segments older than time_shift_depth are expired.
+    """
+    def __init__(self, dash: DashIndex, start_time: Optional[float] = None,
+                 time_shift_depth: float = 30.0, chunk_duration: float = 0.5):
+        self.dash = dash
+        self.start_time = utc_day_start() if start_time is None else start_time
+        self.time_shift_depth = time_shift_depth
+        self.chunk_duration = chunk_duration
+        self._patterns: Tuple[int, List[Tuple[re.Pattern, Representation]]] = (-1, [])
+        self._manifests: Dict[str, Tuple[str, ET.ElementTree]] = {}
+        self._timescales: Dict[str, Tuple[str, Dict[int, int]]] = {}
+        self._lock = threading.Lock()
+        self.manifests_served = 0
+        self.segments_served = 0
+        self.early_segments = 0
+        self.unavailable = 0
+        self.expired = 0
+
+    def manifest(self, entry: CatalogEntry, now: Optional[float] = None) -> bytes:
+        """The dynamic MPD for the static MPD entry, as of now."""
+        now = time.time() if now is None else now
+        root = self._static_manifest(entry)
+        root.set('type', 'dynamic')
+        root.attrib.pop('mediaPresentationDuration', None)
+        root.set('availabilityStartTime', iso_time(self.start_time))
+        root.set('publishTime', iso_time(now))
+        root.set('timeShiftBufferDepth', f'PT{self.time_shift_depth:g}S')
+        durations = [rep.segment_seconds for rep in self.dash.representations.values()] or [2.0]
+        root.set('minimumUpdatePeriod', f'PT{max(durations):g}S')
+        root.set('maxSegmentDuration', f'PT{max(durations):g}S')
+        for period in root.iter(f'{MPD_NS}Period'):
+            period.set('id', period.get('id', '0'))
+            period.set('start', 'PT0S')
+        for template in root.iter(f'{MPD_NS}SegmentTemplate'):
+            duration = int(template.get('duration', '0')) / int(template.get('timescale', '1'))
+            if self.chunk_duration and duration > self.chunk_duration:
+                # Segments can be fetched while they are still being "encoded"
+                template.set('availabilityTimeOffset', f'{duration - self.chunk_duration:g}')
+                template.set('availabilityTimeComplete', 'false')
+        timing = ET.SubElement(root, f'{MPD_NS}UTCTiming')
+        timing.set('schemeIdUri', 'urn:mpeg:dash:utc:direct:2014')
+        timing.set('value', iso_time(now))
+        self.manifests_served += 1
+        return ET.tostring(root, encoding='utf-8', xml_declaration=True)
+
+    def _static_manifest(self, entry: CatalogEntry) -> ET.Element:
+        with self._lock:
+            cached = self._manifests.get(entry.path)
+            if cached is None or cached[0] != entry.etag:
+                cached = self._manifests[entry.path] = (entry.etag, ET.parse(entry.path))
+        # Each request edits its own copy
+        return ET.fromstring(ET.tostring(cached[1].getroot()))
+
+    def segment(self, name: str, now: Optional[float] = None) -> LiveSegment:
+        """Resolve a live segment name, raising LiveUnavailable outside its window."""
+        now = time.time() if now is None else now
+        init = self.dash.segment(name)
+        if init is not None and init.number is None:
+            rep = init.representation
+            return LiveSegment(self.dash.get(name), rep, None, self.start_time, rep.segment_seconds)
+
+        for pattern, rep in self._representation_patterns():
+            match = pattern.match(name)
+            if match:
+                break
+        else:
+            raise LiveUnavailable("Segment not found")
+        number = int(match.group('number'))
+        index = number - rep.start_number
+        if index < 0:
+            raise LiveUnavailable("Segment not found")
+        duration = rep.segment_seconds
+        start = self.start_time + index * duration
+        ready = start + (self.chunk_duration if self.chunk_duration else duration)
+        if now < ready:
+            self.unavailable += 1
+            raise LiveUnavailable("Segment not yet available")
+        if start + duration < now - self.time_shift_depth:
+            self.expired += 1
+            raise LiveUnavailable("Segment left the time-shift buffer")
+        entry = self.dash.get(rep.segment_name(rep.start_number + index % rep.segment_count))
+        if entry is None:
+            raise LiveUnavailable("Segment not found")
+        self.segments_served += 1
+        if now < start + duration:
+            self.early_segments += 1
+        return LiveSegment(entry, rep, number, start, duration)
+
+    def _representation_patterns(self) -> List[Tuple[re.Pattern, Representation]]:
+        version, patterns = self._patterns
+        if version != self.dash.version:
+            patterns = [(template_pattern(rep.media, rep.id, rep.bandwidth), rep)
+                        for rep in self.dash.representations.values()]
+            self._patterns = (self.dash.version, patterns)
+        return patterns
+
+    def media(self, segment: LiveSegment, body) -> memoryview:
+        """body with its decode times moved to the segment's place on the live timeline.
+
+        Live segment N plays at (N - startNumber) * duration, but its file
+        carries the decode time of the static segment it loops, which is
+        off by a whole number of passes over the ladder.
+        """
+        rep = segment.representation
+        if segment.number is None:
+            return body
+        loops = (segment.number - rep.start_number) // rep.segment_count
+        if not loops:
+            return body
+        shift = loops * rep.segment_count * rep.duration
+        return memoryview(retime_segment(body, shift, rep.timescale, self._track_timescales(rep)))
+
+    def _track_timescales(self, rep: Representation) -> Dict[int, int]:
+        init = self.dash.get(rep.initialization) if rep.initialization else None
+        if init is None:
+            # Without one, tracks are assumed to use the MPD's timescale
+            return {}
+        with self._lock:
+            cached = self._timescales.get(rep.id)
+        if cached is None or cached[0] != init.etag:
+            with open(init.path, 'rb') as f:
+                cached = (init.etag, track_timescales(f.read()))
+            with self._lock:
+                self._timescales[rep.id] = cached
+        return cached[1]
+
+    def chunks(self, segment: LiveSegment, body) -> List[Tuple[float, int, int]]:
+        """(release time, offset, length) of each partial chunk of segment.
+
+        Chunks end at the segment's fragment (moof) boundaries when it has
+        several; a single-fragment segment is cut into equal byte ranges
+        instead, which keeps the delivery schedule of a chunked encoder.
+        """
+        size = len(body)
+        if segment.number is None:
+            return [(0.0, 0, size)]
+        if not self.chunk_duration:
+            return [(segment.start + segment.duration, 0, size)]
+        offsets = fragment_offsets(body)
+        if len(offsets) > 1:
+            bounds = [0] + offsets[1:] + [size]
+        else:
+            count = max(1, round(segment.duration / self.chunk_duration))
+            bounds = [size * i // count for i in range(count + 1)]
+        count = len(bounds) - 1
+        return [(segment.start + segment.duration * (i + 1) / count, bounds[i], bounds[i + 1] - bounds[i])
+                for i in range(count) if bounds[i + 1] > bounds[i]]
+
+    def stats(self) -> Dict:
+        return {
+            'availability_start_time': iso_time(self.start_time),
+            'time_shift_depth': self.time_shift_depth,
+            'chunk_duration': self.chunk_duration,
+            'manifests': self.manifests_served,
+            'segments': self.segments_served,
+            'early_segments': self.early_segments,
+            'unavailable': self.unavailable,
+            'expired': self.expired,
+        }
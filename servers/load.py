@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+# Sliding windows the byte rate is reported over, in seconds
+RATE_WINDOWS = (1, 10, 60)
+# Most recent time-to-first-byte samples kept for percentiles
+TTFB_SAMPLES = 1024
+HEARTBEAT_PORT = 9999
+
+class RateWindow:
+    """Bytes counted into one-second buckets, kept for the longest window."""
+    def __init__(self, span: int = max(RATE_WINDOWS)):
+        self.span = span
+        self._buckets: deque = deque()
+        self._lock = threading.Lock()
+
+    def add(self, n: int):
+        second = int(time.monotonic())
+        with self._lock:
+            if self._buckets and self._buckets[-1][0] == second:
+                self._buckets[-1][1] += n
+            else:
+                self._buckets.append([second, n])
+                while self._buckets[0][0] <= second - self.span:
+                    self._buckets.popleft()
+
+    def rate(self, seconds: int) -> float:
+        """Bytes/sec over the last seconds buckets, the current one included."""
+        since = int(time.monotonic()) - seconds + 1
+        with self._lock:
+            total = sum(n for second, n in self._buckets if second >= since)
+        return total / seconds
+
+def percentile(ordered, fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class LoadMonitor:
+    """Live egress and latency measurements of one origin process."""
+    def __init__(self):
+        self.bytes = RateWindow()
+        self._ttfb: deque = deque(maxlen=TTFB_SAMPLES)
+
+    def sent(self, n: int):
+        self.bytes.add(n)
+
+    def first_byte(self, seconds: float):
+        # deque.append is atomic, so samples need no lock
+        self._ttfb.append(seconds)
+
+    def snapshot(self) -> Dict:
+        ttfb = sorted(self._ttfb)
+        return {
+            'bytes_per_sec': {f'{w}s': round(self.bytes.rate(w)) for w in RATE_WINDOWS},
+            'ttfb_ms': {name: round(percentile(ttfb, q) * 1000, 2)
+                        for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))},
+        }
+
+def parse_address(value: str, default_port: int = HEARTBEAT_PORT) -> Tuple[str, int]:
+    """Split host[:port] into a (host, port) address."""
+    host, _, port = value.rpartition(':')
+    if not host:
+        return value, default_port
+    return host, int(port)
+
+class Heartbeat:
+    """Push compact load reports to the controller over UDP.
+
+    Each process sends its own report, tagged with the server id and its
+    pid, so the controller can add up the workers of a prefork server.
+    """
+    def __init__(self, report: Callable[[], Dict], address: Tuple[str, int],
+                 interval: float = 1.0, server_id: Optional[str] = None):
+        self.report = report
+        self.address = address
+        self.interval = interval
+        self.server_id = server_id or socket.gethostname()
+        self.sent = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='heartbeat', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            while not self._stop.wait(self.interval):
+                payload = {'id': self.server_id, 'pid': os.getpid(), **self.report()}
+                try:
+                    sock.sendto(json.dumps(payload, separators=(',', ':')).encode(), self.address)
+                    self.sent += 1
+                except OSError as e:
+                    logging.warning(f"Heartbeat to {self.address[0]}:{self.address[1]} failed: {str(e)}")
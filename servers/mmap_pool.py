@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import mmap
+import threading
+from collections import OrderedDict
+from typing import Collection, Dict, Hashable, Optional
+
+from catalog import CatalogEntry
+
+class MappedPool:
+    """Read-only memory maps of small files, bounded by total mapped bytes.
+
+    Each file is mapped once and every request gets a memoryview of the
+    same mapping, so serving a segment allocates nothing per request and
+    the bytes live in the page cache rather than the Python heap. When
+    the pool is over budget the least recently used mapping is dropped;
+    the kernel unmaps it once the last response slicing it has finished.
+    """
+    def __init__(self, budget_bytes: int, max_object_bytes: Optional[int] = None):
+        self.budget_bytes = budget_bytes
+        self.max_object_bytes = min(max_object_bytes or budget_bytes, budget_bytes)
+        self._maps: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.mapped_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # Mapped by readahead rather than a request; neither hits nor misses
+        self.prefetched = 0
+        self.unmaps = 0
+
+    def mappable(self, size: int) -> bool:
+        # Empty files cannot be mapped
+        return 0 < size <= self.max_object_bytes
+
+    def peek(self, entry: CatalogEntry, prefetch: bool = False) -> Optional[memoryview]:
+        """Return a view of entry if it is already mapped, never mapping."""
+        key = (entry.path, entry.etag)
+        with self._lock:
+            mapping = self._maps.get(key)
+            if mapping is None:
+                return None
+            if not prefetch:
+                self.hits += 1
+            self._maps.move_to_end(key)
+            return memoryview(mapping)
+
+    def get(self, entry: CatalogEntry, prefetch: bool = False) -> memoryview:
+        """Return a view of entry, mapping the file on first use.
+
+        prefetch maps ahead of any request, so it is not counted as a hit
+        or a miss.
+        """
+        view = self.peek(entry, prefetch)
+        if view is not None:
+            return view
+
+        with open(entry.path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), entry.size, access=mmap.ACCESS_READ)
+        if hasattr(mapping, 'madvise'):
+            mapping.madvise(mmap.MADV_WILLNEED)
+        key = (entry.path, entry.etag)
+        with self._lock:
+            existing = self._maps.get(key)
+            if existing is not None:
+                # Another request mapped the same file first
+                if not prefetch:
+                    self.hits += 1
+                return memoryview(existing)
+            if prefetch:
+                self.prefetched += 1
+            else:
+                self.misses += 1
+            while self.mapped_bytes + entry.size > self.budget_bytes and self._maps:
+                self._drop(next(iter(self._maps)))
+            self._maps[key] = mapping
+            self.mapped_bytes += entry.size
+        return memoryview(mapping)
+
+    def retain(self, live: Collection[Hashable]):
+        """Drop mappings whose (path, etag) is no longer in live."""
+        with self._lock:
+            for key in [k for k in self._maps if k not in live]:
+                self._drop(key)
+
+    def _drop(self, key: Hashable):
+        # Closing would fail while responses still hold views, so the
+        # mapping is released with its last reference instead
+        self.mapped_bytes -= len(self._maps.pop(key))
+        self.unmaps += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'budget_bytes': self.budget_bytes,
+            'mapped_bytes': self.mapped_bytes,
+            'mappings': len(self._maps),
+            'hits': self.hits,
+            'misses': self.misses,
+            'prefetched': self.prefetched,
+            'unmaps': self.unmaps,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
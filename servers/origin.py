@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+
+import json
+import threading
+from functools import partial
+from urllib.parse import unquote
+from typing import BinaryIO, ContextManager, Dict, Optional, Tuple, Union
+
+from byteranges import ByteRangeResponse
+from catalog import CatalogEntry, VideoCatalog
+from dash import DashIndex
+from drain import DrainState
+from encoding import EncodedCache, negotiate
+from fd_cache import FileHandleCache
+from live import LiveChannel, LiveSegment, LiveUnavailable
+from load import LoadMonitor
+from mmap_pool import MappedPool
+from pacing import Pacer, PacingPolicy
+from readahead import Readahead, advise_willneed
+from segment_cache import SegmentCache
+from singleflight import Flight, SingleFlight
+from slow_clients import SlowClientPolicy, ThroughputGuard
+from validators import CACHEABLE_STATUSES, CachePolicy, not_modified
+
+class ConnectionStats:
+    """How well persistent connections are being reused."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.active = 0
+        self.requests = 0
+        self.reused_requests = 0
+
+    def opened(self):
+        with self._lock:
+            self.connections += 1
+            self.active += 1
+
+    def closed(self):
+        with self._lock:
+            self.active -= 1
+
+    def request(self, reused: bool):
+        with self._lock:
+            self.requests += 1
+            if reused:
+                self.reused_requests += 1
+
+    def stats(self) -> Dict:
+        return {
+            'connections': self.connections,
+            'active': self.active,
+            'requests': self.requests,
+            'reused_requests': self.reused_requests,
+            'reuse_ratio': self.reused_requests / self.requests if self.requests else 0.0,
+            'requests_per_connection': self.requests / self.connections if self.connections else 0.0,
+        }
+
+class Origin:
+    """Content indexes and caches shared by the serving engines.
+
+    Both the threaded handler and the asyncio server hold one of these, so
+    a subsystem added here is available to every engine and reported on
+    /_stats in one place.
+    """
+    def __init__(self, catalog: VideoCatalog, dash: Optional[DashIndex] = None,
+                 cache: Optional[SegmentCache] = None, cache_policy: Optional[CachePolicy] = None,
+                 readahead_depth: int = 0, files: Optional[FileHandleCache] = None,
+                 mapped: Optional[MappedPool] = None, pacing: Optional[PacingPolicy] = None,
+                 live: Optional[LiveChannel] = None, coalesce_max_object: int = 0,
+                 slow_clients: Optional[SlowClientPolicy] = None, static: Optional[VideoCatalog] = None):
+        self.catalog = catalog
+        self.dash = dash
+        self.static = static
+        self.cache = cache
+        self.cache_policy = cache_policy or CachePolicy()
+        self.files = files
+        self.mapped = mapped
+        if files is not None or mapped is not None:
+            catalog.listeners.append(self._catalog_changed)
+            for index in (dash, static):
+                if index is not None:
+                    index.listeners.append(self._catalog_changed)
+        self.readahead = None
+        if dash is not None and readahead_depth > 0:
+            self.readahead = Readahead(dash, readahead_depth, self._warm)
+        self.encoded = EncodedCache()
+        self.flights = SingleFlight(coalesce_max_object)
+        self.pacing = pacing if pacing is not None and pacing.enabled else None
+        self.slow_clients = slow_clients or SlowClientPolicy()
+        self.live = live if dash is not None else None
+        self.connections = ConnectionStats()
+        self.load = LoadMonitor()
+        self.drain = DrainState()
+        self.not_modified = 0
+
+    def start_watching(self, interval: float):
+        """Start the background refresh of each index."""
+        self.catalog.start_watching(interval)
+        for index in (self.dash, self.static):
+            if index is not None:
+                index.start_watching(interval)
+
+    def video(self, name: str) -> Optional[CatalogEntry]:
+        return self.catalog.get(name)
+
+    def dash_entry(self, name: str) -> Optional[CatalogEntry]:
+        return self.dash.get(name) if self.dash is not None else None
+
+    def static_entry(self, path: str) -> Optional[CatalogEntry]:
+        """The file of the static tree a URL path names, if any."""
+        if self.static is None:
+            return None
+        return self.static.get(unquote(path.split('?', 1)[0].lstrip('/')))
+
+    def dash_request(self, name: str) -> Optional[CatalogEntry]:
+        """Look up a requested DASH file and read ahead of it when it is a segment."""
+        entry = self.dash_entry(name)
+        if entry is not None and self.readahead is not None:
+            self.readahead.on_request(name)
+        return entry
+
+    def live_manifest(self, name: str) -> Optional[bytes]:
+        """The dynamic MPD for a static one, or None without live mode."""
+        entry = self.dash_entry(name)
+        if self.live is None or entry is None or entry.content_class != 'mpd':
+            return None
+        return self.live.manifest(entry)
+
+    def live_segment(self, name: str) -> LiveSegment:
+        """Resolve a live segment name; raises LiveUnavailable outside its window."""
+        if self.live is None:
+            raise LiveUnavailable("Live mode is disabled")
+        segment = self.live.segment(name)
+        if self.readahead is not None:
+            self.readahead.on_request(segment.entry.name)
+        return segment
+
+    def live_body(self, segment: LiveSegment) -> memoryview:
+        """The whole body of a live segment, retimed onto the live timeline."""
+        entry = segment.entry
+        body = self.body(entry)
+        if isinstance(body, Flight):
+            body = body.result()
+        elif body is None:
+            body = memoryview(_read_file(entry.path, entry.size))
+        return self.live.media(segment, body)
+
+    def video_list(self, accept_encoding: Optional[str]) -> Tuple[str, bytes]:
+        """The catalog as JSON in the best encoding the client accepts.
+
+        The JSON and its compressed variants are built once per catalog
+        version rather than on every request.
+        """
+        variants = self.encoded.get('/', self.catalog.version, self._video_list_json)
+        encoding = negotiate(accept_encoding, variants)
+        return encoding, variants[encoding]
+
+    def _video_list_json(self) -> bytes:
+        video_list = [
+            {
+                'name': entry.name,
+                'size': entry.size,
+                'url': f'/video/{entry.name}'
+            }
+            for entry in self.catalog
+        ]
+        return json.dumps(video_list).encode()
+
+    def new_pacer(self) -> Optional[Pacer]:
+        """A pacer for a new connection, or None when pacing is off."""
+        return Pacer(self.pacing) if self.pacing is not None else None
+
+    def new_guard(self) -> Optional[ThroughputGuard]:
+        """A minimum-throughput guard for a new connection, or None when it is off."""
+        return ThroughputGuard(self.slow_clients) if self.slow_clients.min_rate > 0 else None
+
+    def pace_rate(self, entry: CatalogEntry) -> float:
+        """Bytes/sec a connection sending entry is paced to."""
+        segment = self.dash.segment(entry.name) if entry.content_class in ('init', 'media') else None
+        return self.pacing.rate(segment.representation.bandwidth if segment is not None else None)
+
+    def plan_response(self, entry: CatalogEntry, headers) -> ByteRangeResponse:
+        """Decide status, headers and byte ranges for a GET of entry.
+
+        Conditional requests whose validators still match get a 304, so
+        repeat views of unchanged manifests and segments cost no body bytes.
+        """
+        return self._plan(entry, headers, entry.size, entry.etag, headers.get('Range'))
+
+    def encoded_response(self, entry: CatalogEntry, headers) -> Optional[Tuple[ByteRangeResponse, memoryview]]:
+        """A response and body for a manifest in the best encoding the client accepts.
+
+        Returns None for other content and for Range requests, which are
+        served from the file as usual.
+        """
+        if entry.content_class != 'mpd' or headers.get('Range'):
+            return None
+        variants = self.encoded.get(entry.path, entry.etag, lambda: _read_file(entry.path, entry.size))
+        encoding = negotiate(headers.get('Accept-Encoding'), variants)
+        body = variants[encoding]
+        # Each encoding is a different representation, so it needs its own ETag
+        etag = entry.etag if encoding == 'identity' else f'{entry.etag[:-1]}-{encoding}"'
+        response = self._plan(entry, headers, len(body), etag, None)
+        if encoding != 'identity' and response.parts:
+            response.headers.append(('Content-Encoding', encoding))
+        return response, memoryview(body)
+
+    def _plan(self, entry: CatalogEntry, headers, size: int, etag: str,
+              range_header: Optional[str]) -> ByteRangeResponse:
+        if not_modified(headers.get('If-None-Match'), headers.get('If-Modified-Since'),
+                        etag, entry.mtime_ns):
+            response = ByteRangeResponse.not_modified(entry.last_modified, etag)
+            self.not_modified += 1
+        else:
+            response = ByteRangeResponse(
+                size, entry.mime_type, entry.last_modified,
+                range_header, headers.get('If-Range'), etag
+            )
+        cache_control = self.cache_policy.header(entry.content_class)
+        if cache_control and response.status in CACHEABLE_STATUSES:
+            response.headers.append(('Cache-Control', cache_control))
+        if entry.content_class == 'mpd':
+            response.headers.append(('Vary', 'Accept-Encoding'))
+        return response
+
+    def open_file(self, entry: CatalogEntry) -> ContextManager[BinaryIO]:
+        """Open entry for sending, borrowing a cached handle when there is a cache."""
+        if self.files is None:
+            return open(entry.path, 'rb')
+        return self.files.open(entry)
+
+    def _catalog_changed(self, catalog: VideoCatalog):
+        # Release handles and mappings of files that were removed or rewritten
+        indexes = [index for index in (self.catalog, self.dash, self.static) if index is not None]
+        live = {(e.path, e.etag) for index in indexes for e in index}
+        if self.files is not None:
+            self.files.retain(live)
+        if self.mapped is not None:
+            self.mapped.retain(live)
+
+    def cacheable(self, entry: CatalogEntry) -> bool:
+        return self._mappable(entry) or (self.cache is not None and self.cache.cacheable(entry.size))
+
+    def _mappable(self, entry: CatalogEntry) -> bool:
+        return self.mapped is not None and self.mapped.mappable(entry.size)
+
+    def cached_hit(self, entry: CatalogEntry) -> Optional[memoryview]:
+        """The cached body of entry if it is already resident, without blocking."""
+        if self._mappable(entry):
+            return self.mapped.peek(entry)
+        if not self.cacheable(entry):
+            return None
+        return self.cache.peek(self._cache_key(entry))
+
+    def body(self, entry: CatalogEntry) -> Union[memoryview, Flight, None]:
+        """What to send entry from, without waiting for disk.
+
+        A memoryview when the mmap pool or segment cache holds the file,
+        a Flight when it is being read (concurrent requests for the same
+        file share one read and stream from it as it fills), or None for
+        files sent straight from disk.
+        """
+        if self._mappable(entry):
+            return self.mapped.get(entry)
+        cached = self.cached_hit(entry)
+        if cached is not None:
+            return cached
+        if self.cacheable(entry) or self.flights.coalescable(entry.size):
+            return self._flight(entry)
+        return None
+
+    def _flight(self, entry: CatalogEntry, prefetch: bool = False) -> Flight:
+        key = self._cache_key(entry)
+        store = None
+        if self.cache is not None and self.cache.cacheable(entry.size):
+            store = partial(self.cache.put, key, prefetch=prefetch)
+        return self.flights.join(key, entry.path, entry.size, store)
+
+    def _warm(self, entry: CatalogEntry):
+        # Load into the mmap pool or segment cache when one would hold the
+        # file, so the next request is a memory hit; otherwise just warm the
+        # page cache. Prefetches are kept out of the hit and miss counts.
+        if self._mappable(entry):
+            self.mapped.get(entry, prefetch=True)
+        elif self.cacheable(entry):
+            if self.cache.peek(self._cache_key(entry), prefetch=True) is None:
+                self._flight(entry, prefetch=True).result()
+        else:
+            advise_willneed(entry.path)
+
+    def _cache_key(self, entry: CatalogEntry):
+        # The ETag changes when the file does, so stale bodies are never hit
+        return (entry.path, entry.etag)
+
+    def load_report(self) -> Dict:
+        """The live measurements the controller balances on; cheap to build."""
+        hits = lookups = 0
+        for store in (self.cache, self.mapped):
+            if store is not None:
+                hits += store.hits
+                lookups += store.hits + store.misses
+        return {
+            **self.drain.stats(),
+            'active_connections': self.connections.active,
+            **self.load.snapshot(),
+            'cache_hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def stats(self) -> Dict:
+        stats = {
+            'catalog_version': self.catalog.version,
+            'keepalive': self.connections.stats(),
+            'not_modified': self.not_modified,
+        }
+        if self.dash is not None:
+            stats['dash_version'] = self.dash.version
+        if self.cache is not None:
+            stats['segment_cache'] = self.cache.stats()
+        stats['encoded'] = self.encoded.stats()
+        stats['coalescing'] = self.flights.stats()
+        stats['slow_clients'] = self.slow_clients.stats()
+        if self.pacing is not None:
+            stats['pacing'] = self.pacing.stats()
+        if self.mapped is not None:
+            stats['mmap_pool'] = self.mapped.stats()
+        if self.files is not None:
+            stats['fd_cache'] = self.files.stats()
+        if self.readahead is not None:
+            stats['readahead'] = self.readahead.stats()
+        if self.live is not None:
+            stats['live'] = self.live.stats()
+        return stats
+
+def _read_file(path: str, size: int) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read(size)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+# Bytes sent between pacing decisions
+PACE_CHUNK = 64 * 1024
+# How much unused rate a bucket may bank, in seconds
+BURST_SECONDS = 0.5
+
+class TokenBucket:
+    """Token bucket in bytes; reserve() says how long to wait before sending."""
+    def __init__(self, rate: float):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.capacity = max(PACE_CHUNK, rate * BURST_SECONDS)
+        # Tokens, and when they were last refilled; in shared memory after share()
+        self._state = [self.capacity, time.monotonic()]
+
+    def share(self):
+        """Spend one bucket from every process forked after this call.
+
+        The prefork engine calls this so a server-wide rate caps all of its
+        processes together rather than each of them.
+        """
+        self._lock = multiprocessing.Lock()
+        # CLOCK_MONOTONIC is system-wide, so the refill time means the same in every child
+        self._state = multiprocessing.RawArray('d', self._state)
+
+    def _refill(self, now: float):
+        state = self._state
+        state[0] = min(self.capacity, state[0] + (now - state[1]) * self.rate)
+        state[1] = now
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.capacity = max(PACE_CHUNK, rate * BURST_SECONDS)
+            self._state[0] = min(self._state[0], self.capacity)
+
+    def reserve(self, n: int) -> float:
+        """Take n tokens and return the seconds to wait until they are earned."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._state[0] -= n
+            tokens = self._state[0]
+        return -tokens / self.rate if tokens < 0 else 0.0
+
+class Pacer:
+    """Paces one connection against its own bucket and the server-wide one."""
+    def __init__(self, policy: 'PacingPolicy'):
+        self.policy = policy
+        self.bucket: Optional[TokenBucket] = None
+
+    def set_rate(self, rate: float):
+        """Rate for the next response in bytes/sec; 0 leaves the connection unpaced."""
+        if not rate:
+            self.bucket = None
+        elif self.bucket is None:
+            self.bucket = TokenBucket(rate)
+        elif self.bucket.rate != rate:
+            self.bucket.set_rate(rate)
+
+    def delay(self, n: int) -> float:
+        delay = self.bucket.reserve(n) if self.bucket is not None else 0.0
+        if self.policy.server is not None:
+            delay = max(delay, self.policy.server.reserve(n))
+        if delay:
+            self.policy.record(delay)
+        return delay
+
+    def chunks(self, offset: int, length: int) -> Iterator[Tuple[int, int, float]]:
+        """Split a byte range into (offset, length, delay-before-sending) steps."""
+        end = offset + length
+        while offset < end:
+            n = min(PACE_CHUNK, end - offset)
+            yield offset, n, self.delay(n)
+            offset += n
+
+class PacingPolicy:
+    """Egress pacing settings shared by every connection of the origin.
+
+    DASH segments are paced at their representation's MPD bandwidth times
+    factor; other files at connection_rate. server_rate caps the sum over
+    all connections. Rates are bytes/sec and 0 turns that limit off.
+    """
+    def __init__(self, factor: float = 0.0, connection_rate: float = 0.0, server_rate: float = 0.0):
+        self.factor = factor
+        self.connection_rate = connection_rate
+        self.server = TokenBucket(server_rate) if server_rate > 0 else None
+        self._lock = threading.Lock()
+        self.delays = 0
+        self.delayed_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.factor or self.connection_rate or self.server)
+
+    def share(self):
+        """Make server_rate a cap on every process forked after this call together."""
+        if self.server is not None:
+            self.server.share()
+
+    def rate(self, bandwidth: Optional[int]) -> float:
+        """Per-connection bytes/sec for content with the given MPD bandwidth (bits/sec)."""
+        if bandwidth and self.factor:
+            return bandwidth * self.factor / 8
+        return self.connection_rate
+
+    def record(self, delay: float):
+        with self._lock:
+            self.delays += 1
+            self.delayed_seconds += delay
+
+    def stats(self) -> Dict:
+        return {
+            'factor': self.factor,
+            'connection_rate': self.connection_rate,
+            'server_rate': self.server.rate if self.server is not None else 0,
+            'delays': self.delays,
+            'delayed_seconds': round(self.delayed_seconds, 3),
+        }
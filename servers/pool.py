@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import queue
+import signal
+import socket
+import socketserver
+import threading
+import time
+from typing import Callable, Dict, List
+
+from drain import DRAIN_SIGNAL
+
+REJECT_RESPONSE = (
+    b'HTTP/1.0 503 Service Unavailable\r\n'
+    b'Retry-After: 1\r\n'
+    b'Content-Length: 0\r\n'
+    b'Connection: close\r\n\r\n'
+)
+
+class ThreadPoolHTTPServer(socketserver.TCPServer):
+    """TCP server that hands accepted connections to a fixed pool of workers.
+
+    Accepted sockets wait in a bounded queue. When the queue is full the
+    connection is answered with a 503 and closed right away instead of
+    piling up, so overload shows up in the rejected counter rather than as
+    unbounded latency.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, workers: int = 32, queue_depth: int = 128,
+                 reuse_port: bool = False, bind_and_activate: bool = True):
+        self.workers = workers
+        self.reuse_port = reuse_port
+        # Listen backlog in the kernel, in front of our own queue
+        self.request_queue_size = max(queue_depth, 5)
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_depth)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.busy_workers = 0
+        super().__init__(server_address, handler_class, bind_and_activate)
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f'worker-{i}', daemon=self.daemon_threads)
+            thread.start()
+            self._threads.append(thread)
+
+    def server_bind(self):
+        if self.reuse_port:
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def process_request(self, request, client_address):
+        """Queue the connection for a worker, or reject it if the queue is full."""
+        try:
+            self._queue.put_nowait((request, client_address))
+            self.accepted += 1
+        except queue.Full:
+            self.rejected += 1
+            try:
+                request.sendall(REJECT_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            request, client_address = item
+            with self._lock:
+                self.busy_workers += 1
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self._lock:
+                    self.busy_workers -= 1
+
+    def server_close(self):
+        super().server_close()
+        # Drop connections nobody picked up yet, then stop the workers
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self.shutdown_request(item[0])
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+
+    def stats(self) -> Dict:
+        """Engine counters for this process."""
+        return {
+            'engine': 'threaded',
+            'pid': os.getpid(),
+            'workers': self.workers,
+            'busy_workers': self.busy_workers,
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+        }
+
+def serve_prefork(make_server: Callable[[], socketserver.BaseServer], processes: int):
+    """Fork processes that each run their own server on a shared port.
+
+    make_server must create a server with SO_REUSEPORT set, so the kernel
+    spreads incoming connections across the children and one origin can
+    use every core. The parent only supervises and stops the children on
+    SIGINT/SIGTERM.
+    """
+    children: List[int] = []
+    for _ in range(processes):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            status = 1
+            try:
+                with make_server() as httpd:
+                    httpd.serve_forever()
+                status = 0
+            except Exception:
+                logging.exception(f"Worker process {os.getpid()} failed")
+            finally:
+                os._exit(status)
+        children.append(pid)
+
+    logging.info(f"Started {processes} worker processes: {children}")
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    # Each child drains itself and exits; the parent exits with the last one
+    signal.signal(DRAIN_SIGNAL, lambda signum, frame: _signal_children(children, signum))
+    try:
+        while children:
+            pid, status = os.wait()
+            if pid in children:
+                children.remove(pid)
+                logging.warning(f"Worker process {pid} exited with status {status}")
+    except KeyboardInterrupt:
+        logging.info("Stopping worker processes")
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + 5.0
+        for pid in children:
+            while time.monotonic() < deadline:
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if done:
+                    break
+                time.sleep(0.05)
+
+def _signal_children(children: List[int], signum: int):
+    for pid in children:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
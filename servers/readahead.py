@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import queue
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from catalog import CatalogEntry
+from dash import DashIndex
+
+# Upper bound on the configurable lookahead depth
+MAX_DEPTH = 16
+WARM_READ_SIZE = 1024 * 1024
+
+def advise_willneed(path: str):
+    """Ask the kernel to start reading path into the page cache.
+
+    Falls back to reading the file ourselves where posix_fadvise is missing.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        else:
+            while os.read(fd, WARM_READ_SIZE):
+                pass
+    finally:
+        os.close(fd)
+
+class Readahead:
+    """Prefetch the next segments of a representation as soon as one is requested.
+
+    DASH clients fetch ..._N.m4v and then ..._N+1.m4v, so when segment N
+    (or the init segment) is requested the next depth segments are queued
+    for a background thread that warms them with warm(entry). A later
+    request for a segment that was prefetched counts as a readahead hit.
+    The queue and the set of remembered prefetches are both bounded.
+    """
+    def __init__(self, dash: DashIndex, depth: int, warm: Callable[[CatalogEntry], None],
+                 max_pending: int = 256):
+        self.dash = dash
+        self.depth = max(0, min(depth, MAX_DEPTH))
+        self.warm = warm
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._issued: OrderedDict = OrderedDict()
+        self._issued_limit = max_pending * 4
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self.issued = 0
+        self.dropped = 0
+        self.hits = 0
+        self.misses = 0
+
+    def on_request(self, name: str):
+        """Record a DASH request and queue the segments that follow it."""
+        segment = self.dash.segment(name)
+        if segment is None:
+            return
+        rep = segment.representation
+        with self._lock:
+            if segment.number is not None:
+                if self._issued.pop(name, None) is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            first = rep.start_number if segment.number is None else segment.number + 1
+            last = min(first + self.depth, rep.start_number + rep.segment_count)
+            for number in range(first, last):
+                next_name = rep.segment_name(number)
+                if next_name in self._issued:
+                    continue
+                entry = self.dash.get(next_name)
+                if entry is None:
+                    continue
+                try:
+                    self._queue.put_nowait(entry)
+                except queue.Full:
+                    self.dropped += 1
+                    break
+                self._issued[next_name] = True
+                self.issued += 1
+                if len(self._issued) > self._issued_limit:
+                    self._issued.popitem(last=False)
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        # Started lazily so forked worker processes each get their own thread
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='readahead', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                self.warm(entry)
+            except OSError as e:
+                logging.warning(f"Readahead of {entry.name} failed: {str(e)}")
+
+    def stats(self) -> Dict:
+        requests = self.hits + self.misses
+        return {
+            'depth': self.depth,
+            'issued': self.issued,
+            'dropped': self.dropped,
+            'pending': self._queue.qsize(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0.0,
+        }
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+POLICIES = ('lru', 'lfu')
+
+class _LRUPolicy:
+    """Evicts the entry that was used longest ago."""
+    def __init__(self):
+        self._order: OrderedDict = OrderedDict()
+
+    def add(self, key: Hashable):
+        self._order[key] = None
+
+    def touch(self, key: Hashable):
+        self._order.move_to_end(key)
+
+    def remove(self, key: Hashable):
+        del self._order[key]
+
+    def victim(self) -> Hashable:
+        return next(iter(self._order))
+
+class _LFUPolicy:
+    """Evicts the least frequently used entry, oldest first on ties.
+
+    Keys live in one insertion-ordered bucket per use count, so every
+    operation is O(1).
+    """
+    def __init__(self):
+        self._freq: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, OrderedDict] = {}
+        self._min_freq = 0
+
+    def add(self, key: Hashable):
+        self._freq[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._min_freq = 1
+
+    def touch(self, key: Hashable):
+        freq = self._freq[key]
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+        self._freq[key] = freq + 1
+        self._buckets.setdefault(freq + 1, OrderedDict())[key] = None
+
+    def remove(self, key: Hashable):
+        freq = self._freq.pop(key)
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = min(self._buckets, default=0)
+
+    def victim(self) -> Hashable:
+        return next(iter(self._buckets[self._min_freq]))
+
+class SegmentCache:
+    """In-memory cache of whole files bounded by a byte budget.
+
+    Hits return a memoryview over the cached bytes, so serving from cache
+    never copies the payload. Callers load misses themselves (concurrent
+    ones share a SingleFlight read) and store the result with put().
+    """
+    def __init__(self, budget_bytes: int, policy: str = 'lru', max_object_bytes: Optional[int] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown cache policy: {policy}")
+        self.budget_bytes = budget_bytes
+        self.max_object_bytes = min(max_object_bytes or budget_bytes, budget_bytes)
+        self.policy = policy
+        self._policy = _LRUPolicy() if policy == 'lru' else _LFUPolicy()
+        self._data: Dict[Hashable, bytes] = {}
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Stored by readahead rather than a request; neither hits nor misses
+        self.prefetched = 0
+
+    def cacheable(self, size: int) -> bool:
+        return size <= self.max_object_bytes
+
+    def peek(self, key: Hashable, prefetch: bool = False) -> Optional[memoryview]:
+        """Return the cached bytes for key if present, never loading.
+
+        A prefetch lookup is not a request, so it does not count as a hit.
+        """
+        with self._lock:
+            data = self._data.get(key)
+            if data is None:
+                return None
+            if not prefetch:
+                self.hits += 1
+            self._policy.touch(key)
+            return memoryview(data)
+
+    def put(self, key: Hashable, data: bytes, prefetch: bool = False):
+        """Store data loaded by the caller after a peek() miss, counting the miss
+        (or the prefetch, for data loaded ahead of any request)."""
+        with self._lock:
+            if prefetch:
+                self.prefetched += 1
+            else:
+                self.misses += 1
+        self._store(key, data)
+
+    def _store(self, key: Hashable, data: bytes):
+        if len(data) > self.max_object_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                return
+            while self.size_bytes + len(data) > self.budget_bytes and self._data:
+                self._remove(self._policy.victim())
+                self.evictions += 1
+            self._data[key] = data
+            self._policy.add(key)
+            self.size_bytes += len(data)
+
+    def _remove(self, key: Hashable):
+        self.size_bytes -= len(self._data.pop(key))
+        self._policy.remove(key)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'policy': self.policy,
+            'budget_bytes': self.budget_bytes,
+            'size_bytes': self.size_bytes,
+            'entries': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'prefetched': self.prefetched,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
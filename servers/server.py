@@ -1,100 +1,584 @@
 #!/usr/bin/env python3
 
 import http.server
-import socketserver
 import os
 import json
+import argparse
+import asyncio
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List
+from typing import Optional
 import logging
+import signal
+import socket
+import sys
+import threading
+from async_server import AsyncVideoServer
+from byteranges import ByteRangeResponse
+from catalog import CatalogEntry, StaticTree, VideoCatalog
+from dash import DEFAULT_DASH_ROOT, DashIndex
+from drain import DRAIN_SIGNAL, parse_drain_timeout
+from fd_cache import FileHandleCache
+from live import LiveChannel, LiveUnavailable
+from load import Heartbeat, parse_address
+from mmap_pool import MappedPool
+from origin import Origin
+from pacing import PacingPolicy
+from pool import ThreadPoolHTTPServer, serve_prefork
+from readahead import MAX_DEPTH as MAX_READAHEAD_DEPTH
+from segment_cache import POLICIES, SegmentCache
+from singleflight import Flight
+from slow_clients import SlowClientError, SlowClientPolicy, guarded_slices
+from validators import CONTENT_CLASSES, DEFAULT_CACHE_CONTROL, CachePolicy
+from transfer import send_file
+
+# Helpers shared with the controller and client live in the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.logging_setup import set_sampling, setup_logging
+
+ENGINES = ('threaded', 'prefork', 'asyncio')
+
+@dataclass
+class ServerConfig:
+    port: int = 8000
+    engine: str = 'threaded'
+    workers: int = 32
+    queue_depth: int = 128
+    processes: int = field(default_factory=lambda: os.cpu_count() or 1)
+    write_buffer_limit: int = 256 * 1024
+    idle_timeout: float = 30.0
+    catalog_interval: float = 2.0
+    dash_root: str = DEFAULT_DASH_ROOT
+    static_root: str = ''
+    cache_bytes: int = 256 * 1024 * 1024
+    cache_policy: str = 'lru'
+    cache_max_object: int = 8 * 1024 * 1024
+    readahead_depth: int = 3
+    fd_cache_size: int = 256
+    mmap_bytes: int = 0
+    mmap_max_object: int = 4 * 1024 * 1024
+    pace_factor: float = 0.0
+    pace_rate: int = 0
+    pace_server_rate: int = 0
+    heartbeat: str = ''
+    heartbeat_interval: float = 1.0
+    server_id: str = ''
+    access_log_every: int = 1
+    drain_timeout: float = 30.0
+    coalesce_max_object: int = 8 * 1024 * 1024
+    write_timeout: float = 30.0
+    min_client_rate: int = 0
+    min_client_rate_window: float = 10.0
+    live_window: float = 30.0
+    live_chunk: float = 0.5
+    live_start: float = 0.0
+    keepalive_timeout: float = 5.0
+    max_keepalive_requests: int = 100
+    cache_control_video: str = DEFAULT_CACHE_CONTROL['video']
+    cache_control_mpd: str = DEFAULT_CACHE_CONTROL['mpd']
+    cache_control_init: str = DEFAULT_CACHE_CONTROL['init']
+    cache_control_media: str = DEFAULT_CACHE_CONTROL['media']
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('server.log'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging('server.log')
+# One record per response, so it can be sampled with --access-log-every
+access_log = logging.getLogger('server.access')
 
 class VideoStreamingHandler(http.server.SimpleHTTPRequestHandler):
-    """Custom HTTP request handler for video streaming."""
-    
-    def __init__(self, *args, **kwargs):
-        self.video_files = self._get_video_files()
-        super().__init__(*args, **kwargs)
-
-    def _get_video_files(self) -> Dict[str, str]:
-        """Get list of available video files in the current directory."""
-        video_files = {}
-        for file in os.listdir('.'):
-            if file.endswith(('.mp4', '.avi', '.mkv')):
-                video_files[file] = os.path.getsize(file)
-        return video_files
+    """Custom HTTP request handler for video streaming.
+
+    File metadata comes from the server's Origin (catalog and DASH index),
+    so serving a request never lists or stats the directory. Connections
+    are persistent HTTP/1.1, so a DASH player fetches segment after segment
+    (pipelined or not) over one TCP connection and one controller flow.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Until the first request line arrives; a pool worker must not wait forever on an idle connect
+        self.connection.settimeout(self.server.config.idle_timeout or None)
+        self.requests_on_connection = 0
+        self._connection_header_sent = False
+        self.pacer = self.server.origin.new_pacer()
+        self.guard = self.server.origin.new_guard()
+        self.connection_started = time.monotonic()
+        self.server.origin.connections.opened()
+
+    def finish(self):
+        self.server.origin.connections.closed()
+        super().finish()
+
+    def handle_one_request(self):
+        if self.requests_on_connection:
+            # Idle wait for the next request on a kept-alive connection
+            self.connection.settimeout(self.server.config.keepalive_timeout)
+        try:
+            super().handle_one_request()
+        except SlowClientError as e:
+            self._evict(e)
+
+    def _evict(self, error: SlowClientError):
+        """Drop a client that stopped reading, freeing this worker for others."""
+        held = time.monotonic() - self.connection_started
+        self.server.origin.slow_clients.evicted(error.reason, held)
+        logging.warning("Evicting slow client %s after %.1fs: %s", self.address_string(), held, error)
+        self.close_connection = True
+
+    def parse_request(self) -> bool:
+        if not super().parse_request():
+            return False
+        # From here on the socket is only written to; a stalled write is a slow client
+        self.connection.settimeout(self.server.origin.slow_clients.write_timeout or None)
+        self.request_started = time.monotonic()
+        self.server.origin.connections.request(reused=self.requests_on_connection > 0)
+        self.requests_on_connection += 1
+        if (self.requests_on_connection >= self.server.config.max_keepalive_requests
+                or self.server.origin.drain.draining):
+            self.close_connection = True
+        return True
+
+    def send_response(self, code, message=None):
+        self._connection_header_sent = False
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'connection':
+            self._connection_header_sent = True
+        super().send_header(keyword, value)
+
+    def flush_headers(self):
+        self._timed_write(0, super().flush_headers)
+
+    def end_headers(self):
+        """Tell the client whether this connection stays open."""
+        if not self._connection_header_sent:
+            self.send_header('Connection', 'close' if self.close_connection else 'keep-alive')
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        """Send the request log through the queued access logger instead of stderr."""
+        access_log.info("%s - " + format, self.address_string(), *args)
+
+    def send_error(self, code, message=None, explain=None):
+        """Like the base send_error, but a 404 keeps a persistent connection open."""
+        if code != 404 or self.close_connection:
+            super().send_error(code, message, explain)
+            return
+        self.log_error("code %d, message %s", code, message)
+        body = (message or 'Not Found').encode()
+        self.send_response(code, message)
+        self.send_header('Content-type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
     def do_GET(self):
         """Handle GET requests."""
+        self._discard_body()
         if self.path == '/':
             self._send_video_list()
         elif self.path.startswith('/video/'):
             self._stream_video(self.path[7:])  # Remove '/video/' prefix
+        elif self.path.startswith('/dash/'):
+            self._send_dash(self.path[6:].split('?', 1)[0])
+        elif self.path.startswith('/live/'):
+            self._send_live(self.path[6:].split('?', 1)[0])
+        elif self.path == '/_stats':
+            self._send_stats()
+        elif self.path == '/_load':
+            self._send_json(self.server.origin.load_report())
         else:
-            self.send_error(404, "File not found")
+            self._send_static()
+
+    def do_POST(self):
+        """Handle admin requests."""
+        self._discard_body()
+        if self.path.split('?', 1)[0] == '/_drain':
+            self._start_drain()
+        else:
+            self.send_error(501, "Unsupported method")
+
+    def _discard_body(self):
+        # Request bodies are not used, but must be consumed to keep framing intact
+        length = self.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > 0:
+            self.rfile.read(int(length))
+
+    def _start_drain(self):
+        """Take this server out of rotation; see DrainState."""
+        try:
+            timeout = parse_drain_timeout(self.path, self.server.config.drain_timeout)
+        except ValueError:
+            self.send_error(400, "Bad drain timeout")
+            return
+        self.server.origin.drain.request(timeout)
+        self.close_connection = True
+        self._send_json(self.server.origin.drain.stats(), status=202)
 
     def _send_video_list(self):
         """Send list of available videos as JSON."""
+        encoding, body = self.server.origin.video_list(self.headers.get('Accept-Encoding'))
+
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
         self.end_headers()
-        
-        video_list = [
-            {
-                'name': name,
-                'size': size,
-                'url': f'/video/{name}'
-            }
-            for name, size in self.video_files.items()
-        ]
-        
-        self.wfile.write(json.dumps(video_list).encode())
+        self.wfile.write(body)
+
+    def _send_stats(self):
+        """Send the serving engine's and origin's counters as JSON."""
+        stats = self.server.stats() if hasattr(self.server, 'stats') else {}
+        stats.update(self.server.origin.stats())
+        self._send_json(stats)
+
+    def _send_json(self, payload, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
     def _stream_video(self, filename: str):
         """Stream video file to client."""
-        if filename not in self.video_files:
+        entry = self.server.origin.video(filename)
+        if entry is None:
             self.send_error(404, "Video not found")
             return
+        self._send_entry(entry)
 
+    def _send_dash(self, name: str):
+        """Send an MPD or a segment it references."""
+        entry = self.server.origin.dash_request(name)
+        if entry is None:
+            self.send_error(404, "Segment not found")
+            return
+        self._send_entry(entry)
+
+    def _send_static(self):
+        """Send a file of the static tree, such as the player page."""
+        entry = self.server.origin.static_entry(self.path)
+        if entry is None:
+            self.send_error(404, "File not found")
+            return
+        self._send_entry(entry)
+
+    def _send_live(self, name: str):
+        """Send a dynamic MPD, or a live segment as its chunks become available.
+
+        HTTP/1.1 clients get each chunk as soon as it is released, with
+        chunked transfer encoding; HTTP/1.0 clients get the segment once it
+        is complete.
+        """
+        origin = self.server.origin
+        if name.endswith('.mpd'):
+            manifest = origin.live_manifest(name)
+            if manifest is None:
+                self.send_error(404, "Manifest not found")
+                return
+            self.send_response(200)
+            self.send_header('Content-type', 'application/dash+xml')
+            self.send_header('Content-Length', str(len(manifest)))
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.wfile.write(manifest)
+            return
         try:
-            file_size = self.video_files[filename]
+            segment = origin.live_segment(name)
+        except LiveUnavailable as e:
+            self.send_error(404, str(e))
+            return
+
+        try:
+            body = origin.live_body(segment)
+            chunks = origin.live.chunks(segment, body)
+            chunked = self.request_version >= 'HTTP/1.1'
             self.send_response(200)
-            self.send_header('Content-type', 'video/mp4')
-            self.send_header('Content-Length', str(file_size))
-            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-type', segment.entry.mime_type)
+            if chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            else:
+                self.send_header('Content-Length', str(len(body)))
+            cache_control = origin.cache_policy.header(segment.entry.content_class)
+            if cache_control:
+                self.send_header('Cache-Control', cache_control)
+            if not chunked:
+                self._wait_until(chunks[-1][0])
             self.end_headers()
+            self.wfile.flush()
+            origin.load.first_byte(time.monotonic() - self.request_started)
+
+            for release, offset, length in chunks:
+                if chunked:
+                    self._wait_until(release)
+                    self._write(b'%x\r\n' % length)
+                self._send_part(body, offset, length)
+                if chunked:
+                    self._write(b'\r\n')
+            if chunked:
+                self._write(b'0\r\n\r\n')
+            access_log.info("Successfully streamed live %s", name)
+        except OSError as e:
+            logging.error("Error streaming live %s: %s", name, e)
+            self.close_connection = True
 
-            with open(filename, 'rb') as f:
-                while True:
-                    chunk = f.read(8192)  # Read in 8KB chunks
-                    if not chunk:
-                        break
-                    self.wfile.write(chunk)
+    def _wait_until(self, release: float):
+        delay = release - time.time()
+        if delay > 0:
+            time.sleep(delay)
 
-            logging.info(f"Successfully streamed {filename}")
+    def _send_entry(self, entry: CatalogEntry):
+        """Send an indexed file, honoring conditional and Range headers.
+
+        Manifests are sent precompressed when the client accepts it, small
+        files come from the segment cache as memoryview slices (a miss
+        streams from a coalesced load shared with concurrent requests) and
+        the rest are sent from disk with sendfile.
+        """
+        try:
+            encoded = self.server.origin.encoded_response(entry, self.headers)
+            if encoded is not None:
+                response, body = encoded
+            else:
+                response = self.server.origin.plan_response(entry, self.headers)
+                body = self.server.origin.body(entry) if response.parts else None
+            if self.pacer is not None:
+                self.pacer.set_rate(self.server.origin.pace_rate(entry))
+            if body is not None or not response.parts:
+                self._send_response(response, body)
+            else:
+                with self.server.origin.open_file(entry) as f:
+                    self._send_response(response, f)
+
+            access_log.info("Successfully streamed %s", entry.name)
+        except SlowClientError:
+            raise
         except Exception as e:
-            logging.error(f"Error streaming {filename}: {str(e)}")
+            logging.error("Error streaming %s: %s", entry.name, e)
             self.send_error(500, "Internal server error")
 
-def run_server(port: int = 8000):
+    def _send_response(self, response: ByteRangeResponse, body):
+        """Write the headers and parts of response from a memoryview or a file."""
+        self.send_response(response.status)
+        for name, value in response.headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.flush()
+        self.server.origin.load.first_byte(time.monotonic() - self.request_started)
+
+        for prefix, offset, length in response.parts:
+            if prefix:
+                self._write(prefix)
+            if self.pacer is None:
+                self._send_part(body, offset, length)
+                continue
+            for chunk_offset, chunk_length, delay in self.pacer.chunks(offset, length):
+                if delay:
+                    time.sleep(delay)
+                self._send_part(body, chunk_offset, chunk_length)
+        if response.trailer:
+            self._write(response.trailer)
+
+    def _send_part(self, body, offset: int, length: int):
+        if isinstance(body, Flight):
+            # Waiting for the load is not the client's fault, so only the sends are timed
+            for chunk in body.chunks(offset, length):
+                self._timed_write(len(chunk), self.connection.sendall, chunk)
+        else:
+            for slice_offset, slice_length in guarded_slices(offset, length):
+                if isinstance(body, memoryview):
+                    self._timed_write(slice_length, self.connection.sendall,
+                                      body[slice_offset:slice_offset + slice_length])
+                else:
+                    self._timed_write(slice_length, send_file, self.connection, body, slice_offset, slice_length)
+        self.server.origin.load.sent(length)
+
+    def _write(self, data: bytes):
+        self._timed_write(len(data), self.wfile.write, data)
+
+    def _timed_write(self, n: int, write, *args):
+        """Run a blocking write of n bytes, enforcing the slow-client policy."""
+        started = time.monotonic()
+        try:
+            write(*args)
+        except socket.timeout:
+            raise SlowClientError('write_timeout', f"no progress for {self.connection.gettimeout():g}s")
+        if self.guard is not None:
+            self.guard.sent(n, time.monotonic() - started)
+
+def make_origin(config: ServerConfig) -> Origin:
+    """Build the content indexes and caches described by config."""
+    # Scanned once here; forked workers inherit the index and poll on their own
+    catalog = VideoCatalog('.')
+    dash = DashIndex(config.dash_root) if config.dash_root and os.path.isdir(config.dash_root) else None
+    if dash is None:
+        logging.warning(f"No DASH content at {config.dash_root}, /dash/ routes are disabled")
+    static = None
+    if config.static_root:
+        if os.path.isdir(config.static_root):
+            static = StaticTree(config.static_root)
+        else:
+            logging.warning(f"No static files at {config.static_root}")
+    cache = None
+    if config.cache_bytes > 0:
+        cache = SegmentCache(config.cache_bytes, config.cache_policy, config.cache_max_object)
+    cache_policy = CachePolicy(**{c: getattr(config, f'cache_control_{c}') for c in CONTENT_CLASSES})
+    files = FileHandleCache(config.fd_cache_size) if config.fd_cache_size > 0 else None
+    mapped = MappedPool(config.mmap_bytes, config.mmap_max_object) if config.mmap_bytes > 0 else None
+    pacing = PacingPolicy(config.pace_factor, config.pace_rate, config.pace_server_rate)
+    live = None
+    if dash is not None and config.live_window > 0:
+        # Fixed here, before any fork, so every worker serves the same timeline
+        live = LiveChannel(dash, config.live_start or None, config.live_window, config.live_chunk)
+    slow_clients = SlowClientPolicy(config.write_timeout, config.min_client_rate, config.min_client_rate_window)
+    return Origin(catalog, dash, cache, cache_policy, config.readahead_depth, files, mapped, pacing, live,
+                  config.coalesce_max_object, slow_clients, static)
+
+def make_server(config: ServerConfig, origin: Origin, reuse_port: bool = False) -> ThreadPoolHTTPServer:
+    """Create a worker-pool server bound to the configured port."""
+    httpd = ThreadPoolHTTPServer(("", config.port), VideoStreamingHandler,
+                                 workers=config.workers, queue_depth=config.queue_depth,
+                                 reuse_port=reuse_port)
+    httpd.config = config
+    httpd.origin = origin
+    origin.start_watching(config.catalog_interval)
+    start_heartbeat(config, origin)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(DRAIN_SIGNAL, lambda signum, frame: origin.drain.start(config.drain_timeout))
+    threading.Thread(target=_shutdown_when_drained, args=(httpd,), name='drain-watcher', daemon=True).start()
+    return httpd
+
+def _shutdown_when_drained(httpd: ThreadPoolHTTPServer):
+    httpd.origin.drain.wait(lambda: httpd.origin.connections.active)
+    logging.info("Drained, stopping server")
+    httpd.shutdown()
+
+def start_heartbeat(config: ServerConfig, origin: Origin) -> Optional[Heartbeat]:
+    """Start pushing load reports when a controller address is configured."""
+    if not config.heartbeat:
+        return None
+    heartbeat = Heartbeat(origin.load_report, parse_address(config.heartbeat),
+                          config.heartbeat_interval, config.server_id or None)
+    heartbeat.start()
+    return heartbeat
+
+def run_server(port: int = 8000, **options):
     """Run the video streaming server."""
-    handler = VideoStreamingHandler
-    with socketserver.TCPServer(("", port), handler) as httpd:
-        logging.info(f"Serving at port {port}")
+    config = ServerConfig(port=port, **options)
+    if config.engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {config.engine}")
+
+    set_sampling('server.access', config.access_log_every)
+    origin = make_origin(config)
+
+    if config.engine == 'prefork':
+        logging.info(f"Serving at port {port} with {config.processes} processes x {config.workers} workers")
+        # A POST /_drain to any child then drains them all, and --pace-server-rate caps them together
+        origin.drain.share()
+        if origin.pacing is not None:
+            origin.pacing.share()
+        serve_prefork(lambda: make_server(config, origin, reuse_port=True), config.processes)
+        return
+
+    if config.engine == 'asyncio':
+        try:
+            origin.start_watching(config.catalog_interval)
+            start_heartbeat(config, origin)
+            asyncio.run(AsyncVideoServer(config, origin).serve_forever())
+        except KeyboardInterrupt:
+            logging.info("Server stopped by user")
+        return
+
+    with make_server(config, origin) as httpd:
+        logging.info(f"Serving at port {port} with {config.workers} workers")
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             logging.info("Server stopped by user")
             httpd.server_close()
 
+def main():
+    defaults = ServerConfig()
+    parser = argparse.ArgumentParser(description='Video Streaming Server')
+    parser.add_argument('--port', type=int, default=defaults.port, help='Port to listen on')
+    parser.add_argument('--engine', choices=ENGINES, default=defaults.engine,
+                        help='threaded: one worker pool; prefork: one pool per process sharing the port; '
+                             'asyncio: one event loop, no thread per connection')
+    parser.add_argument('--workers', type=int, default=defaults.workers, help='Worker threads per process')
+    parser.add_argument('--queue-depth', type=int, default=defaults.queue_depth,
+                        help='Accepted connections waiting for a worker before new ones get a 503')
+    parser.add_argument('--processes', type=int, default=defaults.processes,
+                        help='Worker processes for the prefork engine')
+    parser.add_argument('--write-buffer-limit', type=int, default=defaults.write_buffer_limit,
+                        help='Bytes buffered per connection before the asyncio engine waits for the client')
+    parser.add_argument('--idle-timeout', type=float, default=defaults.idle_timeout,
+                        help='Seconds a new connection may wait before sending its first request (either engine)')
+    parser.add_argument('--write-timeout', type=float, default=defaults.write_timeout,
+                        help='Seconds a write to a client may make no progress before it is evicted (0 waits forever)')
+    parser.add_argument('--min-client-rate', type=int, default=defaults.min_client_rate,
+                        help='Evict clients that accept fewer bytes/sec than this while we wait on them, 0 to disable')
+    parser.add_argument('--min-client-rate-window', type=float, default=defaults.min_client_rate_window,
+                        help='Seconds of blocked writes the minimum client rate is measured over')
+    parser.add_argument('--catalog-interval', type=float, default=defaults.catalog_interval,
+                        help='Seconds between checks for added or changed videos (0 disables)')
+    parser.add_argument('--dash-root', default=defaults.dash_root,
+                        help='Directory holding the MPDs served under /dash/')
+    parser.add_argument('--static-root', default=defaults.static_root,
+                        help='Directory whose files are served at their own paths, e.g. a DASH player page')
+    parser.add_argument('--cache-bytes', type=int, default=defaults.cache_bytes,
+                        help='Memory budget of the segment cache in bytes (0 disables)')
+    parser.add_argument('--cache-policy', choices=POLICIES, default=defaults.cache_policy,
+                        help='Segment cache eviction policy')
+    parser.add_argument('--cache-max-object', type=int, default=defaults.cache_max_object,
+                        help='Largest file the segment cache will hold, in bytes')
+    parser.add_argument('--readahead-depth', type=int, default=defaults.readahead_depth,
+                        help=f'DASH segments to prefetch after each request, 0 to disable (max {MAX_READAHEAD_DEPTH})')
+    parser.add_argument('--coalesce-max-object', type=int, default=defaults.coalesce_max_object,
+                        help='Largest uncached file whose concurrent fetches share one read, 0 to disable')
+    parser.add_argument('--mmap-bytes', type=int, default=defaults.mmap_bytes,
+                        help='Bytes of small files to serve from read-only memory maps, 0 to disable')
+    parser.add_argument('--mmap-max-object', type=int, default=defaults.mmap_max_object,
+                        help='Largest file the mmap pool will map, in bytes')
+    parser.add_argument('--fd-cache-size', type=int, default=defaults.fd_cache_size,
+                        help='Open files kept for reuse between requests, 0 to disable')
+    parser.add_argument('--pace-factor', type=float, default=defaults.pace_factor,
+                        help='Pace DASH segments at their MPD bandwidth times this factor, 0 to disable')
+    parser.add_argument('--pace-rate', type=int, default=defaults.pace_rate,
+                        help='Per-connection bytes/sec for files without an MPD bandwidth, 0 to disable')
+    parser.add_argument('--pace-server-rate', type=int, default=defaults.pace_server_rate,
+                        help='Bytes/sec shared by all connections of this server (all processes with '
+                             'the prefork engine), 0 to disable')
+    parser.add_argument('--heartbeat', default=defaults.heartbeat, metavar='HOST[:PORT]',
+                        help='Send UDP load reports to the controller at this address')
+    parser.add_argument('--heartbeat-interval', type=float, default=defaults.heartbeat_interval,
+                        help='Seconds between load reports')
+    parser.add_argument('--server-id', default=defaults.server_id,
+                        help='Id this server reports itself as (default: hostname)')
+    parser.add_argument('--access-log-every', type=int, default=defaults.access_log_every,
+                        help='Log one in every N successful responses')
+    parser.add_argument('--drain-timeout', type=float, default=defaults.drain_timeout,
+                        help='Seconds a drain (SIGUSR1 or POST /_drain) waits for connections before exiting')
+    parser.add_argument('--live-window', type=float, default=defaults.live_window,
+                        help='Seconds of simulated-live DASH kept available under /live/, 0 to disable')
+    parser.add_argument('--live-chunk', type=float, default=defaults.live_chunk,
+                        help='Seconds of media per partial chunk of a live segment, 0 to send whole segments')
+    parser.add_argument('--live-start', type=float, default=defaults.live_start,
+                        help='Unix time the live timeline starts at (default: midnight UTC today)')
+    parser.add_argument('--keepalive-timeout', type=float, default=defaults.keepalive_timeout,
+                        help='Seconds an idle persistent connection waits for its next request')
+    parser.add_argument('--max-keepalive-requests', type=int, default=defaults.max_keepalive_requests,
+                        help='Requests served on one connection before it is closed')
+    for content_class in CONTENT_CLASSES:
+        parser.add_argument(f'--cache-control-{content_class}',
+                            default=getattr(defaults, f'cache_control_{content_class}'),
+                            help=f'Cache-Control sent with {content_class} responses (empty to omit)')
+    args = parser.parse_args()
+    run_server(**vars(args))
+
 if __name__ == '__main__':
-    run_server() 
\ No newline at end of file
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+# Bytes read per step; waiters are woken after each one
+LOAD_CHUNK = 256 * 1024
+# Threads reading files for flights
+LOADERS = 8
+
+class Flight:
+    """One file being read into memory, readable while it fills.
+
+    The buffer is allocated at its final size up front, so memoryviews of
+    the part already read stay valid while the rest is loaded.
+    """
+    def __init__(self, size: int):
+        self.buffer = bytearray(size)
+        self.filled = 0
+        self.error: Optional[BaseException] = None
+        self.done = size == 0
+        self._cond = threading.Condition()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    @property
+    def size(self) -> int:
+        return len(self.buffer)
+
+    def wait(self, offset: int) -> int:
+        """Block until more than offset bytes are loaded; returns the bytes loaded."""
+        with self._cond:
+            while self.filled <= offset and not self.done:
+                self._cond.wait()
+            return self._progress()
+
+    async def wait_async(self, offset: int) -> int:
+        """wait() for coroutines: suspends instead of blocking the event loop."""
+        while True:
+            loop = asyncio.get_running_loop()
+            with self._cond:
+                if self.filled > offset or self.done:
+                    return self._progress()
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+
+    def _progress(self) -> int:
+        if self.error is not None:
+            raise self.error
+        return self.filled
+
+    def result(self) -> memoryview:
+        """The whole file, once loaded."""
+        self.wait(self.size - 1)
+        return memoryview(self.buffer)
+
+    def chunks(self, offset: int, length: int) -> Iterator[memoryview]:
+        """The bytes of [offset, offset + length), yielded as they are loaded."""
+        end = offset + length
+        view = memoryview(self.buffer)
+        while offset < end:
+            available = min(self.wait(offset), end)
+            yield view[offset:available]
+            offset = available
+
+    async def chunks_async(self, offset: int, length: int) -> AsyncIterator[memoryview]:
+        end = offset + length
+        view = memoryview(self.buffer)
+        while offset < end:
+            available = min(await self.wait_async(offset), end)
+            yield view[offset:available]
+            offset = available
+
+    def advance(self, filled: int):
+        with self._cond:
+            self.filled = filled
+            self.done = filled >= self.size
+            self._wake()
+
+    def fail(self, error: BaseException):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._wake()
+
+    def _wake(self):
+        self._cond.notify_all()
+        for loop, future in self._async_waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        self._async_waiters.clear()
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+class SingleFlight:
+    """Coalesce concurrent loads of the same file into one read.
+
+    The first request for a key starts a Flight that a loader thread fills
+    chunk by chunk; requests arriving while it is in flight join it, and
+    every one of them streams bytes as soon as they are read rather than
+    waiting for the whole file or reading it again.
+    """
+    def __init__(self, max_object_bytes: int, chunk_size: int = LOAD_CHUNK, loaders: int = LOADERS):
+        self.max_object_bytes = max_object_bytes
+        self.chunk_size = chunk_size
+        self.loaders = loaders
+        self._flights: Dict[Hashable, Flight] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.loads = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    def coalescable(self, size: int) -> bool:
+        return 0 < size <= self.max_object_bytes
+
+    def join(self, key: Hashable, path: str, size: int,
+             on_complete: Optional[Callable[[bytearray], None]] = None) -> Flight:
+        """The flight loading key, starting one if none is in progress.
+
+        on_complete receives the buffer of a flight this call started once
+        it is fully loaded.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight
+            flight = self._flights[key] = Flight(size)
+            self.loads += 1
+            if self._executor is None:
+                # Started lazily so forked workers each get their own threads
+                self._executor = ThreadPoolExecutor(self.loaders, thread_name_prefix='single-flight')
+        self._executor.submit(self._load, key, flight, path, on_complete)
+        return flight
+
+    def _load(self, key: Hashable, flight: Flight, path: str,
+              on_complete: Optional[Callable[[bytearray], None]]):
+        try:
+            view = memoryview(flight.buffer)
+            filled = 0
+            with open(path, 'rb', buffering=0) as f:
+                while filled < flight.size:
+                    n = f.readinto(view[filled:filled + self.chunk_size])
+                    if not n:
+                        raise EOFError(f"{path} is shorter than {flight.size} bytes")
+                    filled += n
+                    flight.advance(filled)
+        except Exception as e:
+            self.failures += 1
+            flight.fail(e)
+        try:
+            if flight.error is None and on_complete is not None:
+                on_complete(flight.buffer)
+        finally:
+            # Retired only once stored, so a request arriving in between finds one or the other
+            with self._lock:
+                del self._flights[key]
+
+    def stats(self) -> Dict:
+        requests = self.loads + self.coalesced
+        return {
+            'max_object_bytes': self.max_object_bytes,
+            'in_flight': len(self._flights),
+            'loads': self.loads,
+            'coalesced': self.coalesced,
+            'failures': self.failures,
+            'coalesced_ratio': self.coalesced / requests if requests else 0.0,
+        }
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import threading
+from typing import Dict, Iterator, Tuple
+
+# Largest write between throughput checks
+GUARD_CHUNK = 256 * 1024
+REASONS = ('write_timeout', 'min_rate')
+
+class SlowClientError(Exception):
+    """The client is not reading fast enough and is being disconnected."""
+    def __init__(self, reason: str, detail: str = ''):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+
+class SlowClientPolicy:
+    """When to give up on a client that is not reading its response.
+
+    write_timeout bounds how long one write may make no progress.
+    min_rate (bytes/sec, 0 disables) is checked every time a connection
+    has spent window seconds blocked in writes: if the bytes it accepted
+    over that time came in slower than min_rate, it is evicted. Only time
+    spent blocked counts, so idle keep-alive gaps and pacing delays never
+    look like a slow client.
+    """
+    def __init__(self, write_timeout: float = 30.0, min_rate: int = 0, window: float = 10.0):
+        self._lock = threading.Lock()
+        self.write_timeout = write_timeout
+        self.min_rate = min_rate
+        self.window = window
+        self.evictions = dict.fromkeys(REASONS, 0)
+        self.held_seconds = 0.0
+
+    def evicted(self, reason: str, held: float):
+        """Count an eviction and how long the connection had been open."""
+        with self._lock:
+            self.evictions[reason] += 1
+            self.held_seconds += held
+
+    def stats(self) -> Dict:
+        evicted = sum(self.evictions.values())
+        return {
+            'write_timeout': self.write_timeout,
+            'min_rate': self.min_rate,
+            'window': self.window,
+            'evictions': dict(self.evictions),
+            'held_seconds': round(self.held_seconds, 3),
+            'mean_held_seconds': round(self.held_seconds / evicted, 3) if evicted else 0.0,
+        }
+
+class ThroughputGuard:
+    """Enforces a policy's min_rate on one connection."""
+    def __init__(self, policy: SlowClientPolicy):
+        self.policy = policy
+        self.bytes = 0
+        self.blocked = 0.0
+
+    def sent(self, n: int, elapsed: float):
+        """Record a write of n bytes that took elapsed seconds.
+
+        Raises SlowClientError once a full window of blocked time shows a
+        rate below the minimum.
+        """
+        self.bytes += n
+        self.blocked += elapsed
+        if self.blocked < self.policy.window:
+            return
+        rate = self.bytes / self.blocked
+        self.bytes = 0
+        self.blocked = 0.0
+        if rate < self.policy.min_rate:
+            raise SlowClientError('min_rate', f"{rate:.0f} B/s over {self.policy.window:g}s")
+
+def guarded_slices(offset: int, length: int) -> Iterator[Tuple[int, int]]:
+    """Split [offset, offset + length) into writes small enough to check between."""
+    end = offset + length
+    while offset < end:
+        n = min(GUARD_CHUNK, end - offset)
+        yield offset, n
+        offset += n
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import socket
+import stat
+from typing import BinaryIO, Optional
+
+# Buffer size for the copy loop used when the kernel can't send the file for us
+COPY_BUFFER_SIZE = 256 * 1024
+
+def is_regular_file(f: BinaryIO) -> bool:
+    """Check whether f is backed by a regular file that os.sendfile can read."""
+    try:
+        return stat.S_ISREG(os.fstat(f.fileno()).st_mode)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+
+def send_file(sock: socket.socket, f: BinaryIO, offset: int = 0, count: Optional[int] = None) -> int:
+    """Send count bytes of f starting at offset to sock and return bytes sent.
+
+    Regular files are handed to the kernel with sendfile(2) so the payload
+    never enters Python. Anything else (pipes, sockets, in-memory files) goes
+    through copy_file.
+    """
+    if hasattr(os, 'sendfile') and is_regular_file(f):
+        return sock.sendfile(f, offset, count)
+    return copy_file(sock, f, offset, count)
+
+def copy_file(sock: socket.socket, f: BinaryIO, offset: int = 0, count: Optional[int] = None,
+              buffer_size: int = COPY_BUFFER_SIZE) -> int:
+    """Copy f to sock through one reusable buffer and return bytes sent."""
+    if offset:
+        f.seek(offset)
+    buf = memoryview(bytearray(buffer_size))
+    sent = 0
+    while count is None or sent < count:
+        want = buffer_size if count is None else min(buffer_size, count - sent)
+        n = f.readinto(buf[:want])
+        if not n:
+            break
+        sock.sendall(buf[:n])
+        sent += n
+    return sent
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+# What an indexed file is, for picking its Cache-Control policy
+CONTENT_CLASSES = ('video', 'mpd', 'init', 'media')
+
+DEFAULT_CACHE_CONTROL = {
+    'video': 'public, max-age=3600',
+    # Static MPDs rarely change, but players should still notice when they do
+    'mpd': 'public, max-age=60',
+    # Segments are named by representation and number, so their bytes never change
+    'init': 'public, max-age=86400, immutable',
+    'media': 'public, max-age=86400, immutable',
+}
+
+# Responses that carry the file's Cache-Control; errors such as 416 do not
+CACHEABLE_STATUSES = frozenset({200, 206, 304})
+
+class CachePolicy:
+    """Cache-Control header value per content class."""
+    def __init__(self, **overrides: Optional[str]):
+        self.policies: Dict[str, str] = dict(DEFAULT_CACHE_CONTROL)
+        for content_class, value in overrides.items():
+            if content_class not in CONTENT_CLASSES:
+                raise ValueError(f"Unknown content class: {content_class}")
+            if value is not None:
+                self.policies[content_class] = value
+
+    def header(self, content_class: str) -> Optional[str]:
+        return self.policies.get(content_class) or None
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match list against our ETag."""
+    header = header.strip()
+    if header == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def not_modified(if_none_match: Optional[str], if_modified_since: Optional[str],
+                 etag: str, mtime_ns: int) -> bool:
+    """Whether a conditional GET can be answered with 304 Not Modified.
+
+    If-None-Match wins when present; If-Modified-Since is only consulted
+    without it, as RFC 9110 requires.
+    """
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since is None:
+            return False
+        # HTTP dates have one-second resolution
+        return mtime_ns // 1_000_000_000 <= int(since.timestamp())
+    return False
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root))
+
+from controller.load_balancer import LoadBalancer, LoadBalancingAlgorithm, Server
+
+ALGORITHMS = (
+    LoadBalancingAlgorithm.WEIGHTED_ROUND_ROBIN,
+    LoadBalancingAlgorithm.BANDWIDTH_AWARE,
+    LoadBalancingAlgorithm.REQUEST_DEMAND,
+)
+
+class LegacyLoadBalancer(LoadBalancer):
+    """The original full sort / scan on every decision, kept here as the baseline."""
+    def get_next_server(self) -> Server:
+        servers = [s for s in self.servers if not s.draining] or self.servers
+        if self.algorithm == LoadBalancingAlgorithm.WEIGHTED_ROUND_ROBIN:
+            return sorted(servers, key=lambda x: (x.current_connections / x.weight))[0]
+        elif self.algorithm == LoadBalancingAlgorithm.BANDWIDTH_AWARE:
+            return min(servers, key=lambda x: x.bandwidth_usage)
+        elif self.algorithm == LoadBalancingAlgorithm.REQUEST_DEMAND:
+            return min(servers, key=lambda x: (x.current_connections, x.response_time))
+        return super().get_next_server()
+
+def build(lb_class, algorithm: LoadBalancingAlgorithm, servers: int) -> LoadBalancer:
+    lb = lb_class(algorithm=algorithm)
+    rng = random.Random(servers)
+    for i in range(servers):
+        lb.add_server(Server(id=f'server{i}', ip=f'10.{i // 65536}.{i // 256 % 256}.{i % 256}',
+                             weight=rng.randint(1, 4)))
+    return lb
+
+def run_case(lb: LoadBalancer, decisions: int) -> float:
+    """Microseconds per packet-in: pick a server, then account the new flow on it."""
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(decisions):
+        server = lb.get_next_server()
+        # What update_server_stats changes, without its lookup by id
+        server.current_connections += 1
+        server.bandwidth_usage += rng.random()
+        server.response_time = rng.random() * 100
+    return (time.perf_counter() - start) / decisions * 1e6
+
+def hash_report(size: int, keys: int):
+    """Keys moved by adding a weight-1 server (and the share it should take),
+    and the worst load relative to the mean."""
+    lb = build(LoadBalancer, LoadBalancingAlgorithm.CONSISTENT_HASH, size)
+    clients = [f'10.1.{i // 256 % 256}.{i % 256}#{i}' for i in range(keys)]
+    before = [lb.get_next_server(k).id for k in clients]
+    lb.add_server(Server(id=f'server{size}', ip='10.255.255.255'))
+    moved = sum(lb.get_next_server(k).id != b for k, b in zip(clients, before)) / keys
+    ideal = 1 / sum(s.weight for s in lb.servers)
+
+    lb = build(LoadBalancer, LoadBalancingAlgorithm.CONSISTENT_HASH, size)
+    for k in clients:
+        lb.get_next_server(k).current_connections += 1
+    loads = [s.current_connections for s in lb.servers]
+    return moved, ideal, max(loads) / (sum(loads) / len(loads))
+
+def main():
+    parser = argparse.ArgumentParser(description='Server selection benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help='Pool sizes to measure')
+    parser.add_argument('--decisions', type=int, default=2000, help='Selections per case')
+    parser.add_argument('--hash-keys', type=int, default=20000, help='Client keys for the consistent-hash report')
+    args = parser.parse_args()
+
+    print(f"\n{'algorithm':<24}{'servers':>9}{'legacy us':>12}{'heap us':>10}{'speedup':>10}")
+    for algorithm in ALGORITHMS:
+        for size in args.sizes:
+            legacy = run_case(build(LegacyLoadBalancer, algorithm, size), args.decisions)
+            heap = run_case(build(LoadBalancer, algorithm, size), args.decisions)
+            print(f"{algorithm.value:<24}{size:>9}{legacy:>12.1f}{heap:>10.1f}{legacy / heap:>9.1f}x")
+
+    print(f"\n{'consistent hash':<24}{'servers':>9}{'moved on add':>14}{'ideal':>8}{'max/mean load':>15}")
+    for size in args.sizes:
+        if size > 1000:
+            continue
+        moved, ideal, peak = hash_report(size, args.hash_keys)
+        print(f"{'':<24}{size:>9}{moved:>14.3f}{ideal:>8.3f}{peak:>15.2f}")
+
+if __name__ == '__main__':
+    main()
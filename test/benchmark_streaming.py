@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import argparse
+import http.client
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from catalog import VideoCatalog
+from origin import Origin
+from server import ServerConfig, VideoStreamingHandler
+
+class LegacyStreamingHandler(VideoStreamingHandler):
+    """The original 8KB read/write loop, kept here as the baseline."""
+    def _stream_video(self, filename: str):
+        file_size = self.server.origin.video(filename).size
+        self.send_response(200)
+        self.send_header('Content-type', 'video/mp4')
+        self.send_header('Content-Length', str(file_size))
+        self.end_headers()
+        with open(filename, 'rb') as f:
+            while True:
+                chunk = f.read(8192)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+
+def timed(handler_class):
+    """Wrap a handler so the CPU time of each serving thread is recorded."""
+    cpu = {'seconds': 0.0}
+    lock = threading.Lock()
+
+    class TimedHandler(handler_class):
+        def handle(self):
+            start = time.thread_time()
+            try:
+                super().handle()
+            finally:
+                with lock:
+                    cpu['seconds'] += time.thread_time() - start
+
+        def log_message(self, format, *args):
+            pass
+
+    return TimedHandler, cpu
+
+def run_case(name: str, handler_class, video: str, size: int, rounds: int) -> dict:
+    handler, cpu = timed(handler_class)
+    httpd = socketserver.ThreadingTCPServer(('127.0.0.1', 0), handler)
+    httpd.daemon_threads = True
+    # No segment cache, so every round measures the disk path
+    httpd.config = ServerConfig()
+    httpd.origin = Origin(VideoCatalog('.'))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    port = httpd.server_address[1]
+
+    buf = memoryview(bytearray(1024 * 1024))
+    received = 0
+    start = time.perf_counter()
+    try:
+        for _ in range(rounds):
+            conn = http.client.HTTPConnection('127.0.0.1', port)
+            conn.request('GET', f'/video/{video}')
+            response = conn.getresponse()
+            while True:
+                n = response.readinto(buf)
+                if not n:
+                    break
+                received += n
+            conn.close()
+    finally:
+        elapsed = time.perf_counter() - start
+        httpd.shutdown()
+        httpd.server_close()
+
+    if received != size * rounds:
+        raise RuntimeError(f"{name}: received {received} bytes, expected {size * rounds}")
+    gigabytes = received / (1024 ** 3)
+    return {
+        'name': name,
+        'mb_per_s': received / (1024 * 1024) / elapsed,
+        'cpu_s_per_gb': cpu['seconds'] / gigabytes,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Loopback streaming benchmark')
+    parser.add_argument('--size-mb', type=int, default=256, help='Size of the test video in MB')
+    parser.add_argument('--rounds', type=int, default=4, help='Downloads per case')
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        video = 'bench.mp4'
+        with open(video, 'wb') as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                f.write(block)
+
+        results = [
+            run_case('read/write 8KB', LegacyStreamingHandler, video, size, args.rounds),
+            run_case('sendfile', VideoStreamingHandler, video, size, args.rounds),
+        ]
+
+    print(f"\n{'path':<16}{'MB/s':>12}{'server CPU s/GB':>18}")
+    for r in results:
+        print(f"{r['name']:<16}{r['mb_per_s']:>12.1f}{r['cpu_s_per_gb']:>18.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from byteranges import (MAX_RANGES, ByteRangeResponse, RangeNotSatisfiable,
+                        if_range_matches, parse_range_header)
+
+SIZE = 1000
+LAST_MODIFIED = 'Sat, 17 Oct 2026 00:00:00 GMT'
+ETAG = '"3e8-1760659200000000000"'
+
+def body_of(response: ByteRangeResponse, data: bytes) -> bytes:
+    """The bytes an engine writes for response's parts."""
+    out = b''
+    for prefix, offset, length in response.parts:
+        out += prefix + data[offset:offset + length]
+    return out + response.trailer
+
+def header(response: ByteRangeResponse, name: str) -> str:
+    return next(value for key, value in response.headers if key.lower() == name.lower())
+
+@pytest.mark.parametrize('spec, expected', [
+    ('bytes=0-99', [(0, 99)]),
+    ('bytes=900-', [(900, 999)]),
+    ('bytes=900-5000', [(900, 999)]),
+    ('bytes=-100', [(900, 999)]),
+    ('bytes=-5000', [(0, 999)]),
+    ('bytes=0-99,50-149,150-199,300-', [(0, 199), (300, 999)]),
+    ('bytes=500-599, 0-9', [(0, 9), (500, 599)]),
+    ('bytes=0-9,2000-', [(0, 9)]),
+])
+def test_parse_range_header(spec, expected):
+    assert parse_range_header(spec, SIZE) == expected
+
+@pytest.mark.parametrize('spec', [
+    None, '', 'bytes=', 'items=0-9', 'bytes=abc-', 'bytes=9-0', 'bytes=5',
+    'bytes=' + ','.join(f'{i * 10}-{i * 10 + 1}' for i in range(MAX_RANGES + 1)),
+])
+def test_parse_range_header_ignored(spec):
+    assert parse_range_header(spec, SIZE) is None
+
+def test_max_ranges_accepted():
+    spec = 'bytes=' + ','.join(f'{i * 10}-{i * 10 + 1}' for i in range(MAX_RANGES))
+    assert len(parse_range_header(spec, SIZE)) == MAX_RANGES
+
+@pytest.mark.parametrize('spec, size', [
+    ('bytes=1000-', SIZE),
+    ('bytes=-0', SIZE),
+    ('bytes=1000-1999,5000-', SIZE),
+    ('bytes=-10', 0),
+])
+def test_parse_range_header_not_satisfiable(spec, size):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(spec, size)
+
+def test_not_satisfiable_response():
+    response = ByteRangeResponse(SIZE, 'video/mp4', LAST_MODIFIED, 'bytes=1000-')
+    assert response.status == 416
+    assert header(response, 'Content-Range') == f'bytes */{SIZE}'
+    assert response.parts == []
+
+@pytest.mark.parametrize('if_range, expected', [
+    (None, True),
+    (ETAG, True),
+    (LAST_MODIFIED, True),
+    ('"other"', False),
+    ('W/' + ETAG, False),
+    ('Fri, 16 Oct 2026 00:00:00 GMT', False),
+])
+def test_if_range_matches(if_range, expected):
+    assert if_range_matches(if_range, LAST_MODIFIED, ETAG) is expected
+
+def test_if_range_etag_without_our_etag():
+    assert not if_range_matches(ETAG, LAST_MODIFIED, None)
+
+def test_if_range_mismatch_sends_whole_file():
+    response = ByteRangeResponse(SIZE, 'video/mp4', LAST_MODIFIED, 'bytes=0-9', '"other"', ETAG)
+    assert response.status == 200
+    assert response.parts == [(b'', 0, SIZE)]
+
+def test_single_range_response():
+    data = bytes(range(256)) * 4
+    response = ByteRangeResponse(SIZE, 'video/mp4', LAST_MODIFIED, 'bytes=-10', etag=ETAG)
+    assert response.status == 206
+    assert header(response, 'Content-Range') == f'bytes 990-999/{SIZE}'
+    assert body_of(response, data) == data[990:1000]
+    assert int(header(response, 'Content-Length')) == 10
+
+def test_multipart_content_length_matches_body():
+    data = bytes(range(256)) * 4
+    response = ByteRangeResponse(SIZE, 'video/mp4', LAST_MODIFIED, 'bytes=0-9,500-509,-5')
+    body = body_of(response, data)
+    assert response.status == 206
+    assert int(header(response, 'Content-Length')) == len(body)
+
+    boundary = header(response, 'Content-type').split('boundary=')[1]
+    parts = body.split(f'\r\n--{boundary}'.encode())
+    assert parts[0] == b'' and parts[-1] == b'--\r\n'
+    ranges = [(0, 9), (500, 509), (995, 999)]
+    for part, (start, end) in zip(parts[1:-1], ranges):
+        headers, _, payload = part.partition(b'\r\n\r\n')
+        assert f'Content-Range: bytes {start}-{end}/{SIZE}'.encode() in headers
+        assert payload == data[start:end + 1]
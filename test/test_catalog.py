@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from catalog import StaticTree, VideoCatalog
+
+@pytest.fixture
+def root(tmp_path) -> Path:
+    (tmp_path / 'a.mp4').write_bytes(b'a' * 100)
+    (tmp_path / 'b.mkv').write_bytes(b'b' * 10)
+    (tmp_path / 'notes.txt').write_text('not a video')
+    return tmp_path
+
+def test_indexes_videos_once(root):
+    catalog = VideoCatalog(str(root))
+    assert sorted(e.name for e in catalog) == ['a.mp4', 'b.mkv']
+    entry = catalog.get('a.mp4')
+    st = os.stat(root / 'a.mp4')
+    assert (entry.size, entry.mime_type, entry.content_class) == (100, 'video/mp4', 'video')
+    assert entry.etag == f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    assert catalog.get('b.mkv').mime_type == 'video/x-matroska'
+    assert 'notes.txt' not in catalog
+
+def test_unchanged_directory_is_not_listed(root, monkeypatch):
+    catalog = VideoCatalog(str(root))
+    version = catalog.version
+    def no_listdir(path):
+        raise AssertionError("listed an unchanged directory")
+    monkeypatch.setattr(os, 'listdir', no_listdir)
+    assert not catalog.refresh()
+    assert catalog.version == version
+
+def test_refresh_picks_up_changes(root):
+    catalog = VideoCatalog(str(root))
+    seen = []
+    catalog.listeners.append(lambda c: seen.append(c.version))
+    old, untouched = catalog.get('a.mp4'), catalog.get('b.mkv')
+
+    (root / 'a.mp4').write_bytes(b'a' * 200)
+    assert catalog.refresh()
+    assert catalog.get('a.mp4').size == 200
+    assert catalog.get('a.mp4').etag != old.etag
+    # Untouched entries are reused
+    assert catalog.get('b.mkv') is untouched
+
+    (root / 'c.avi').write_bytes(b'c')
+    (root / 'b.mkv').unlink()
+    assert catalog.refresh()
+    assert sorted(e.name for e in catalog) == ['a.mp4', 'c.avi']
+    assert seen == [catalog.version - 1, catalog.version]
+
+def test_entries_table_is_replaced_not_mutated(root):
+    catalog = VideoCatalog(str(root))
+    before = catalog.entries
+    (root / 'c.avi').write_bytes(b'c')
+    catalog.refresh()
+    assert 'c.avi' not in before and 'c.avi' in catalog.entries
+
+def test_static_tree(tmp_path):
+    (tmp_path / 'index.html').write_text('<html></html>')
+    (tmp_path / 'bbb').mkdir()
+    (tmp_path / 'bbb' / 'bbb.mpd').write_text('<MPD/>')
+    tree = StaticTree(str(tmp_path))
+    assert sorted(e.name for e in tree) == ['bbb/bbb.mpd', 'index.html']
+    assert tree.get('bbb/bbb.mpd').content_class == 'mpd'
+    assert tree.get('index.html').mime_type == 'text/html'
+    assert tree.get('../index.html') is None
+
+    (tmp_path / 'bbb' / 'seg_1.m4s').write_bytes(b'x')
+    assert tree.refresh()
+    assert tree.get('bbb/seg_1.m4s').mime_type == 'video/mp4'
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from dash import DEFAULT_DASH_ROOT, DashIndex, expand_template, parse_duration, template_pattern
+
+MEDIA = '$RepresentationID$/$RepresentationID$_$Number$.m4v'
+
+@pytest.mark.parametrize('template, kwargs, expected', [
+    (MEDIA, {'number': 7}, 'rep/rep_7.m4v'),
+    ('$RepresentationID$/seg-$Number%05d$.m4s', {'number': 42}, 'rep/seg-00042.m4s'),
+    ('$RepresentationID$/$Bandwidth$/$Time$.m4s', {'bandwidth': 500000, 'time': 9000}, 'rep/500000/9000.m4s'),
+    ('$RepresentationID%03d$/init.mp4', {}, 'rep/init.mp4'),
+    ('price$$/$RepresentationID$', {}, 'price$/rep'),
+])
+def test_expand_template(template, kwargs, expected):
+    assert expand_template(template, 'rep', **kwargs) == expected
+
+def test_expand_template_missing_value():
+    with pytest.raises(ValueError):
+        expand_template(MEDIA, 'rep')
+
+@pytest.mark.parametrize('template', [
+    MEDIA,
+    '$RepresentationID$/seg-$Number%05d$.m4s',
+    'v/$Bandwidth$/$Number$.m4s',
+])
+def test_template_pattern_round_trips(template):
+    pattern = template_pattern(template, 'rep', 500000)
+    for number in (1, 23, 159, 100000):
+        match = pattern.match(expand_template(template, 'rep', 500000, number=number))
+        assert match and int(match.group('number')) == number
+
+@pytest.mark.parametrize('name', [
+    'rep/rep_.m4v', 'rep/rep_1.m4s', 'other/other_1.m4v', 'rep/rep_1.m4v.bak', 'x/rep/rep_1.m4v',
+])
+def test_template_pattern_rejects(name):
+    assert template_pattern(MEDIA, 'rep').match(name) is None
+
+def test_template_pattern_escapes_literals():
+    pattern = template_pattern('$RepresentationID$.v1/$Number$.m4s', 'a+b')
+    assert pattern.match('a+b.v1/3.m4s')
+    assert not pattern.match('aab-v1/3.m4s')
+
+def test_parse_duration():
+    assert parse_duration('PT634.566S') == pytest.approx(634.566)
+    assert parse_duration('P1DT1H2M3S') == 86400 + 3723
+
+def test_index_of_repo_ladder():
+    dash = DashIndex(DEFAULT_DASH_ROOT)
+    rep = dash.representations['bbb_30fps_320x180_400k']
+    assert rep.segment_seconds == 4.0
+    assert dash.segment('bbb_30fps_320x180_400k/bbb_30fps_320x180_400k_0.m4v').number is None
+    assert dash.segment('bbb_30fps_320x180_400k/bbb_30fps_320x180_400k_12.m4v').number == 12
+    assert dash.get('bbb_30fps.mpd').content_class == 'mpd'
+    assert dash.get('../bbb_30fps.mpd') is None
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+import signal
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from drain import DRAIN_SIGNAL, DrainState, parse_drain_timeout
+
+@pytest.mark.parametrize('path, timeout', [
+    ('/_drain', 30.0),
+    ('/_drain?timeout=5', 5.0),
+    ('/_drain?timeout=0.5&x=1', 0.5),
+])
+def test_parse_drain_timeout(path, timeout):
+    assert parse_drain_timeout(path, 30.0) == timeout
+
+def test_bad_drain_timeout():
+    with pytest.raises(ValueError):
+        parse_drain_timeout('/_drain?timeout=soon', 30.0)
+
+def test_finishes_when_idle():
+    drain = DrainState()
+    assert not drain.finished(0)
+    assert drain.stats() == {'state': 'serving'}
+    assert drain.start(60)
+    assert not drain.start(1)
+    assert not drain.finished(2)
+    assert drain.finished(0)
+    stats = drain.stats()
+    assert stats['state'] == 'draining'
+    assert 59 <= stats['drain_remaining'] <= 60
+
+def test_finishes_at_the_deadline(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    drain = DrainState()
+    drain.start(5)
+    now[0] += 4.9
+    assert not drain.finished(3)
+    now[0] += 0.1
+    assert drain.finished(3)
+    assert drain.stats()['drain_remaining'] == 0.0
+
+def test_wait_returns_once_finished(monkeypatch):
+    monkeypatch.setattr('drain.DRAIN_POLL_INTERVAL', 0.01)
+    drain = DrainState()
+    drain.start(60)
+    active = iter([3, 2, 1, 0])
+    drain.wait(lambda: next(active))
+
+def _request_drain(drain: DrainState):
+    drain.request(5)
+
+def test_shared_drain_is_forwarded_and_uses_one_deadline():
+    forwarded = []
+    previous = signal.signal(DRAIN_SIGNAL, lambda signum, frame: forwarded.append(signum))
+    try:
+        drain = DrainState()
+        drain.share()
+        child = multiprocessing.get_context('fork').Process(target=_request_drain, args=(drain,))
+        started = time.monotonic()
+        child.start()
+        child.join(10)
+        assert child.exitcode == 0
+        deadline = time.monotonic() + 1
+        while not forwarded and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert forwarded == [DRAIN_SIGNAL]
+        # The parent's own drain, however long it asks for, ends with the child's
+        assert drain.start(60)
+        assert started + 5 <= drain.deadline <= time.monotonic() + 5
+    finally:
+        signal.signal(DRAIN_SIGNAL, previous)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import gzip
+import sys
+from pathlib import Path
+
+import pytest
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from encoding import (ENCODINGS, MIN_COMPRESS_SIZE, EncodedCache, compress_variants,
+                      negotiate, parse_accept_encoding)
+
+GZIP_ONLY = {'identity': b'', 'gzip': b''}
+ALL = {'identity': b'', 'gzip': b'', 'br': b''}
+
+@pytest.mark.parametrize('header, expected', [
+    (None, 'identity'),
+    ('', 'identity'),
+    ('gzip', 'gzip'),
+    ('GZIP', 'gzip'),
+    ('deflate, gzip;q=0.5', 'gzip'),
+    ('gzip;q=0', 'identity'),
+    ('gzip;q=bogus', 'identity'),
+    ('*', 'gzip'),
+    ('*;q=0.5, gzip;q=0', 'identity'),
+    ('identity', 'identity'),
+    ('br', 'identity'),
+])
+def test_negotiate_gzip_only(header, expected):
+    assert negotiate(header, GZIP_ONLY) == expected
+
+def test_negotiate_only_offers_available_variants():
+    assert negotiate('gzip', {'identity': b''}) == 'identity'
+
+@pytest.mark.skipif('br' not in ENCODINGS, reason='brotli is not installed')
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, br', 'br'),
+    ('gzip;q=1, br;q=0.8', 'gzip'),
+    ('*', 'br'),
+])
+def test_negotiate_brotli(header, expected):
+    assert negotiate(header, ALL) == expected
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding(' gzip ; q=0.3 ,br, ;') == {'gzip': 0.3, 'br': 1.0}
+
+def test_compress_variants():
+    small = b'x' * (MIN_COMPRESS_SIZE - 1)
+    assert compress_variants(small) == {'identity': small}
+    data = b'<MPD>' + b'<Representation/>' * 100 + b'</MPD>'
+    variants = compress_variants(data)
+    assert gzip.decompress(variants['gzip']) == data
+    # Stable bytes, so ETags derived from them are too
+    assert compress_variants(data)['gzip'] == variants['gzip']
+
+def test_encoded_cache_rebuilds_per_version():
+    cache = EncodedCache()
+    builds = []
+    def build():
+        builds.append(1)
+        return b'a' * 1000
+    cache.get('list', 1, build)
+    cache.get('list', 1, build)
+    cache.get('list', 2, build)
+    assert len(builds) == 2
+    assert cache.stats()['hits'] == 1
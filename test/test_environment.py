@@ -10,16 +10,10 @@ import os
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import requests
 from controller.load_balancer import LoadBalancer, Server, LoadBalancingAlgorithm
+from common.logging_setup import setup_logging
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('test_environment.log'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging('test_environment.log')
 
 def find_free_port(start_port: int) -> int:
     """Find a free port starting from start_port."""
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from catalog import VideoCatalog
+from fd_cache import FileHandleCache
+from origin import Origin
+
+@pytest.fixture
+def catalog(tmp_path) -> VideoCatalog:
+    for name in ('a.mp4', 'b.mp4', 'c.mp4'):
+        (tmp_path / name).write_bytes(name.encode() * 100)
+    return VideoCatalog(str(tmp_path))
+
+def test_handles_are_reused(catalog):
+    files = FileHandleCache(4)
+    entry = catalog.get('a.mp4')
+    with files.open(entry) as first:
+        pass
+    with files.open(entry) as second:
+        assert second is first
+        assert os.pread(second.fileno(), 5, 0) == b'a.mp4'
+    assert not first.closed
+    stats = files.stats()
+    assert (stats['hits'], stats['misses'], stats['open']) == (1, 1, 1)
+
+def test_evicted_handle_stays_open_while_retained(catalog):
+    files = FileHandleCache(1)
+    with files.open(catalog.get('a.mp4')) as a:
+        with files.open(catalog.get('b.mp4')) as b:
+            # a was evicted to make room for b, but a request is still sending from it
+            assert files.stats()['evictions'] == 1
+            assert not a.closed
+            assert os.pread(a.fileno(), 5, 0) == b'a.mp4'
+        assert not b.closed
+    assert a.closed
+    assert files.stats()['open'] == 1
+
+def test_shared_handle_closes_after_the_last_release(catalog):
+    files = FileHandleCache(1)
+    entry = catalog.get('a.mp4')
+    first = files.open(entry)
+    f = first.__enter__()
+    with files.open(entry) as same:
+        assert same is f
+        files.retain(set())
+        assert not f.closed
+    assert not f.closed
+    first.__exit__(None, None, None)
+    assert f.closed
+    assert files.stats()['invalidations'] == 1
+
+def test_rewritten_file_gets_a_new_handle(catalog, tmp_path):
+    files = FileHandleCache(4)
+    origin = Origin(catalog, files=files)
+    with origin.open_file(catalog.get('a.mp4')) as old:
+        (tmp_path / 'a.mp4').write_bytes(b'rewritten')
+        catalog.refresh()
+        # Still being sent from, so only retired
+        assert not old.closed
+        with origin.open_file(catalog.get('a.mp4')) as new:
+            assert new is not old
+            assert os.pread(new.fileno(), 9, 0) == b'rewritten'
+    assert old.closed
+    assert files.stats()['invalidations'] == 1
+
+def test_concurrent_borrowers(catalog):
+    files = FileHandleCache(2)
+    entries = list(catalog)
+    errors = []
+    def borrow(i):
+        try:
+            for n in range(300):
+                entry = entries[(i + n) % len(entries)]
+                with files.open(entry) as f:
+                    assert os.pread(f.fileno(), 5, 0) == entry.name.encode()
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=borrow, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert files.stats()['open'] <= 2
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import struct
+import sys
+from pathlib import Path
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from dash import DEFAULT_DASH_ROOT, DashIndex
+from live import LiveChannel, boxes, fragment_offsets, retime_segment
+
+REP = 'bbb_30fps_320x180_400k'
+
+def read(name: str) -> bytes:
+    return (Path(DEFAULT_DASH_ROOT) / REP / name).read_bytes()
+
+def layout(data) -> dict:
+    """Decode times and where the first trun's samples start, for one-fragment segments."""
+    info = {}
+    for pos, header, size, box in boxes(data):
+        info[box] = pos
+        if box == b'sidx':
+            info['ept'] = struct.unpack_from('>Q' if data[pos + header] else '>I', data, pos + header + 12)[0]
+        if box != b'moof':
+            continue
+        for traf, traf_header, traf_size, _ in boxes(data, pos + header, pos + size):
+            for child, child_header, _, child_box in boxes(data, traf + traf_header, traf + traf_size):
+                body = child + child_header
+                if child_box == b'tfdt':
+                    info['tfdt'] = struct.unpack_from('>Q' if data[body] else '>I', data, body + 4)[0]
+                    info['tfdt_version'] = data[body]
+                elif child_box == b'trun':
+                    info['samples'] = pos + struct.unpack_from('>i', data, body + 8)[0]
+    return info
+
+def test_retime_in_place():
+    segment = read(f'{REP}_23.m4v')
+    retimed = retime_segment(segment, 3 * 159 * 120, 30, {1: 30})
+    before, after = layout(segment), layout(retimed)
+    assert len(retimed) == len(segment)
+    assert after['tfdt'] == before['tfdt'] + 3 * 159 * 120
+    assert after['ept'] == before['ept'] + 3 * 159 * 120
+    assert retimed[after[b'mdat']:] == segment[before[b'mdat']:]
+
+def test_retime_scales_to_track_timescale():
+    segment = read(f'{REP}_23.m4v')
+    after = layout(retime_segment(segment, 120, 30, {1: 90000}))
+    assert after['tfdt'] == layout(segment)['tfdt'] + 4 * 90000
+
+def test_retime_widens_tfdt():
+    segment = read(f'{REP}_23.m4v')
+    shift = 20 * 3600 * 30
+    retimed = retime_segment(segment, shift, 30, {1: 90000})
+    before, after = layout(segment), layout(retimed)
+    assert after['tfdt_version'] == 1
+    assert after['tfdt'] == before['tfdt'] + 20 * 3600 * 90000
+    assert len(retimed) == len(segment) + 4
+    # The sidx sizes are stale now, so it is hidden
+    assert b'sidx' not in after and b'free' in after
+    assert after['samples'] == after[b'mdat'] + 8
+    assert retimed[after['samples']:] == segment[before['samples']:]
+    assert fragment_offsets(retimed) == [after[b'moof']]
+
+def test_live_segment_plays_at_its_place():
+    channel = LiveChannel(DashIndex(DEFAULT_DASH_ROOT), start_time=0.0, chunk_duration=0)
+    number = 2 * 159 + 23
+    segment = channel.segment(f'{REP}/{REP}_{number}.m4v', now=(number + 1) * 4.0)
+    assert segment.entry.name.endswith(f'{REP}_23.m4v')
+    body = channel.media(segment, memoryview(read(f'{REP}_23.m4v')))
+    assert layout(body)['tfdt'] / 30 == (number - 1) * 4
+
+def test_first_loop_is_not_copied():
+    channel = LiveChannel(DashIndex(DEFAULT_DASH_ROOT), start_time=0.0)
+    segment = channel.segment(f'{REP}/{REP}_23.m4v', now=24 * 4.0)
+    body = memoryview(read(f'{REP}_23.m4v'))
+    assert channel.media(segment, body) is body
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import json
+import socket
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root))
+# servers/ is a script directory, not a package
+sys.path.insert(0, str(project_root / 'servers'))
+
+from controller.load_balancer import LoadBalancer, Server
+from controller.load_reports import LoadReportReceiver
+from load import Heartbeat, LoadMonitor, RateWindow, parse_address, percentile
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(time, 'monotonic', clock)
+    return clock
+
+def test_rate_windows(clock):
+    window = RateWindow(span=10)
+    window.add(1000)
+    clock.now += 1
+    window.add(500)
+    window.add(500)
+    assert window.rate(1) == 1000
+    assert window.rate(2) == 1000
+    assert window.rate(10) == 200
+    # Buckets older than the span are dropped
+    clock.now += 10
+    window.add(10)
+    assert window.rate(10) == 1
+    assert len(window._buckets) == 1
+
+def test_percentile():
+    assert percentile([], 0.9) == 0.0
+    ordered = list(range(100))
+    assert (percentile(ordered, 0.5), percentile(ordered, 0.99), percentile(ordered, 1.0)) == (50, 99, 99)
+
+def test_load_snapshot(clock):
+    monitor = LoadMonitor()
+    monitor.sent(60_000)
+    for seconds in (0.010, 0.020, 0.030, 0.040):
+        monitor.first_byte(seconds)
+    snapshot = monitor.snapshot()
+    assert snapshot['bytes_per_sec'] == {'1s': 60_000, '10s': 6_000, '60s': 1_000}
+    assert snapshot['ttfb_ms'] == {'p50': 30.0, 'p90': 40.0, 'p99': 40.0}
+
+@pytest.mark.parametrize('value, address', [
+    ('10.0.0.100', ('10.0.0.100', 9999)),
+    ('10.0.0.100:7000', ('10.0.0.100', 7000)),
+    ('controller', ('controller', 9999)),
+])
+def test_parse_address(value, address):
+    assert parse_address(value) == address
+
+def test_heartbeat_sends_tagged_reports():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        sock.settimeout(5)
+        heartbeat = Heartbeat(lambda: {'active_connections': 3}, sock.getsockname(), interval=0.05,
+                              server_id='server1')
+        heartbeat.start()
+        try:
+            report = json.loads(sock.recv(65535))
+        finally:
+            heartbeat.stop()
+    assert report['id'] == 'server1'
+    assert report['active_connections'] == 3
+    assert isinstance(report['pid'], int)
+
+def report(pid: int, connections: int, bytes_10s: int, p90: float, **extra) -> bytes:
+    return json.dumps({'id': 'server1', 'pid': pid, 'active_connections': connections,
+                       'bytes_per_sec': {'10s': bytes_10s}, 'ttfb_ms': {'p90': p90},
+                       'cache_hit_rate': 0.5, 'state': 'serving', **extra}).encode()
+
+@pytest.fixture
+def receiver() -> LoadReportReceiver:
+    lb = LoadBalancer()
+    lb.add_server(Server(id='server1', ip='10.0.0.3'))
+    lb.add_server(Server(id='server2', ip='10.0.0.4'))
+    return LoadReportReceiver(lb, stale_after=5.0)
+
+def test_reports_are_summed_across_processes(receiver, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    receiver.handle(report(1, 2, 1024 * 1024, 10.0), '10.0.0.3')
+    receiver.handle(report(2, 3, 2 * 1024 * 1024, 30.0), '10.0.0.3')
+    server = receiver.lb.find_server('server1')
+    assert (server.current_connections, server.bandwidth_usage, server.response_time) == (5, 3.0, 30.0)
+
+    # Process 1 stops reporting and is left out once stale
+    now[0] += 6
+    receiver.handle(report(2, 1, 1024 * 1024, 20.0), '10.0.0.3')
+    assert (server.current_connections, server.bandwidth_usage, server.response_time) == (1, 1.0, 20.0)
+    assert receiver.received == 3
+
+def test_draining_report(receiver):
+    receiver.handle(report(1, 0, 0, 0.0, state='draining'), '10.0.0.3')
+    assert receiver.lb.find_server('server1').draining
+    receiver.handle(report(1, 0, 0, 0.0), '10.0.0.3')
+    assert not receiver.lb.find_server('server1').draining
+
+def test_reports_matched_by_ip_or_rejected(receiver):
+    receiver.handle(json.dumps({'id': 'unknown', 'active_connections': 4}).encode(), '10.0.0.4')
+    assert receiver.lb.find_server('server2').current_connections == 4
+    receiver.handle(json.dumps({'id': 'unknown'}).encode(), '10.9.9.9')
+    receiver.handle(b'not json', '10.0.0.3')
+    receiver.handle(b'[1, 2]', '10.0.0.3')
+    assert (receiver.received, receiver.rejected) == (1, 3)
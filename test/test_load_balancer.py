@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+import math
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root))
+
+from controller.load_balancer import (IndexedHeap, LoadBalancer, LoadBalancingAlgorithm, PeakEWMA, Server,
+                                      ServerRegistry, content_key)
+
+LEAST_LOADED = (
+    LoadBalancingAlgorithm.WEIGHTED_ROUND_ROBIN,
+    LoadBalancingAlgorithm.BANDWIDTH_AWARE,
+    LoadBalancingAlgorithm.REQUEST_DEMAND,
+)
+
+def make_pool(algorithm: LoadBalancingAlgorithm, weights) -> LoadBalancer:
+    lb = LoadBalancer(algorithm=algorithm)
+    for i, weight in enumerate(weights):
+        lb.add_server(Server(id=f'server{i}', ip=f'10.0.0.{i + 3}', weight=weight))
+    return lb
+
+def legacy_choice(lb: LoadBalancer) -> Server:
+    """The sort / scan the heap replaced."""
+    servers = [s for s in lb.servers if not s.draining] or lb.servers
+    if lb.algorithm == LoadBalancingAlgorithm.WEIGHTED_ROUND_ROBIN:
+        return sorted(servers, key=lambda x: (x.current_connections / x.weight))[0]
+    if lb.algorithm == LoadBalancingAlgorithm.BANDWIDTH_AWARE:
+        return min(servers, key=lambda x: x.bandwidth_usage)
+    return min(servers, key=lambda x: (x.current_connections, x.response_time))
+
+def test_indexed_heap_matches_min():
+    rng = random.Random(7)
+    heap = IndexedHeap()
+    priorities = {}
+    for _ in range(5000):
+        key = rng.randrange(50)
+        if rng.random() < 0.2:
+            heap.remove(key)
+            priorities.pop(key, None)
+        else:
+            priorities[key] = (rng.randrange(20), key)
+            heap.set(key, priorities[key])
+        assert len(heap) == len(priorities)
+        if priorities:
+            assert heap.peek() == min(priorities, key=priorities.get)
+
+@pytest.mark.parametrize('algorithm', LEAST_LOADED)
+def test_heap_selection_matches_legacy(algorithm):
+    rng = random.Random(algorithm.value)
+    lb = make_pool(algorithm, [rng.randint(1, 4) for _ in range(40)])
+    for _ in range(3000):
+        server = lb.get_next_server()
+        assert server is legacy_choice(lb)
+        # Change the chosen server and a random one, as flows and load reports do
+        server.current_connections += 1
+        server.bandwidth_usage += rng.random()
+        other = rng.choice(lb.servers)
+        other.current_connections = rng.randrange(10)
+        other.response_time = rng.choice([10.0, 20.0, 30.0])
+        if rng.random() < 0.05:
+            other.weight = rng.randint(1, 4)
+        if rng.random() < 0.05:
+            other.draining = not other.draining
+
+def test_every_server_draining_still_serves():
+    lb = make_pool(LoadBalancingAlgorithm.REQUEST_DEMAND, [1, 1, 1])
+    for server in lb.servers:
+        server.draining = True
+        server.current_connections = 2
+    lb.servers[1].current_connections = 1
+    assert lb.get_next_server() is lb.servers[1]
+
+@pytest.mark.parametrize('algorithm', LEAST_LOADED)
+def test_heap_skips_weight_zero(algorithm):
+    lb = make_pool(algorithm, [1, 1, 1])
+    lb.servers[0].current_connections = 5
+    lb.servers[2].bandwidth_usage = 5.0
+    lb.servers[1].weight = 0
+    assert lb.get_next_server() is not lb.servers[1]
+    lb.servers[0].weight = lb.servers[2].weight = 0
+    with pytest.raises(ValueError):
+        lb.get_next_server()
+
+def test_switching_algorithm_drops_the_heap():
+    lb = make_pool(LoadBalancingAlgorithm.WEIGHTED_ROUND_ROBIN, [1, 2, 1])
+    lb.get_next_server()
+    lb.algorithm = LoadBalancingAlgorithm.SMOOTH_WEIGHTED_ROUND_ROBIN
+    lb.servers[1].weight = 0
+    assert 'b' not in picks(lb, 10)
+    lb.algorithm = LoadBalancingAlgorithm.WEIGHTED_ROUND_ROBIN
+    lb.servers[0].current_connections = 3
+    assert lb.get_next_server() is lb.servers[2]
+
+def picks(lb: LoadBalancer, n: int) -> str:
+    return ''.join('abcdefgh'[int(lb.get_next_server().id[6:])] for _ in range(n))
+
+def test_smooth_weighted_sequence():
+    lb = make_pool(LoadBalancingAlgorithm.SMOOTH_WEIGHTED_ROUND_ROBIN, [5, 1, 1])
+    assert picks(lb, 14) == 'aabacaa' * 2
+
+def test_smooth_weighted_skips_weight_zero_and_draining():
+    lb = make_pool(LoadBalancingAlgorithm.SMOOTH_WEIGHTED_ROUND_ROBIN, [2, 0, 1, 1])
+    lb.servers[3].draining = True
+    assert sorted(picks(lb, 30)) == sorted('aac' * 10)
+
+def test_smooth_weighted_weight_change_takes_effect():
+    lb = make_pool(LoadBalancingAlgorithm.SMOOTH_WEIGHTED_ROUND_ROBIN, [1, 1])
+    picks(lb, 3)
+    lb.servers[1].weight = 3
+    chosen = picks(lb, 400)
+    assert chosen.count('b') == pytest.approx(300, abs=2)
+
+def test_smooth_weighted_needs_a_positive_weight():
+    lb = make_pool(LoadBalancingAlgorithm.SMOOTH_WEIGHTED_ROUND_ROBIN, [0, 0])
+    with pytest.raises(ValueError):
+        lb.get_next_server()
+
+@pytest.mark.parametrize('algorithm', [LoadBalancingAlgorithm.P2C_LEAST_LOADED, LoadBalancingAlgorithm.PEAK_EWMA])
+@pytest.mark.parametrize('weights', [[1, 0], [0, 2, 0, 1, 0, 0, 0, 0, 0, 0]])
+def test_two_choices_skip_weight_zero(algorithm, weights):
+    lb = make_pool(algorithm, weights)
+    for _ in range(200):
+        assert lb.get_next_server().weight > 0
+
+@pytest.mark.parametrize('algorithm', [LoadBalancingAlgorithm.P2C_LEAST_LOADED, LoadBalancingAlgorithm.PEAK_EWMA])
+def test_two_choices_need_a_positive_weight(algorithm):
+    lb = make_pool(algorithm, [0, 0, 0])
+    with pytest.raises(ValueError):
+        lb.get_next_server()
+
+def test_peak_ewma_does_not_flood_an_unsampled_server():
+    lb = make_pool(LoadBalancingAlgorithm.PEAK_EWMA, [1, 1])
+    lb.servers[0].response_time = 10.0
+    # An idle origin reports 0 ms, which is not a sample either
+    lb.servers[1].response_time = 0.0
+    assert all(lb.get_next_server() is lb.servers[0] for _ in range(20))
+    lb.servers[0].current_connections = 3
+    assert all(lb.get_next_server() is lb.servers[1] for _ in range(20))
+
+def test_peak_ewma_estimate():
+    latency = PeakEWMA(decay=10.0, default=30.0)
+    assert latency.get(now=latency.stamp + 1000) == 30.0
+    # The first sample replaces the default, even below it
+    latency.observe(20.0, now=0.0)
+    assert latency.get(now=0.0) == 20.0
+    latency.observe(50.0, now=0.0)
+    assert latency.get(now=0.0) == 50.0
+    assert latency.get(now=10.0) == pytest.approx(50.0 / math.e)
+    latency.observe(100.0, now=10.0)
+    assert latency.get(now=10.0) == 100.0
+
+def test_p2c_prefers_the_less_loaded():
+    lb = make_pool(LoadBalancingAlgorithm.P2C_LEAST_LOADED, [1, 1])
+    lb.servers[0].current_connections = 5
+    assert all(lb.get_next_server() is lb.servers[1] for _ in range(20))
+
+def client_keys(n: int):
+    return [f'10.1.{i // 256 % 256}.{i % 256}#{i}' for i in range(n)]
+
+@pytest.mark.parametrize('servers', [10, 30])
+def test_adding_a_server_moves_about_its_share(servers):
+    lb = make_pool(LoadBalancingAlgorithm.CONSISTENT_HASH, [1] * servers)
+    keys = client_keys(20000)
+    before = [lb.get_next_server(key) for key in keys]
+    lb.add_server(Server(id='new', ip='10.0.1.1', weight=1))
+    after = [lb.get_next_server(key) for key in keys]
+    moved = [b for a, b in zip(before, after) if a is not b]
+    # Only keys the new server takes move, about 1 / (servers + 1) of them
+    assert all(server.id == 'new' for server in moved)
+    assert len(moved) / len(keys) == pytest.approx(1 / (servers + 1), rel=0.5)
+
+def test_keys_follow_weight():
+    lb = make_pool(LoadBalancingAlgorithm.CONSISTENT_HASH, [1, 3])
+    chosen = [lb.get_next_server(key) for key in client_keys(20000)]
+    assert chosen.count(lb.servers[1]) / len(chosen) == pytest.approx(0.75, abs=0.1)
+
+def test_bounded_load_cap():
+    lb = LoadBalancer(algorithm=LoadBalancingAlgorithm.CONSISTENT_HASH, load_epsilon=0.25)
+    for i in range(8):
+        lb.add_server(Server(id=f'server{i}', ip=f'10.0.0.{i + 3}'))
+    # One hot key plus a spread, each assignment staying connected
+    keys = ['dash/hot'] * 400 + client_keys(400)
+    for key in keys:
+        lb.get_next_server(key).current_connections += 1
+    cap = math.ceil(1.25 * len(keys) / len(lb.servers))
+    assert max(s.current_connections for s in lb.servers) <= cap
+
+def test_bounded_load_follows_weight():
+    lb = make_pool(LoadBalancingAlgorithm.CONSISTENT_HASH, [1, 3, 0])
+    keys = client_keys(4000)
+    for key in keys:
+        lb.get_next_server(key).current_connections += 1
+    light, heavy, unweighted = lb.servers
+    assert unweighted.current_connections == 0
+    assert heavy.current_connections / len(keys) == pytest.approx(0.75, abs=0.05)
+    # The weight-0 server does not count toward the share of the others
+    assert heavy.current_connections <= math.ceil(1.25 * len(keys) * 3 / 4)
+
+def test_draining_server_hands_off_its_keys():
+    lb = make_pool(LoadBalancingAlgorithm.CONSISTENT_HASH, [1] * 5)
+    keys = client_keys(2000)
+    before = [lb.get_next_server(key) for key in keys]
+    lb.servers[2].draining = True
+    after = [lb.get_next_server(key) for key in keys]
+    assert lb.servers[2] not in after
+    assert all(a is b for a, b in zip(before, after) if a is not lb.servers[2])
+
+@pytest.mark.parametrize('path, key', [
+    ('/dash/bbb_30fps_320x180_400k/bbb_30fps_320x180_400k_1.m4v', 'dash/bbb_30fps_320x180_400k'),
+    ('/live/bbb_30fps_320x180_400k/bbb_30fps_320x180_400k_9.m4v?t=1', 'live/bbb_30fps_320x180_400k'),
+    ('/dash/bbb_30fps.mpd', 'dash/bbb_30fps.mpd'),
+    ('/video/a.mp4', 'video/a.mp4'),
+])
+def test_content_key(path, key):
+    assert content_key(path) == key
+
+def test_registry_lookups():
+    registry = ServerRegistry()
+    assert registry.add(Server(id='a', ip='10.0.0.3')) == 0
+    assert registry.add(Server(id='b', ip='10.0.0.4')) == 1
+    # A second server on one IP is still found by id; by IP the first keeps it
+    assert registry.add(Server(id='c', ip='10.0.0.3')) == 2
+    assert len(registry) == 3
+    assert (registry.index('b'), registry.index('missing')) == (1, None)
+    assert registry.by_id('c').ip == '10.0.0.3'
+    assert registry.by_ip('10.0.0.3').id == 'a'
+    assert registry.by_id('missing') is None and registry.by_ip('10.9.9.9') is None
+    with pytest.raises(ValueError):
+        registry.add(Server(id='a', ip='10.0.0.9'))
+    assert len(registry) == len(registry.stats) == 3
+
+def test_find_server_falls_back_to_ip():
+    lb = make_pool(LoadBalancingAlgorithm.ROUND_ROBIN, [1, 1])
+    assert lb.find_server('server1').id == 'server1'
+    assert lb.find_server('unknown', ip='10.0.0.3').id == 'server0'
+    assert lb.find_server(ip='10.0.0.4').id == 'server1'
+    assert lb.find_server('unknown') is None
+
+def test_server_stats():
+    lb = make_pool(LoadBalancingAlgorithm.ROUND_ROBIN, [1, 1])
+    lb.update_server_stats('server0', 2.0, 10.0, '720p')
+    lb.update_server_stats('server0', 4.0, 30.0, '720p')
+    lb.update_server_stats('server0', 1.0, 20.0)
+    lb.update_server_stats('unknown', 1.0, 20.0)
+    stats = lb.get_server_stats()
+    assert set(stats) == {'server0', 'server1'}
+    assert stats['server0']['requests_handled'] == 3
+    assert stats['server0']['total_bandwidth'] == 7.0
+    assert stats['server0']['average_response_time'] == pytest.approx(20.0)
+    assert stats['server0']['video_qualities']['720p'] == 2
+    assert sum(stats['server0']['video_qualities'].values()) == 2
+    assert stats['server1']['requests_handled'] == 0
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import logging
+import multiprocessing
+import queue
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root))
+
+from common import logging_setup
+from common.logging_setup import (BatchingFileHandler, NonBlockingQueueHandler, SampleFilter, set_sampling,
+                                  setup_logging)
+
+def record(msg: str, *args, level: int = logging.INFO, name: str = 'test') -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+class Unformattable:
+    def __str__(self):
+        raise AssertionError("formatted on the calling thread")
+
+def test_queue_handler_neither_blocks_nor_formats():
+    log_queue = queue.Queue(maxsize=2)
+    handler = NonBlockingQueueHandler(log_queue)
+    for _ in range(3):
+        handler.handle(record('value %s', Unformattable()))
+    assert log_queue.qsize() == 2
+    assert handler.dropped == 1
+    assert log_queue.get().args[0].__class__ is Unformattable
+
+def test_file_handler_writes_in_batches(tmp_path):
+    path = tmp_path / 'batched.log'
+    handler = BatchingFileHandler(str(path), batch_size=3)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    try:
+        handler.emit(record('one'))
+        handler.emit(record('two'))
+        assert path.read_text() == ''
+        handler.emit(record('three'))
+        assert path.read_text() == 'one\ntwo\nthree\n'
+        # Errors are written at once
+        handler.emit(record('broken', level=logging.ERROR))
+        assert path.read_text().endswith('broken\n')
+        handler.emit(record('four'))
+        handler.flush()
+        assert path.read_text().endswith('four\n')
+    finally:
+        handler.close()
+
+def test_sample_filter():
+    sample = SampleFilter(3)
+    kept = [sample.filter(record('x')) for _ in range(9)]
+    assert kept.count(True) == 3
+    assert sample.filter(record('x', level=logging.WARNING))
+    assert SampleFilter(0).every == 1
+
+def test_set_sampling_replaces_the_filter():
+    logger = logging.getLogger('test.sampled')
+    set_sampling('test.sampled', 5)
+    set_sampling('test.sampled', 2)
+    assert [f.every for f in logger.filters] == [2]
+    set_sampling('test.sampled', 1)
+    assert logger.filters == []
+
+@pytest.fixture
+def log_file(tmp_path):
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    path = tmp_path / 'server.log'
+    yield path
+    logging_setup._stop_listener()
+    for handler in logging_setup._listener.handlers:
+        handler.close()
+    root.handlers[:], _ = saved
+    root.setLevel(saved[1])
+    logging_setup._listener = logging_setup._queue_handler = None
+
+def flushed(path: Path) -> str:
+    logging_setup._stop_listener()
+    for handler in logging_setup._listener.handlers:
+        handler.flush()
+    return path.read_text()
+
+def test_setup_logging_routes_through_the_writer(log_file):
+    setup_logging(str(log_file), sample={'test.access': 2})
+    for i in range(4):
+        logging.getLogger('test.access').info("request %d", i)
+    logging.getLogger('test').warning("kept")
+    lines = flushed(log_file).splitlines()
+    assert [line.rsplit(' - ', 1)[1] for line in lines] == ['request 1', 'request 3', 'kept']
+
+def _log_in_child(name: str):
+    logging.getLogger(name).info("from the child")
+    # Forked children exit without atexit handlers, so write out here
+    logging_setup._stop_listener()
+    for handler in logging_setup._listener.handlers:
+        handler.flush()
+
+def test_forked_children_get_their_own_writer(log_file):
+    setup_logging(str(log_file))
+    child = multiprocessing.get_context('fork').Process(target=_log_in_child, args=('test.child',))
+    child.start()
+    child.join(10)
+    assert child.exitcode == 0
+    assert 'from the child' in flushed(log_file)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import os
+import random
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from catalog import VideoCatalog
+from mmap_pool import MappedPool
+
+SIZE = 10_000
+
+@pytest.fixture
+def catalog(tmp_path) -> VideoCatalog:
+    for i in range(10):
+        (tmp_path / f'{i}.mp4').write_bytes(bytes([i]) * SIZE)
+    (tmp_path / 'empty.mp4').write_bytes(b'')
+    return VideoCatalog(str(tmp_path))
+
+def test_maps_once_and_counts(catalog):
+    pool = MappedPool(5 * SIZE)
+    entry = catalog.get('3.mp4')
+    view = pool.get(entry)
+    assert bytes(view) == b'\x03' * SIZE
+    assert pool.peek(entry).obj is view.obj
+    assert pool.peek(catalog.get('4.mp4')) is None
+    stats = pool.stats()
+    assert (stats['hits'], stats['misses'], stats['mappings'], stats['mapped_bytes']) == (1, 1, 1, SIZE)
+
+def test_mappable(catalog):
+    pool = MappedPool(5 * SIZE, max_object_bytes=SIZE)
+    assert pool.mappable(SIZE)
+    assert not pool.mappable(SIZE + 1)
+    assert not pool.mappable(catalog.get('empty.mp4').size)
+    # The largest object never exceeds the budget
+    assert MappedPool(SIZE, max_object_bytes=10 * SIZE).max_object_bytes == SIZE
+
+def test_stays_within_budget_evicting_lru(catalog):
+    pool = MappedPool(3 * SIZE)
+    for i in range(3):
+        pool.get(catalog.get(f'{i}.mp4'))
+    # 0 is used again, so 1 is the least recently used
+    pool.get(catalog.get('0.mp4'))
+    pool.get(catalog.get('5.mp4'))
+    assert pool.peek(catalog.get('1.mp4')) is None
+    assert all(pool.peek(catalog.get(f'{i}.mp4')) is not None for i in (0, 2, 5))
+    stats = pool.stats()
+    assert (stats['mapped_bytes'], stats['unmaps']) == (3 * SIZE, 1)
+
+def test_evicted_view_stays_readable(catalog):
+    pool = MappedPool(SIZE)
+    view = pool.get(catalog.get('1.mp4'))
+    pool.get(catalog.get('2.mp4'))
+    assert pool.stats()['unmaps'] == 1
+    assert bytes(view[:4]) == b'\x01' * 4
+
+def test_retain_drops_rewritten_files(catalog, tmp_path):
+    pool = MappedPool(5 * SIZE)
+    pool.get(catalog.get('1.mp4'))
+    (tmp_path / '1.mp4').write_bytes(b'new' * 10)
+    catalog.refresh()
+    pool.retain({(e.path, e.etag) for e in catalog})
+    assert pool.stats()['mappings'] == 0
+    assert bytes(pool.get(catalog.get('1.mp4'))) == b'new' * 10
+
+def test_prefetch_is_not_a_hit_or_miss(catalog):
+    pool = MappedPool(5 * SIZE)
+    entry = catalog.get('1.mp4')
+    pool.get(entry, prefetch=True)
+    pool.get(entry, prefetch=True)
+    pool.get(entry)
+    stats = pool.stats()
+    assert (stats['prefetched'], stats['hits'], stats['misses']) == (1, 1, 0)
+
+def test_concurrent_gets_stay_within_budget(catalog):
+    pool = MappedPool(4 * SIZE)
+    entries = [catalog.get(f'{i}.mp4') for i in range(10)]
+    errors = []
+    def worker(seed):
+        rng = random.Random(seed)
+        try:
+            for _ in range(500):
+                entry = rng.choice(entries)
+                view = pool.get(entry)
+                assert view[0] == int(os.path.basename(entry.path)[0])
+                assert pool.mapped_bytes <= pool.budget_bytes
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    stats = pool.stats()
+    assert stats['mapped_bytes'] == stats['mappings'] * SIZE <= 4 * SIZE
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+import sys
+from pathlib import Path
+
+import pytest
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from pacing import BURST_SECONDS, PACE_CHUNK, Pacer, PacingPolicy, TokenBucket
+
+RATE = 1_000_000
+
+def test_bucket_allows_a_burst_then_waits():
+    bucket = TokenBucket(RATE)
+    assert bucket.capacity == RATE * BURST_SECONDS
+    assert bucket.reserve(int(bucket.capacity)) == 0.0
+    assert bucket.reserve(RATE // 10) == pytest.approx(0.1, abs=0.02)
+    # Reservations queue up behind each other
+    assert bucket.reserve(RATE // 10) == pytest.approx(0.2, abs=0.02)
+
+def test_slow_bucket_still_sends_whole_chunks():
+    bucket = TokenBucket(1000)
+    assert bucket.capacity == PACE_CHUNK
+    assert bucket.reserve(PACE_CHUNK) == 0.0
+
+def test_set_rate_clamps_banked_tokens():
+    bucket = TokenBucket(RATE)
+    bucket.set_rate(RATE // 10)
+    assert bucket.capacity == PACE_CHUNK
+    assert bucket.reserve(PACE_CHUNK) == 0.0
+    assert bucket.reserve(RATE // 100) == pytest.approx(0.1, abs=0.02)
+
+def _drain(bucket: TokenBucket):
+    bucket.reserve(int(bucket.capacity))
+
+def test_shared_bucket_spans_processes():
+    bucket = TokenBucket(RATE)
+    bucket.share()
+    child = multiprocessing.get_context('fork').Process(target=_drain, args=(bucket,))
+    child.start()
+    child.join(5)
+    assert child.exitcode == 0
+    # The child spent the whole burst, so this process waits for its tokens
+    assert bucket.reserve(RATE // 10) == pytest.approx(0.1, abs=0.05)
+
+def test_policy_rates():
+    policy = PacingPolicy(factor=1.5, connection_rate=50_000)
+    assert policy.enabled and policy.server is None
+    assert policy.rate(400_000) == 75_000
+    assert policy.rate(None) == 50_000
+    assert not PacingPolicy().enabled
+
+def test_pacer_uses_the_server_bucket():
+    policy = PacingPolicy(server_rate=RATE)
+    pacer = Pacer(policy)
+    pacer.set_rate(0)
+    chunks = list(pacer.chunks(100, int(policy.server.capacity) + PACE_CHUNK))
+    assert sum(n for _, n, _ in chunks) == int(policy.server.capacity) + PACE_CHUNK
+    assert chunks[0] == (100, PACE_CHUNK, 0.0)
+    assert chunks[-1][2] > 0
+    assert policy.stats()['delays'] >= 1
+
+def test_pacer_takes_the_longer_wait():
+    policy = PacingPolicy(server_rate=RATE)
+    pacer = Pacer(policy)
+    pacer.set_rate(RATE // 10)
+    pacer.delay(PACE_CHUNK)
+    # The connection's bucket is empty long before the server's
+    assert pacer.delay(PACE_CHUNK) == pytest.approx(PACE_CHUNK / (RATE // 10), abs=0.02)
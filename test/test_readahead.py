@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from catalog import VideoCatalog
+from dash import DEFAULT_DASH_ROOT, DashIndex
+from origin import Origin
+from readahead import MAX_DEPTH, Readahead, advise_willneed
+from segment_cache import SegmentCache
+
+REP = 'bbb_30fps_320x180_400k'
+
+def segment(number: int) -> str:
+    return f'{REP}/{REP}_{number}.m4v'
+
+@pytest.fixture(scope='module')
+def dash() -> DashIndex:
+    return DashIndex(DEFAULT_DASH_ROOT)
+
+class Recorder:
+    """A warm() that records what it was given."""
+    def __init__(self, expected: int):
+        self.names = []
+        self.expected = expected
+        self.done = threading.Event()
+
+    def __call__(self, entry):
+        self.names.append(entry.name)
+        if len(self.names) >= self.expected:
+            self.done.set()
+
+def test_warms_the_next_segments(dash):
+    warm = Recorder(4)
+    readahead = Readahead(dash, 3, warm)
+    readahead.on_request(segment(5))
+    # 6 and 7 were issued already, so only 9 is new
+    readahead.on_request(segment(6))
+    assert warm.done.wait(5)
+    assert warm.names == [segment(n) for n in (6, 7, 8, 9)]
+    stats = readahead.stats()
+    assert (stats['issued'], stats['hits'], stats['misses']) == (4, 1, 1)
+
+def test_init_segment_warms_the_first_segments(dash):
+    warm = Recorder(2)
+    rep = dash.segment(segment(1)).representation
+    Readahead(dash, 2, warm).on_request(rep.initialization)
+    assert warm.done.wait(5)
+    assert warm.names == [segment(rep.start_number), segment(rep.start_number + 1)]
+
+def test_stops_at_the_last_segment(dash):
+    rep = dash.segment(segment(1)).representation
+    last = rep.start_number + rep.segment_count - 1
+    warm = Recorder(1)
+    readahead = Readahead(dash, 3, warm)
+    readahead.on_request(segment(last - 1))
+    assert warm.done.wait(5)
+    time.sleep(0.1)
+    assert warm.names == [segment(last)]
+    readahead.on_request(segment(last))
+    assert readahead.stats()['issued'] == 1
+
+def test_depth_is_bounded_and_queue_full_drops(dash):
+    assert Readahead(dash, 100, lambda entry: None).depth == MAX_DEPTH
+    release = threading.Event()
+    readahead = Readahead(dash, 4, lambda entry: release.wait(5), max_pending=1)
+    readahead.on_request(segment(10))
+    stats = readahead.stats()
+    release.set()
+    # The queue holds one entry; the first that does not fit is dropped and the rest are not tried
+    assert (stats['issued'], stats['dropped']) == (1, 1)
+
+def test_prefetched_segments_are_cache_hits(dash):
+    with tempfile.TemporaryDirectory() as videos:
+        origin = Origin(VideoCatalog(videos), dash, SegmentCache(16 * 1024 * 1024), readahead_depth=2)
+        origin.dash_request(segment(20))
+        deadline = time.monotonic() + 5
+        while origin.cache.stats()['prefetched'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        entry = origin.dash_request(segment(21))
+        body = origin.body(entry)
+        assert isinstance(body, memoryview)
+        assert bytes(body) == Path(entry.path).read_bytes()
+        stats = origin.cache.stats()
+        assert (stats['hits'], stats['misses']) == (1, 0)
+        # Segment 23, queued by the second request, may have landed by now too
+        assert stats['prefetched'] >= 2
+        assert origin.readahead.stats()['hits'] == 1
+
+def test_advise_willneed(tmp_path):
+    path = tmp_path / 'segment.m4v'
+    path.write_bytes(b'x' * 4096)
+    advise_willneed(str(path))
+    with pytest.raises(FileNotFoundError):
+        advise_willneed(str(tmp_path / 'missing.m4v'))
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+import http.client
+import http.server
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from pool import REJECT_RESPONSE, ThreadPoolHTTPServer
+
+SERVER = project_root / 'servers' / 'server.py'
+VIDEO = os.urandom(200_000)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+@contextmanager
+def origin_server(directory: Path, *args: str):
+    """Run servers/server.py in directory, which holds its videos and server.log, and yield its port."""
+    port = free_port()
+    process = subprocess.Popen([sys.executable, str(SERVER), '--port', str(port), *args], cwd=directory,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("server did not start")
+                time.sleep(0.1)
+        yield port
+    finally:
+        process.terminate()
+        process.wait(10)
+
+@pytest.fixture
+def videos(tmp_path) -> Path:
+    (tmp_path / 'clip.mp4').write_bytes(VIDEO)
+    return tmp_path
+
+def get(port: int, path: str, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request('GET', path, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+def stats(port: int) -> dict:
+    return json.loads(get(port, '/_stats')[2])
+
+class BlockingHandler(http.server.BaseHTTPRequestHandler):
+    release = threading.Event()
+
+    def handle(self):
+        self.release.wait(5)
+
+def test_pool_rejects_when_the_queue_is_full():
+    httpd = ThreadPoolHTTPServer(('127.0.0.1', 0), BlockingHandler, workers=1, queue_depth=1)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    address = httpd.server_address
+    try:
+        busy = socket.create_connection(address)
+        while httpd.busy_workers < 1:
+            time.sleep(0.01)
+        queued = socket.create_connection(address)
+        while httpd.stats()['queue_depth'] < 1:
+            time.sleep(0.01)
+        rejected = socket.create_connection(address, timeout=5)
+        assert rejected.recv(1024) == REJECT_RESPONSE
+        BlockingHandler.release.set()
+        for sock in (busy, queued, rejected):
+            sock.close()
+        counters = httpd.stats()
+        assert (counters['accepted'], counters['rejected']) == (2, 1)
+    finally:
+        BlockingHandler.release.set()
+        httpd.shutdown()
+        httpd.server_close()
+
+@pytest.mark.parametrize('engine', ['threaded', 'prefork'])
+def test_idle_connect_does_not_pin_the_worker(videos, engine):
+    with origin_server(videos, '--engine', engine, '--processes', '1', '--workers', '1',
+                       '--idle-timeout', '1') as port:
+        idle = socket.create_connection(('127.0.0.1', port), timeout=5)
+        started = time.monotonic()
+        # Waits for the only worker, which is freed when the idle connect times out
+        status, _, body = get(port, '/video/clip.mp4')
+        assert (status, body) == (200, VIDEO)
+        assert time.monotonic() - started < 4
+        assert idle.recv(1024) == b''
+        idle.close()
+
+@pytest.mark.parametrize('engine', ['threaded', 'prefork', 'asyncio'])
+def test_engines_serve_ranges(videos, engine):
+    with origin_server(videos, '--engine', engine, '--processes', '2') as port:
+        status, headers, body = get(port, '/video/clip.mp4', {'Range': 'bytes=1000-1999'})
+        assert status == 206
+        assert headers['Content-Range'] == f'bytes 1000-1999/{len(VIDEO)}'
+        assert body == VIDEO[1000:2000]
+        assert get(port, '/video/missing.mp4')[0] == 404
+        assert stats(port)['engine'] == ('asyncio' if engine == 'asyncio' else 'threaded')
+
+def test_asyncio_counts_idle_and_read_timeouts(videos):
+    with origin_server(videos, '--engine', 'asyncio', '--idle-timeout', '1') as port:
+        idle = socket.create_connection(('127.0.0.1', port), timeout=5)
+        upload = socket.create_connection(('127.0.0.1', port), timeout=5)
+        # A request body that never finishes arriving is a stalled upload
+        upload.sendall(b'POST /_drain HTTP/1.1\r\nHost: x\r\nContent-Length: 10\r\n\r\nabc')
+        assert idle.recv(1024) == b''
+        assert upload.recv(1024) == b''
+        idle.close()
+        upload.close()
+        counters = stats(port)
+        assert (counters['idle_timeouts'], counters['read_timeouts'], counters['write_timeouts']) == (1, 1, 0)
+        # The POST never completed, so no drain was started
+        assert json.loads(get(port, '/_load')[2])['state'] == 'serving'
+
+def test_asyncio_holds_many_open_connections(videos):
+    with origin_server(videos, '--engine', 'asyncio', '--queue-depth', '512') as port:
+        idle = [socket.create_connection(('127.0.0.1', port)) for _ in range(300)]
+        try:
+            status, _, body = get(port, '/video/clip.mp4')
+            assert (status, body) == (200, VIDEO)
+            assert stats(port)['connections'] >= 300
+        finally:
+            for sock in idle:
+                sock.close()
+
+def read_response(sock: socket.socket) -> http.client.HTTPResponse:
+    response = http.client.HTTPResponse(sock)
+    response.begin()
+    response.body = response.read()
+    return response
+
+@pytest.mark.parametrize('engine', ['threaded', 'asyncio'])
+def test_keep_alive_and_pipelining(videos, engine):
+    with origin_server(videos, '--engine', engine, '--max-keepalive-requests', '4') as port:
+        sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+        # Pipelined: both requests are sent before either response is read
+        sock.sendall(b'GET /video/clip.mp4 HTTP/1.1\r\nHost: x\r\nRange: bytes=0-9\r\n\r\n'
+                     b'GET /video/clip.mp4 HTTP/1.1\r\nHost: x\r\nRange: bytes=10-19\r\n\r\n')
+        first, second = read_response(sock), read_response(sock)
+        assert (first.status, first.body) == (206, VIDEO[:10])
+        assert (second.status, second.body) == (206, VIDEO[10:20])
+        assert first.getheader('Connection') == 'keep-alive'
+
+        sock.sendall(b'GET /_stats HTTP/1.1\r\nHost: x\r\n\r\n')
+        keepalive = json.loads(read_response(sock).body)['keepalive']
+        assert (keepalive['requests'], keepalive['reused_requests']) == (3, 2)
+
+        # The fourth request is the last this connection serves
+        sock.sendall(b'GET /video/clip.mp4 HTTP/1.1\r\nHost: x\r\n\r\n')
+        last = read_response(sock)
+        assert (last.body, last.getheader('Connection')) == (VIDEO, 'close')
+        assert sock.recv(1) == b''
+        sock.close()
+
+@pytest.mark.parametrize('engine', ['threaded', 'asyncio'])
+@pytest.mark.parametrize('request_head', [
+    b'GET /video/clip.mp4 HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n',
+    b'GET /video/clip.mp4 HTTP/1.0\r\n\r\n',
+])
+def test_connection_close(videos, engine, request_head):
+    with origin_server(videos, '--engine', engine) as port:
+        sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+        sock.sendall(request_head)
+        response = read_response(sock)
+        assert (response.status, response.body) == (200, VIDEO)
+        assert response.getheader('Connection') == 'close'
+        assert sock.recv(1) == b''
+        sock.close()
+
+@pytest.mark.parametrize('engine', ['threaded', 'asyncio'])
+def test_client_that_stops_reading_is_evicted(tmp_path, engine):
+    # Far larger than the socket buffers, so the server's writes stall
+    (tmp_path / 'large.mp4').write_bytes(b'\0' * (64 * 1024 * 1024))
+    with origin_server(tmp_path, '--engine', engine, '--write-timeout', '0.5') as port:
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.connect(('127.0.0.1', port))
+        sock.sendall(b'GET /video/large.mp4 HTTP/1.1\r\nHost: x\r\n\r\n')
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            evictions = stats(port)['slow_clients']['evictions']
+            if evictions['write_timeout']:
+                break
+            time.sleep(0.1)
+        sock.close()
+        assert evictions == {'write_timeout': 1, 'min_rate': 0}
+        # The worker was freed for other clients
+        assert get(port, '/video/large.mp4', {'Range': 'bytes=0-9'})[0] == 206
+
+def post(port: int, path: str):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request('POST', path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize('engine', ['threaded', 'prefork', 'asyncio'])
+def test_drain_exits_once_idle(videos, engine):
+    with origin_server(videos, '--engine', engine, '--processes', '2') as port:
+        assert post(port, '/_drain?timeout=soon')[0] == 400
+        status, body = post(port, '/_drain?timeout=30')
+        assert status == 202
+        assert json.loads(body)['state'] == 'draining'
+        # Nothing is in flight, so the server exits well before the deadline
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            except ConnectionRefusedError:
+                break
+            except ConnectionResetError:
+                # Queued on a listener that closed as the process exited
+                pass
+            time.sleep(0.1)
+        else:
+            pytest.fail("server still accepting connections")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from singleflight import SingleFlight
+
+def test_concurrent_joins_share_one_read():
+    data = os.urandom(1_000_000)
+    with tempfile.NamedTemporaryFile() as f:
+        f.write(data)
+        f.flush()
+        flights = SingleFlight(len(data), chunk_size=64 * 1024)
+        first = flights.join('key', f.name, len(data))
+        second = flights.join('key', f.name, len(data))
+        assert first is second
+        assert b''.join(second.chunks(10, len(data) - 10)) == data[10:]
+        assert bytes(first.result()) == data
+        stats = flights.stats()
+        assert (stats['loads'], stats['coalesced']) == (1, 1)
+
+def test_flight_is_joinable_until_stored():
+    """A request arriving after the read but before the store must not read again."""
+    storing = threading.Event()
+    release = threading.Event()
+    stored = []
+    def store(buffer):
+        storing.set()
+        release.wait(5)
+        stored.append(bytes(buffer))
+
+    with tempfile.NamedTemporaryFile() as f:
+        f.write(b'segment')
+        f.flush()
+        flights = SingleFlight(1024)
+        first = flights.join('key', f.name, 7, store)
+        assert storing.wait(5)
+        assert flights.join('key', f.name, 7) is first
+        release.set()
+        assert bytes(first.result()) == b'segment'
+    assert flights.stats()['loads'] == 1
+
+def test_failed_load_is_reported_and_retired():
+    flights = SingleFlight(1024)
+    flight = flights.join('key', '/nonexistent/segment.m4s', 10)
+    try:
+        flight.result()
+    except OSError:
+        pass
+    else:
+        raise AssertionError("expected the load to fail")
+    assert flights.stats()['failures'] == 1
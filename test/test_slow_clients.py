@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from slow_clients import GUARD_CHUNK, SlowClientError, SlowClientPolicy, ThroughputGuard, guarded_slices
+
+def test_guard_evicts_below_the_minimum_rate():
+    guard = ThroughputGuard(SlowClientPolicy(min_rate=1000, window=2.0))
+    guard.sent(1500, 1.0)
+    with pytest.raises(SlowClientError) as error:
+        # 1900 bytes over 2s of blocked writes
+        guard.sent(400, 1.0)
+    assert error.value.reason == 'min_rate'
+
+def test_guard_judges_each_window_afresh():
+    guard = ThroughputGuard(SlowClientPolicy(min_rate=1000, window=1.0))
+    guard.sent(5000, 1.0)
+    assert (guard.bytes, guard.blocked) == (0, 0.0)
+    # A fast window earlier does not cover a slow one later
+    with pytest.raises(SlowClientError):
+        guard.sent(500, 1.0)
+
+def test_only_blocked_time_counts():
+    guard = ThroughputGuard(SlowClientPolicy(min_rate=1000, window=10.0))
+    # Writes that complete at once, however far apart in wall time, are never slow
+    for _ in range(1000):
+        guard.sent(GUARD_CHUNK, 0.001)
+    guard.sent(100, 8.0)
+
+def test_policy_stats():
+    policy = SlowClientPolicy(write_timeout=5.0, min_rate=100)
+    assert policy.stats()['mean_held_seconds'] == 0.0
+    policy.evicted('write_timeout', 6.0)
+    policy.evicted('min_rate', 12.0)
+    stats = policy.stats()
+    assert stats['evictions'] == {'write_timeout': 1, 'min_rate': 1}
+    assert (stats['held_seconds'], stats['mean_held_seconds']) == (18.0, 9.0)
+
+def test_guarded_slices():
+    assert list(guarded_slices(100, 0)) == []
+    assert list(guarded_slices(100, 10)) == [(100, 10)]
+    assert list(guarded_slices(0, 2 * GUARD_CHUNK + 1)) == [
+        (0, GUARD_CHUNK), (GUARD_CHUNK, GUARD_CHUNK), (2 * GUARD_CHUNK, 1)]
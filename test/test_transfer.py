@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import socket
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+import transfer
+from transfer import copy_file, is_regular_file, send_file
+
+DATA = os.urandom(300_000)
+
+def received(send) -> bytes:
+    """Bytes that arrive on the other end of a socket pair while send(sock) runs."""
+    ours, theirs = socket.socketpair()
+    chunks = []
+    def read():
+        while True:
+            chunk = theirs.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    reader = threading.Thread(target=read)
+    reader.start()
+    with ours:
+        send(ours)
+        ours.shutdown(socket.SHUT_WR)
+        reader.join(5)
+    theirs.close()
+    return b''.join(chunks)
+
+@pytest.fixture
+def data_file():
+    with tempfile.NamedTemporaryFile() as f:
+        f.write(DATA)
+        f.flush()
+        f.seek(0)
+        yield f
+
+def test_is_regular_file(data_file):
+    assert is_regular_file(data_file)
+    assert not is_regular_file(io.BytesIO(DATA))
+    r, w = os.pipe()
+    with os.fdopen(r, 'rb') as pipe, os.fdopen(w, 'wb'):
+        assert not is_regular_file(pipe)
+
+@pytest.mark.parametrize('offset, count', [(0, None), (0, len(DATA)), (1000, 12345), (len(DATA) - 10, 10)])
+def test_send_file_uses_sendfile(monkeypatch, data_file, offset, count):
+    def no_copy(*args, **kwargs):
+        raise AssertionError("regular files must not be copied through Python")
+    monkeypatch.setattr(transfer, 'copy_file', no_copy)
+    sent = []
+    body = received(lambda sock: sent.append(send_file(sock, data_file, offset, count)))
+    end = len(DATA) if count is None else offset + count
+    assert body == DATA[offset:end]
+    assert sent == [end - offset]
+
+@pytest.mark.parametrize('offset, count', [(0, None), (5, 100_000), (250_000, 100_000)])
+def test_copy_fallback(offset, count):
+    sent = []
+    body = received(lambda sock: sent.append(send_file(sock, io.BytesIO(DATA), offset, count)))
+    # A count past the end stops at EOF
+    end = len(DATA) if count is None else min(len(DATA), offset + count)
+    assert body == DATA[offset:end]
+    assert sent == [end - offset]
+
+def test_copy_file_small_buffer():
+    body = received(lambda sock: copy_file(sock, io.BytesIO(DATA), 7, 1000, buffer_size=64))
+    assert body == DATA[7:1007]
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# servers/ is a script directory, not a package
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root / 'servers'))
+
+from catalog import VideoCatalog
+from dash import DashIndex
+from origin import Origin
+from validators import CachePolicy, not_modified
+
+ETAG = '"18f3a-4e2"'
+# Sat, 17 Oct 2026 00:00:00 GMT
+MTIME_NS = 1_792_195_200 * 1_000_000_000 + 250_000_000
+SEGMENT = 'bbb_30fps_320x180_400k/bbb_30fps_320x180_400k_1.m4v'
+
+@pytest.mark.parametrize('if_none_match, expected', [
+    (ETAG, True),
+    ('W/' + ETAG, True),
+    ('"other", ' + ETAG, True),
+    ('*', True),
+    ('"other"', False),
+    ('', False),
+])
+def test_if_none_match(if_none_match, expected):
+    assert not_modified(if_none_match, None, ETAG, MTIME_NS) is expected
+
+@pytest.mark.parametrize('if_modified_since, expected', [
+    ('Sat, 17 Oct 2026 00:00:00 GMT', True),
+    ('Sun, 18 Oct 2026 00:00:00 GMT', True),
+    ('Fri, 16 Oct 2026 23:59:59 GMT', False),
+    ('yesterday', False),
+    ('', False),
+    (None, False),
+])
+def test_if_modified_since(if_modified_since, expected):
+    assert not_modified(None, if_modified_since, ETAG, MTIME_NS) is expected
+
+def test_if_none_match_wins_over_if_modified_since():
+    assert not not_modified('"other"', 'Sun, 18 Oct 2026 00:00:00 GMT', ETAG, MTIME_NS)
+    assert not_modified(ETAG, 'Fri, 16 Oct 2026 00:00:00 GMT', ETAG, MTIME_NS)
+
+def test_cache_policy_overrides():
+    policy = CachePolicy(media='no-store', video='')
+    assert policy.header('media') == 'no-store'
+    assert policy.header('video') is None
+    assert policy.header('init') == 'public, max-age=86400, immutable'
+    with pytest.raises(ValueError):
+        CachePolicy(thumbnail='no-cache')
+
+@pytest.fixture
+def origin():
+    with tempfile.TemporaryDirectory() as videos:
+        yield Origin(VideoCatalog(videos), DashIndex())
+
+@pytest.mark.parametrize('headers, status, cached', [
+    ({}, 200, True),
+    ({'Range': 'bytes=0-9'}, 206, True),
+    ({'Range': 'bytes=99999999-'}, 416, False),
+])
+def test_cache_control_by_status(origin, headers, status, cached):
+    response = origin.plan_response(origin.dash_entry(SEGMENT), headers)
+    assert response.status == status
+    assert any(name == 'Cache-Control' for name, _ in response.headers) is cached
+
+def test_not_modified_response(origin):
+    entry = origin.dash_entry(SEGMENT)
+    response = origin.plan_response(entry, {'If-None-Match': entry.etag})
+    assert response.status == 304
+    assert response.parts == []
+    assert ('ETag', entry.etag) in response.headers
+    assert any(name == 'Cache-Control' for name, _ in response.headers)
@@ -5,6 +5,10 @@ from mininet.net import Mininet
 from mininet.node import RemoteController
 from mininet.log import setLogLevel, info
 from mininet.cli import CLI
+from pathlib import Path
+
+# Repo checkout, so each server node can run the origin from it
+project_root = Path(__file__).parent.parent.absolute()
 
 class CustomTopology(Topo):
     def build(self):
@@ -51,9 +55,13 @@ def run():
     )
     net.start()
 
-    # start HTTP servers
+    # start video origins: /video/ and the player page from the www dir, /dash/ from the repo's DASH ladder
+    server_script = project_root / 'servers' / 'server.py'
+    dash_root = project_root / 'se3506' / 'static' / 'bbb_30fps'
     for i in range(1, 5):
-        net.get(f'server{i}').cmd('cd /home/mininet/www && python3 -m http.server 8000 &')
+        net.get(f'server{i}').cmd(
+            f'cd /home/mininet/www && python3 {server_script} --port 8000 --dash-root {dash_root} --static-root . &'
+        )
 
     CLI(net)
     net.stop()